@@ -31,10 +31,70 @@ d = { 'settings': { 'branch': 'master',
                                   'alphapept.export.remove_mods': ('export.html#remove_mods', 'alphapept/export.py')},
             'alphapept.ext.bruker.timsdata': {},
             'alphapept.ext.bruker.tsfdata': {},
-            'alphapept.fasta': { 'alphapept.fasta.add_decoy_tag': ('fasta.html#add_decoy_tag', 'alphapept/fasta.py'),
+            'alphapept.fasta': { 'alphapept.fasta.DigestionCache': ('fasta.html#digestioncache', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.__init__': ('fasta.html#digestioncache.__init__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.add_sequence': ( 'fasta.html#digestioncache.add_sequence',
+                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.clear_isoforms': ( 'fasta.html#digestioncache.clear_isoforms',
+                                                                                    'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.get_sequence': ( 'fasta.html#digestioncache.get_sequence',
+                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.isoform_full': ( 'fasta.html#digestioncache.isoform_full',
+                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.DigestionCache.log': ('fasta.html#digestioncache.log', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences': ('fasta.html#packedsequences', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.__array__': ( 'fasta.html#packedsequences.__array__',
+                                                                                'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.__getitem__': ( 'fasta.html#packedsequences.__getitem__',
+                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.__init__': ('fasta.html#packedsequences.__init__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.__iter__': ('fasta.html#packedsequences.__iter__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.__len__': ('fasta.html#packedsequences.__len__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PackedSequences.astype': ('fasta.html#packedsequences.astype', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap': ('fasta.html#peptidemap', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__contains__': ('fasta.html#peptidemap.__contains__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__eq__': ('fasta.html#peptidemap.__eq__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__getitem__': ('fasta.html#peptidemap.__getitem__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__init__': ('fasta.html#peptidemap.__init__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__iter__': ('fasta.html#peptidemap.__iter__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__len__': ('fasta.html#peptidemap.__len__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.__repr__': ('fasta.html#peptidemap.__repr__', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.from_dict': ('fasta.html#peptidemap.from_dict', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.from_pairs': ('fasta.html#peptidemap.from_pairs', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get': ('fasta.html#peptidemap.get', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get_idx': ('fasta.html#peptidemap.get_idx', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get_idx_from_db': ( 'fasta.html#peptidemap.get_idx_from_db',
+                                                                                 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get_n_proteins': ( 'fasta.html#peptidemap.get_n_proteins',
+                                                                                'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get_protein_pairs': ( 'fasta.html#peptidemap.get_protein_pairs',
+                                                                                   'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.get_proteins': ('fasta.html#peptidemap.get_proteins', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.items': ('fasta.html#peptidemap.items', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.keys': ('fasta.html#peptidemap.keys', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.merge': ('fasta.html#peptidemap.merge', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.sequences': ('fasta.html#peptidemap.sequences', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.to_dict': ('fasta.html#peptidemap.to_dict', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.PeptideMap.to_pairs': ('fasta.html#peptidemap.to_pairs', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._add_isoforms': ('fasta.html#_add_isoforms', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._add_unique': ('fasta.html#_add_unique', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._append_to_dataset': ('fasta.html#_append_to_dataset', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._compare_packed': ('fasta.html#_compare_packed', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._expand_compact_database': ('fasta.html#_expand_compact_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._find_isoforms': ('fasta.html#_find_isoforms', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._get_decoy_tokens': ('fasta.html#_get_decoy_tokens', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._get_valid_bytes': ('fasta.html#_get_valid_bytes', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._hash_tokens': ('fasta.html#_hash_tokens', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._is_sorted_packed': ('fasta.html#_is_sorted_packed', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._modify_peptide': ('fasta.html#_modify_peptide', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._replace_terminal': ('fasta.html#_replace_terminal', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._search_packed': ('fasta.html#_search_packed', 'alphapept/fasta.py'),
+                                 'alphapept.fasta._tokens_equal': ('fasta.html#_tokens_equal', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.add_decoy_tag': ('fasta.html#add_decoy_tag', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_fixed_mod_terminal': ('fasta.html#add_fixed_mod_terminal', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_fixed_mods': ('fasta.html#add_fixed_mods', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_fixed_mods_terminal': ('fasta.html#add_fixed_mods_terminal', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.add_to_database_cache': ('fasta.html#add_to_database_cache', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_to_pept_dict': ('fasta.html#add_to_pept_dict', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_variable_mod': ('fasta.html#add_variable_mod', 'alphapept/fasta.py'),
                                  'alphapept.fasta.add_variable_mods': ('fasta.html#add_variable_mods', 'alphapept/fasta.py'),
@@ -45,35 +105,87 @@ d = { 'settings': { 'branch': 'master',
                                  'alphapept.fasta.check_peptide': ('fasta.html#check_peptide', 'alphapept/fasta.py'),
                                  'alphapept.fasta.check_sequence': ('fasta.html#check_sequence', 'alphapept/fasta.py'),
                                  'alphapept.fasta.cleave_sequence': ('fasta.html#cleave_sequence', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.compact_database': ('fasta.html#compact_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.copy_from_database_cache': ('fasta.html#copy_from_database_cache', 'alphapept/fasta.py'),
                                  'alphapept.fasta.count_internal_cleavages': ('fasta.html#count_internal_cleavages', 'alphapept/fasta.py'),
                                  'alphapept.fasta.count_missed_cleavages': ('fasta.html#count_missed_cleavages', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.database_cache_lock': ('fasta.html#database_cache_lock', 'alphapept/fasta.py'),
                                  'alphapept.fasta.digest_fasta_block': ('fasta.html#digest_fasta_block', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.digest_fasta_block_to_chunk': ( 'fasta.html#digest_fasta_block_to_chunk',
+                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.digest_sequences': ('fasta.html#digest_sequences', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.digest_tokens': ('fasta.html#digest_tokens', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.encode_peptides': ('fasta.html#encode_peptides', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.encode_sequence': ('fasta.html#encode_sequence', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.estimate_database': ('fasta.html#estimate_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.evict_database_cache': ('fasta.html#evict_database_cache', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.expand_compact_database': ('fasta.html#expand_compact_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.export_flat_database': ('fasta.html#export_flat_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.export_fragment_index': ('fasta.html#export_fragment_index', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.fill_compact_fragments': ('fasta.html#fill_compact_fragments', 'alphapept/fasta.py'),
                                  'alphapept.fasta.generate_database': ('fasta.html#generate_database', 'alphapept/fasta.py'),
                                  'alphapept.fasta.generate_database_parallel': ( 'fasta.html#generate_database_parallel',
                                                                                  'alphapept/fasta.py'),
+                                 'alphapept.fasta.generate_database_sharded': ( 'fasta.html#generate_database_sharded',
+                                                                                'alphapept/fasta.py'),
                                  'alphapept.fasta.generate_fasta_list': ('fasta.html#generate_fasta_list', 'alphapept/fasta.py'),
                                  'alphapept.fasta.generate_peptides': ('fasta.html#generate_peptides', 'alphapept/fasta.py'),
                                  'alphapept.fasta.generate_spectra': ('fasta.html#generate_spectra', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_cached_database_path': ('fasta.html#get_cached_database_path', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_compact_database': ('fasta.html#get_compact_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_compact_spectrum': ('fasta.html#get_compact_spectrum', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_database_hash': ('fasta.html#get_database_hash', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_database_settings': ('fasta.html#get_database_settings', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_database_slice': ('fasta.html#get_database_slice', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_database_tokens': ('fasta.html#get_database_tokens', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_decoy_sequence': ('fasta.html#get_decoy_sequence', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_decoys': ('fasta.html#get_decoys', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_digestion_cache': ('fasta.html#get_digestion_cache', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_digestion_tables': ('fasta.html#get_digestion_tables', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_flat_database_path': ('fasta.html#get_flat_database_path', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_flat_database_pointer': ( 'fasta.html#get_flat_database_pointer',
+                                                                                'alphapept/fasta.py'),
                                  'alphapept.fasta.get_frag_dict': ('fasta.html#get_frag_dict', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_fragmass': ('fasta.html#get_fragmass', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_isoforms': ('fasta.html#get_isoforms', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_missed_cleavages': ('fasta.html#get_missed_cleavages', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_peptide_map': ('fasta.html#get_peptide_map', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_precmass': ('fasta.html#get_precmass', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_precursor_buckets': ('fasta.html#get_precursor_buckets', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_shard_edges': ('fasta.html#get_shard_edges', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_spectra': ('fasta.html#get_spectra', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_spectrum': ('fasta.html#get_spectrum', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.get_target_sequences': ('fasta.html#get_target_sequences', 'alphapept/fasta.py'),
                                  'alphapept.fasta.get_unique_peptides': ('fasta.html#get_unique_peptides', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.is_compact_database': ('fasta.html#is_compact_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.is_flat_database_current': ('fasta.html#is_flat_database_current', 'alphapept/fasta.py'),
                                  'alphapept.fasta.list_to_numba': ('fasta.html#list_to_numba', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.merge_database_spectra': ('fasta.html#merge_database_spectra', 'alphapept/fasta.py'),
                                  'alphapept.fasta.merge_pept_dicts': ('fasta.html#merge_pept_dicts', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.merge_spectra_chunks': ('fasta.html#merge_spectra_chunks', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.pack_sequences': ('fasta.html#pack_sequences', 'alphapept/fasta.py'),
                                  'alphapept.fasta.parse': ('fasta.html#parse', 'alphapept/fasta.py'),
                                  'alphapept.fasta.pept_dict_from_search': ('fasta.html#pept_dict_from_search', 'alphapept/fasta.py'),
                                  'alphapept.fasta.read_database': ('fasta.html#read_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.read_database_slice': ('fasta.html#read_database_slice', 'alphapept/fasta.py'),
                                  'alphapept.fasta.read_fasta_file': ('fasta.html#read_fasta_file', 'alphapept/fasta.py'),
                                  'alphapept.fasta.read_fasta_file_entries': ('fasta.html#read_fasta_file_entries', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.read_flat_database': ('fasta.html#read_flat_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.read_fragment_index': ('fasta.html#read_fragment_index', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.read_pept_dict': ('fasta.html#read_pept_dict', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.remove_stale_lock': ('fasta.html#remove_stale_lock', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.sample_fasta': ('fasta.html#sample_fasta', 'alphapept/fasta.py'),
                                  'alphapept.fasta.save_database': ('fasta.html#save_database', 'alphapept/fasta.py'),
                                  'alphapept.fasta.swap_AL': ('fasta.html#swap_al', 'alphapept/fasta.py'),
-                                 'alphapept.fasta.swap_KR': ('fasta.html#swap_kr', 'alphapept/fasta.py')},
+                                 'alphapept.fasta.swap_KR': ('fasta.html#swap_kr', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.tokenize': ('fasta.html#tokenize', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.unpack_sequences': ('fasta.html#unpack_sequences', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.unswap_AL': ('fasta.html#unswap_al', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.update_database': ('fasta.html#update_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.write_database': ('fasta.html#write_database', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.write_pept_dict': ('fasta.html#write_pept_dict', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.write_precursor_buckets': ('fasta.html#write_precursor_buckets', 'alphapept/fasta.py'),
+                                 'alphapept.fasta.write_spectra_chunk': ('fasta.html#write_spectra_chunk', 'alphapept/fasta.py')},
             'alphapept.feature_finding': { 'alphapept.feature_finding.check_averagine': ( 'feature_finding.html#check_averagine',
                                                                                           'alphapept/feature_finding.py'),
                                            'alphapept.feature_finding.check_isotope_pattern': ( 'feature_finding.html#check_isotope_pattern',
@@ -226,7 +338,17 @@ d = { 'settings': { 'branch': 'master',
                                      'alphapept.interface.search_data': ('interface.html#search_data', 'alphapept/interface.py'),
                                      'alphapept.interface.tqdm_wrapper': ('interface.html#tqdm_wrapper', 'alphapept/interface.py'),
                                      'alphapept.interface.wrapped_partial': ('interface.html#wrapped_partial', 'alphapept/interface.py')},
-            'alphapept.io': { 'alphapept.io.HDF_File': ('io.html#hdf_file', 'alphapept/io.py'),
+            'alphapept.io': { 'alphapept.io.DDA_Query_Data': ('io.html#dda_query_data', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__contains__': ('io.html#dda_query_data.__contains__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__delitem__': ('io.html#dda_query_data.__delitem__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__getitem__': ('io.html#dda_query_data.__getitem__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__init__': ('io.html#dda_query_data.__init__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__iter__': ('io.html#dda_query_data.__iter__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__len__': ('io.html#dda_query_data.__len__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__repr__': ('io.html#dda_query_data.__repr__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.__setitem__': ('io.html#dda_query_data.__setitem__', 'alphapept/io.py'),
+                              'alphapept.io.DDA_Query_Data.load': ('io.html#dda_query_data.load', 'alphapept/io.py'),
+                              'alphapept.io.HDF_File': ('io.html#hdf_file', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.__eq__': ('io.html#hdf_file.__eq__', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.__hash__': ('io.html#hdf_file.__hash__', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.__init__': ('io.html#hdf_file.__init__', 'alphapept/io.py'),
@@ -241,26 +363,40 @@ d = { 'settings': { 'branch': 'master',
                               'alphapept.io.HDF_File.last_updated': ('io.html#hdf_file.last_updated', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.original_file_name': ('io.html#hdf_file.original_file_name', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.read': ('io.html#hdf_file.read', 'alphapept/io.py'),
+                              'alphapept.io.HDF_File.session': ('io.html#hdf_file.session', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.version': ('io.html#hdf_file.version', 'alphapept/io.py'),
                               'alphapept.io.HDF_File.write': ('io.html#hdf_file.write', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool': ('io.html#hdf_handle_pool', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.__init__': ('io.html#hdf_handle_pool.__init__', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool._check_unshared': ( 'io.html#hdf_handle_pool._check_unshared',
+                                                                                'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool._close': ('io.html#hdf_handle_pool._close', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool._open': ('io.html#hdf_handle_pool._open', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool._reopen': ('io.html#hdf_handle_pool._reopen', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.acquire': ('io.html#hdf_handle_pool.acquire', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.get_counts': ('io.html#hdf_handle_pool.get_counts', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.open': ('io.html#hdf_handle_pool.open', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.release': ('io.html#hdf_handle_pool.release', 'alphapept/io.py'),
+                              'alphapept.io.HDF_Handle_Pool.reset_counts': ('io.html#hdf_handle_pool.reset_counts', 'alphapept/io.py'),
                               'alphapept.io.MS_Data_File': ('io.html#ms_data_file', 'alphapept/io.py'),
-                              'alphapept.io.MS_Data_File._save_DDA_query_data': ( 'io.html#ms_data_file._save_dda_query_data',
-                                                                                  'alphapept/io.py'),
-                              'alphapept.io.MS_Data_File.import_raw_DDA_data': ( 'io.html#ms_data_file.import_raw_dda_data',
-                                                                                 'alphapept/io.py'),
-                              'alphapept.io.MS_Data_File.read_DDA_query_data': ( 'io.html#ms_data_file.read_dda_query_data',
-                                                                                 'alphapept/io.py'),
                               'alphapept.io.__extract_nested': ('io.html#__extract_nested', 'alphapept/io.py'),
                               'alphapept.io._read_DDA_query_data': ('io.html#_read_dda_query_data', 'alphapept/io.py'),
+                              'alphapept.io._save_DDA_query_data': ('io.html#_save_dda_query_data', 'alphapept/io.py'),
                               'alphapept.io.centroid_data': ('io.html#centroid_data', 'alphapept/io.py'),
                               'alphapept.io.check_sanity': ('io.html#check_sanity', 'alphapept/io.py'),
+                              'alphapept.io.decode_strings': ('io.html#decode_strings', 'alphapept/io.py'),
+                              'alphapept.io.encode_categories': ('io.html#encode_categories', 'alphapept/io.py'),
+                              'alphapept.io.encode_column': ('io.html#encode_column', 'alphapept/io.py'),
+                              'alphapept.io.encode_strings': ('io.html#encode_strings', 'alphapept/io.py'),
                               'alphapept.io.extract_mq_settings': ('io.html#extract_mq_settings', 'alphapept/io.py'),
                               'alphapept.io.extract_mzml_info': ('io.html#extract_mzml_info', 'alphapept/io.py'),
                               'alphapept.io.gaussian_estimator': ('io.html#gaussian_estimator', 'alphapept/io.py'),
                               'alphapept.io.get_centroid': ('io.html#get_centroid', 'alphapept/io.py'),
+                              'alphapept.io.get_dataset_storage': ('io.html#get_dataset_storage', 'alphapept/io.py'),
                               'alphapept.io.get_local_intensity': ('io.html#get_local_intensity', 'alphapept/io.py'),
                               'alphapept.io.get_most_abundant': ('io.html#get_most_abundant', 'alphapept/io.py'),
                               'alphapept.io.get_peaks': ('io.html#get_peaks', 'alphapept/io.py'),
+                              'alphapept.io.import_raw_DDA_data': ('io.html#import_raw_dda_data', 'alphapept/io.py'),
                               'alphapept.io.import_sciex_as_alphapept': ('io.html#import_sciex_as_alphapept', 'alphapept/io.py'),
                               'alphapept.io.index_ragged_list': ('io.html#index_ragged_list', 'alphapept/io.py'),
                               'alphapept.io.list_to_numpy_f32': ('io.html#list_to_numpy_f32', 'alphapept/io.py'),
@@ -270,7 +406,13 @@ d = { 'settings': { 'branch': 'master',
                               'alphapept.io.load_thermo_raw': ('io.html#load_thermo_raw', 'alphapept/io.py'),
                               'alphapept.io.one_over_k0_to_CCS': ('io.html#one_over_k0_to_ccs', 'alphapept/io.py'),
                               'alphapept.io.parse_mq_seq': ('io.html#parse_mq_seq', 'alphapept/io.py'),
-                              'alphapept.io.raw_conversion': ('io.html#raw_conversion', 'alphapept/io.py')},
+                              'alphapept.io.raw_conversion': ('io.html#raw_conversion', 'alphapept/io.py'),
+                              'alphapept.io.read': ('io.html#read', 'alphapept/io.py'),
+                              'alphapept.io.read_DDA_query_data': ('io.html#read_dda_query_data', 'alphapept/io.py'),
+                              'alphapept.io.read_column': ('io.html#read_column', 'alphapept/io.py'),
+                              'alphapept.io.set_storage_policy': ('io.html#set_storage_policy', 'alphapept/io.py'),
+                              'alphapept.io.table_columns': ('io.html#table_columns', 'alphapept/io.py'),
+                              'alphapept.io.write': ('io.html#write', 'alphapept/io.py')},
             'alphapept.label': { 'alphapept.label.find_labels': ('label.html#find_labels', 'alphapept/label.py'),
                                  'alphapept.label.label_search': ('label.html#label_search', 'alphapept/label.py'),
                                  'alphapept.label.search_label_on_ms_file': ('label.html#search_label_on_ms_file', 'alphapept/label.py')},
@@ -383,25 +525,66 @@ d = { 'settings': { 'branch': 'master',
                                  'alphapept.score.score_psms': ('score.html#score_psms', 'alphapept/score.py'),
                                  'alphapept.score.score_x_tandem': ('score.html#score_x_tandem', 'alphapept/score.py'),
                                  'alphapept.score.train_RF': ('score.html#train_rf', 'alphapept/score.py')},
-            'alphapept.search': { 'alphapept.search.add_column': ('search.html#add_column', 'alphapept/search.py'),
+            'alphapept.search': { 'alphapept.search.TopNAccumulator': ('search.html#topnaccumulator', 'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator.__init__': ( 'search.html#topnaccumulator.__init__',
+                                                                                 'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator._compact': ( 'search.html#topnaccumulator._compact',
+                                                                                 'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator._merge_proteins': ( 'search.html#topnaccumulator._merge_proteins',
+                                                                                        'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator._resize': ( 'search.html#topnaccumulator._resize',
+                                                                                'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator.add': ('search.html#topnaccumulator.add', 'alphapept/search.py'),
+                                  'alphapept.search.TopNAccumulator.to_df': ('search.html#topnaccumulator.to_df', 'alphapept/search.py'),
+                                  'alphapept.search.add_column': ('search.html#add_column', 'alphapept/search.py'),
                                   'alphapept.search.compare_frags': ('search.html#compare_frags', 'alphapept/search.py'),
+                                  'alphapept.search.compare_spectrum_compact': ( 'search.html#compare_spectrum_compact',
+                                                                                 'alphapept/search.py'),
+                                  'alphapept.search.compare_spectrum_fragment_index': ( 'search.html#compare_spectrum_fragment_index',
+                                                                                        'alphapept/search.py'),
+                                  'alphapept.search.compare_spectrum_open_search': ( 'search.html#compare_spectrum_open_search',
+                                                                                     'alphapept/search.py'),
                                   'alphapept.search.compare_spectrum_parallel': ( 'search.html#compare_spectrum_parallel',
                                                                                   'alphapept/search.py'),
+                                  'alphapept.search.concat_query_data': ('search.html#concat_query_data', 'alphapept/search.py'),
+                                  'alphapept.search.count_ions': ('search.html#count_ions', 'alphapept/search.py'),
+                                  'alphapept.search.count_shared_fragments': ('search.html#count_shared_fragments', 'alphapept/search.py'),
+                                  'alphapept.search.create_fragment_index': ('search.html#create_fragment_index', 'alphapept/search.py'),
+                                  'alphapept.search.create_shifted_fragment_index': ( 'search.html#create_shifted_fragment_index',
+                                                                                      'alphapept/search.py'),
+                                  'alphapept.search.fill_score_columns': ('search.html#fill_score_columns', 'alphapept/search.py'),
                                   'alphapept.search.filter_top_n': ('search.html#filter_top_n', 'alphapept/search.py'),
                                   'alphapept.search.frag_delta': ('search.html#frag_delta', 'alphapept/search.py'),
+                                  'alphapept.search.get_batch_search_settings': ( 'search.html#get_batch_search_settings',
+                                                                                  'alphapept/search.py'),
+                                  'alphapept.search.get_calibrated_search_settings': ( 'search.html#get_calibrated_search_settings',
+                                                                                       'alphapept/search.py'),
+                                  'alphapept.search.get_fragment_index': ('search.html#get_fragment_index', 'alphapept/search.py'),
                                   'alphapept.search.get_hits': ('search.html#get_hits', 'alphapept/search.py'),
                                   'alphapept.search.get_idxs': ('search.html#get_idxs', 'alphapept/search.py'),
                                   'alphapept.search.get_psms': ('search.html#get_psms', 'alphapept/search.py'),
+                                  'alphapept.search.get_query_mass_range': ('search.html#get_query_mass_range', 'alphapept/search.py'),
+                                  'alphapept.search.get_query_tiles': ('search.html#get_query_tiles', 'alphapept/search.py'),
+                                  'alphapept.search.get_reduced_database': ('search.html#get_reduced_database', 'alphapept/search.py'),
                                   'alphapept.search.get_score_columns': ('search.html#get_score_columns', 'alphapept/search.py'),
                                   'alphapept.search.get_sequences': ('search.html#get_sequences', 'alphapept/search.py'),
+                                  'alphapept.search.insert_top_n': ('search.html#insert_top_n', 'alphapept/search.py'),
+                                  'alphapept.search.insert_top_n_psms': ('search.html#insert_top_n_psms', 'alphapept/search.py'),
                                   'alphapept.search.intensity_fraction': ('search.html#intensity_fraction', 'alphapept/search.py'),
                                   'alphapept.search.ion_extractor': ('search.html#ion_extractor', 'alphapept/search.py'),
+                                  'alphapept.search.mass_shift_histogram': ('search.html#mass_shift_histogram', 'alphapept/search.py'),
                                   'alphapept.search.plot_psms': ('search.html#plot_psms', 'alphapept/search.py'),
                                   'alphapept.search.ppm_to_dalton': ('search.html#ppm_to_dalton', 'alphapept/search.py'),
                                   'alphapept.search.query_data_to_features': ('search.html#query_data_to_features', 'alphapept/search.py'),
                                   'alphapept.search.remove_column': ('search.html#remove_column', 'alphapept/search.py'),
+                                  'alphapept.search.rescore_psms': ('search.html#rescore_psms', 'alphapept/search.py'),
                                   'alphapept.search.score': ('search.html#score', 'alphapept/search.py'),
+                                  'alphapept.search.score_batch_psms': ('search.html#score_batch_psms', 'alphapept/search.py'),
+                                  'alphapept.search.score_candidate': ('search.html#score_candidate', 'alphapept/search.py'),
+                                  'alphapept.search.score_candidate_shifted': ( 'search.html#score_candidate_shifted',
+                                                                                'alphapept/search.py'),
                                   'alphapept.search.search_db': ('search.html#search_db', 'alphapept/search.py'),
+                                  'alphapept.search.search_db_batch': ('search.html#search_db_batch', 'alphapept/search.py'),
                                   'alphapept.search.search_fasta_block': ('search.html#search_fasta_block', 'alphapept/search.py'),
                                   'alphapept.search.search_parallel': ('search.html#search_parallel', 'alphapept/search.py'),
                                   'alphapept.search.store_hdf': ('search.html#store_hdf', 'alphapept/search.py')},
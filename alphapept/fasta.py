@@ -1,14 +1,30 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/03_fasta.ipynb.
 
 # %% auto 0
-__all__ = ['mass_dict', 'get_missed_cleavages', 'cleave_sequence', 'count_missed_cleavages', 'count_internal_cleavages', 'parse',
-           'list_to_numba', 'get_decoy_sequence', 'swap_KR', 'swap_AL', 'get_decoys', 'add_decoy_tag', 'add_fixed_mods',
-           'add_variable_mod', 'get_isoforms', 'add_variable_mods', 'add_fixed_mod_terminal', 'add_fixed_mods_terminal',
-           'add_variable_mods_terminal', 'get_unique_peptides', 'generate_peptides', 'check_peptide', 'get_precmass',
-           'get_fragmass', 'get_frag_dict', 'get_spectrum', 'get_spectra', 'read_fasta_file', 'read_fasta_file_entries',
-           'check_sequence', 'add_to_pept_dict', 'merge_pept_dicts', 'generate_fasta_list', 'generate_database',
-           'generate_spectra', 'block_idx', 'blocks', 'digest_fasta_block', 'generate_database_parallel',
-           'pept_dict_from_search', 'save_database', 'read_database']
+__all__ = ['TOKEN_PATTERN', 'mass_dict', 'DATABASE_IGNORED_SETTINGS', 'PRECURSOR_BUCKET_WIDTH', 'COMPACT_FRAGMENT_ARRAYS',
+           'COMPACT_DATABASE_ARRAYS', 'FLAT_DATABASE_ARRAYS', 'FLAT_PACKED_ARRAYS', 'FRAGMENT_INDEX_ARRAYS',
+           'FRAGMENT_INDEX_BIN_WIDTH', 'SHARD_BIN_WIDTH', 'SPECTRA_CHUNK_ARRAYS', 'SPECTRUM_OVERHEAD_BYTES',
+           'FRAGMENT_BYTES', 'get_missed_cleavages', 'cleave_sequence', 'count_missed_cleavages',
+           'count_internal_cleavages', 'parse', 'list_to_numba', 'get_decoy_sequence', 'swap_KR', 'swap_AL',
+           'get_decoys', 'unswap_AL', 'get_target_sequences', 'add_decoy_tag', 'add_fixed_mods', 'add_variable_mod',
+           'get_isoforms', 'add_variable_mods', 'add_fixed_mod_terminal', 'add_fixed_mods_terminal',
+           'add_variable_mods_terminal', 'get_unique_peptides', 'generate_peptides', 'check_peptide', 'tokenize',
+           'get_digestion_tables', 'digest_tokens', 'encode_sequence', 'DigestionCache', 'get_digestion_cache',
+           'digest_sequences', 'get_precmass', 'get_fragmass', 'get_frag_dict', 'get_spectrum', 'get_spectra',
+           'read_fasta_file', 'read_fasta_file_entries', 'check_sequence', 'add_to_pept_dict', 'merge_pept_dicts',
+           'pack_sequences', 'unpack_sequences', 'PeptideMap', 'get_peptide_map', 'generate_fasta_list',
+           'generate_database', 'generate_spectra', 'block_idx', 'blocks', 'digest_fasta_block',
+           'generate_database_parallel', 'pept_dict_from_search', 'get_database_settings', 'save_database',
+           'write_database', 'write_pept_dict', 'read_pept_dict', 'read_database', 'get_precursor_buckets',
+           'write_precursor_buckets', 'get_database_slice', 'read_database_slice', 'get_database_tokens',
+           'encode_peptides', 'compact_database', 'is_compact_database', 'get_compact_database', 'get_compact_spectrum',
+           'fill_compact_fragments', 'expand_compact_database', 'get_flat_database_pointer', 'get_flat_database_path',
+           'is_flat_database_current', 'export_flat_database', 'PackedSequences', 'read_flat_database',
+           'export_fragment_index', 'read_fragment_index', 'get_database_hash', 'remove_stale_lock',
+           'database_cache_lock', 'get_cached_database_path', 'copy_from_database_cache', 'add_to_database_cache',
+           'evict_database_cache', 'merge_database_spectra', 'update_database', 'write_spectra_chunk',
+           'digest_fasta_block_to_chunk', 'get_shard_edges', 'merge_spectra_chunks', 'generate_database_sharded',
+           'sample_fasta', 'estimate_database']
 
 # %% ../nbs/03_fasta.ipynb 5
 from . import constants
@@ -237,6 +253,65 @@ def get_decoys(peptide_list, pseudo_reverse=False, AL_swap=False, KR_swap = Fals
     decoys.extend([get_decoy_sequence(peptide, pseudo_reverse, AL_swap, KR_swap) for peptide in peptide_list])
     return decoys
 
+def unswap_AL(peptide:list)->list:
+    """
+    Get all peptides that swap_AL() maps to the given peptide.
+    A peptide can have several, e.g. both 'AG' and 'GA' are swapped to 'GA'.
+    Args:
+        peptide (list): peptide with swapped ALs.
+    Returns:
+        list (of list): the peptides before swapping.
+    """
+    peptide = list(peptide)
+    n = len(peptide)
+    results = []
+
+    def unswap(i, prefix):
+        if i >= n - 1:
+            results.append(prefix + peptide[i:])
+            return
+        # No swap at i, only if the amino acid is not A or L
+        if peptide[i] not in ("A", "L"):
+            unswap(i + 1, prefix + [peptide[i]])
+        # A or L at i was swapped with i + 1
+        if peptide[i + 1] in ("A", "L"):
+            unswap(i + 2, prefix + [peptide[i + 1], peptide[i]])
+
+    unswap(0, [])
+
+    return results
+
+def get_target_sequences(decoy:str, pseudo_reverse:bool=False, AL_swap:bool=False, KR_swap:bool = False)->list:
+    """
+    Get the target peptides of a decoy, the inverse of get_decoy_sequence().
+    Args:
+        decoy (str): decoy peptide without the '_decoy' tag.
+        pseudo_reverse (bool): If True, reverse the peptide bug keep the C-terminal amino acid; otherwise reverse the whole peptide. (Default: False)
+        AL_swap (bool): replace A with L, and vice versa. (Default: False)
+        KR_swap (bool): replace K with R at the C-terminal, and vice versa. (Default: False)
+    Returns:
+        list (of str): all peptides with this decoy, more than one only with AL_swap.
+    """
+    rev_pep = parse(decoy)
+
+    if KR_swap:
+        rev_pep = swap_KR(rev_pep)
+
+    if AL_swap:
+        rev_peps = unswap_AL(rev_pep)
+    else:
+        rev_peps = [list(rev_pep)]
+
+    targets = []
+    for rev_pep in rev_peps:
+        if pseudo_reverse:
+            pep = rev_pep[:-1][::-1] + rev_pep[-1:]
+        else:
+            pep = rev_pep[::-1]
+        targets.append("".join(pep))
+
+    return targets
+
 def add_decoy_tag(peptides):
     """
     Adds a '_decoy' tag to a list of peptides
@@ -518,6 +593,698 @@ def check_peptide(peptide:str, AAs:set)->bool:
         return False
 
 # %% ../nbs/03_fasta.ipynb 48
+import functools
+import json
+import sys
+import logging
+import numba
+import numpy as np
+from numba import njit
+from numba.typed import List
+from collections import OrderedDict
+
+TOKEN_PATTERN = re.compile('[^A-Z]*[A-Z]')
+
+def tokenize(sequence:str)->list:
+    """
+    Splits a (modified) sequence into amino acids and modified amino acids. This is the same as `parse` but returns a Python list.
+    Args:
+        sequence (str): modified sequence.
+    Returns:
+        list (of str): the list of amino acids and modified amino acids.
+    """
+    return TOKEN_PATTERN.findall(sequence)
+
+
+@functools.lru_cache()
+def get_digestion_tables(mods_fixed:tuple, mods_fixed_terminal:tuple, mods_variable:tuple, mods_variable_terminal:tuple, mods_fixed_terminal_prot:tuple, mods_variable_terminal_prot:tuple)->tuple:
+    """
+    Creates the integer encoding and the lookup tables for the compiled digestion.
+    Every (modified) amino acid is a token and each modification step is a table that maps a token to a list of tokens.
+    Args:
+        mods_fixed (tuple of str): fixed modifications.
+        mods_fixed_terminal (tuple of str): fixed terminal modifications.
+        mods_variable (tuple of str): variable modifications.
+        mods_variable_terminal (tuple of str): variable terminal modifications.
+        mods_fixed_terminal_prot (tuple of str): fixed terminal modifications on proteins.
+        mods_variable_terminal_prot (tuple of str): variable terminal modifications on proteins.
+    Returns:
+        tuple: the token strings, a dict to look up the token ids and a dict with the numpy arrays of the tables.
+    """
+    token_strs = []
+    token_ids = {}
+
+    def add_token(token):
+        if token not in token_ids:
+            token_ids[token] = len(token_strs)
+            token_strs.append(token)
+        return token_ids[token]
+
+    def add_tokens(sequence):
+        return [add_token(_) for _ in tokenize(sequence)]
+
+    # Plain amino acids, the id of a letter is its offset to 'A'
+    for aa in range(ord('A'), ord('Z')+1):
+        add_token(chr(aa))
+
+    # Terminal tokens of the proteins
+    prot_n = [_ for _ in mods_fixed_terminal_prot if '<' in _], [_ for _ in mods_variable_terminal_prot if '<' in _]
+    prot_c = [_ for _ in mods_fixed_terminal_prot if '<' not in _], [_ for _ in mods_variable_terminal_prot if '<' not in _]
+    prot_all = list(mods_fixed_terminal_prot), list(mods_variable_terminal_prot)
+    for aa in token_strs.copy():
+        for fixed, variable in [prot_n, prot_c, prot_all]:
+            for sequence in add_variable_mods_terminal(add_fixed_mods_terminal([aa], fixed), variable):
+                add_tokens(sequence)
+
+    def get_table(function):
+        table = [add_tokens(function(_)) for _ in token_strs.copy()]
+        indptr = np.zeros(len(token_strs)+1, dtype=np.int64)
+        indptr[1:len(table)+1] = np.cumsum([len(_) for _ in table])
+        # Tokens created later are never input to this step
+        indptr[len(table)+1:] = indptr[len(table)]
+        return indptr, np.array([_ for ids in table for _ in ids], dtype=np.int32)
+
+    n_valid = len(token_strs)
+    tables = {}
+    tables['fixed_indptr'], tables['fixed_ids'] = get_table(lambda _: add_fixed_mods([_], list(mods_fixed))[0])
+
+    terminal_mods = list(mods_fixed_terminal)
+    terminal_mods += [_ for _ in mods_variable_terminal if '<' in _]
+    terminal_mods += [_ for _ in mods_variable_terminal if '>' in _]
+    terminal_tables = [get_table(lambda _: add_fixed_mod_terminal([_], mod)[0]) for mod in terminal_mods]
+
+    mods_variable_r = {}
+    for _ in mods_variable:
+        mods_variable_r[_[-1]] = _
+    tables['var_keys'] = np.array([add_token(_) for _ in mods_variable_r], dtype=np.int32)
+    tables['var_mods'] = np.array([add_token(_) for _ in mods_variable_r.values()], dtype=np.int32)
+
+    n_tokens = len(token_strs)
+    tables['terminal_indptr'] = np.zeros((len(terminal_tables), n_tokens+1), dtype=np.int64)
+    offset = 0
+    for i, (indptr, ids) in enumerate(terminal_tables):
+        tables['terminal_indptr'][i, :len(indptr)] = indptr + offset
+        tables['terminal_indptr'][i, len(indptr):] = indptr[-1] + offset
+        offset += len(ids)
+    tables['terminal_ids'] = np.concatenate([ids for indptr, ids in terminal_tables] + [np.zeros(0, dtype=np.int32)])
+    tables['terminal_n'] = np.array(['<^' in _ or ('>^' not in _ and '<' in _) for _ in terminal_mods], dtype=np.bool_)
+    tables['n_fixed_terminal'] = len(mods_fixed_terminal)
+    tables['n_variable_n'] = len([_ for _ in mods_variable_terminal if '<' in _])
+    tables['n_variable_c'] = len([_ for _ in mods_variable_terminal if '>' in _])
+
+    tables['token_len'] = np.array([len(_) for _ in token_strs], dtype=np.int64)
+    tables['token_valid'] = np.zeros(n_tokens, dtype=np.bool_)
+    tables['token_valid'][:n_valid] = [set([_ for _ in token if _.isupper()]).issubset(constants.AAs) for token in token_strs[:n_valid]]
+
+    return token_strs, token_ids, tables
+
+
+@njit
+def _replace_terminal(peptide:np.ndarray, n_terminal:bool, indptr:np.ndarray, ids:np.ndarray)->np.ndarray:
+    """
+    Replaces the first (n_terminal) or last token of a peptide with its entry in a token table.
+    """
+    if n_terminal:
+        token = peptide[0]
+        replacement = ids[indptr[token]:indptr[token+1]]
+        return np.concatenate((replacement, peptide[1:]))
+    else:
+        token = peptide[-1]
+        replacement = ids[indptr[token]:indptr[token+1]]
+        return np.concatenate((peptide[:-1], replacement))
+
+
+@njit
+def _add_unique(peptides:List, peptide:np.ndarray):
+    """
+    Appends a peptide to a list of peptides if it is not present yet.
+    """
+    for _ in peptides:
+        if len(_) == len(peptide) and np.all(_ == peptide):
+            return
+    peptides.append(peptide)
+
+
+@njit
+def _modify_peptide(peptide:np.ndarray, fixed_indptr:np.ndarray, fixed_ids:np.ndarray, terminal_indptr:np.ndarray, terminal_ids:np.ndarray, terminal_n:np.ndarray, n_fixed_terminal:int, n_variable_n:int, n_variable_c:int, var_keys:np.ndarray, var_mods:np.ndarray, isoforms_max:int, n_modifications_max:int, out:List):
+    """
+    Compiled version of the modification steps in `generate_peptides` for an integer-encoded peptide. Writes the modified peptides to out.
+    """
+    # Fixed mods
+    n = 0
+    for token in peptide:
+        n += fixed_indptr[token+1] - fixed_indptr[token]
+    mod_peptide = np.empty(n, dtype=np.int32)
+    n = 0
+    for token in peptide:
+        for i in range(fixed_indptr[token], fixed_indptr[token+1]):
+            mod_peptide[n] = fixed_ids[i]
+            n += 1
+
+    # Fixed terminal mods
+    for i in range(n_fixed_terminal):
+        mod_peptide = _replace_terminal(mod_peptide, terminal_n[i], terminal_indptr[i], terminal_ids)
+
+    # Variable terminal mods, N-terminal first then C-terminal
+    mod_peptides = List()
+    mod_peptides.append(mod_peptide)
+    for i in range(n_fixed_terminal, n_fixed_terminal + n_variable_n):
+        _add_unique(mod_peptides, _replace_terminal(mod_peptide, terminal_n[i], terminal_indptr[i], terminal_ids))
+    for i in range(n_fixed_terminal + n_variable_n, n_fixed_terminal + n_variable_n + n_variable_c):
+        for j in range(len(mod_peptides)):
+            _add_unique(mod_peptides, _replace_terminal(mod_peptides[j], terminal_n[i], terminal_indptr[i], terminal_ids))
+
+    if len(var_keys) == 0:
+        for _ in mod_peptides:
+            out.append(_)
+        return
+
+    # Variable mods, see get_isoforms
+    max_ = isoforms_max - 2 * len(mod_peptides) + 1
+    for mod_peptide in mod_peptides:
+        out.append(mod_peptide)
+        n_isoforms = 1
+
+        new_peps = List()
+        new_peps.append(mod_peptide)
+        min_idxs = List()
+        min_idxs.append(0)
+
+        iteration = 0
+        while n_isoforms < max_:
+            if n_modifications_max > 0 and iteration >= n_modifications_max:
+                break
+
+            next_peps = List()
+            next_idxs = List()
+            for j in range(len(new_peps)):
+                pep = new_peps[j]
+                for k in range(len(var_keys)):
+                    for i in range(min_idxs[j], len(pep)):
+                        if pep[i] == var_keys[k]:
+                            next_pep = pep.copy()
+                            next_pep[i] = var_mods[k]
+                            next_peps.append(next_pep)
+                            next_idxs.append(i)
+            new_peps = next_peps
+            min_idxs = next_idxs
+
+            if len(new_peps) == 0:
+                break
+            if len(new_peps) > 1:
+                if len(new_peps[0]) == len(new_peps[1]) and np.all(new_peps[0] == new_peps[1]):
+                    new_peps = new_peps[0:1]
+                    min_idxs = min_idxs[0:1]
+
+            for _ in new_peps:
+                if n_isoforms < max_:
+                    out.append(_)
+                    n_isoforms += 1
+
+            iteration += 1
+
+
+@njit
+def _get_decoy_tokens(peptide:np.ndarray, pseudo_reverse:bool, AL_swap:bool, KR_swap:bool, A:int, L:int, K:int, R:int)->np.ndarray:
+    """
+    Compiled version of `get_decoy_sequence` for an integer-encoded peptide.
+    """
+    if pseudo_reverse:
+        decoy = np.concatenate((peptide[:-1][::-1], peptide[-1:]))
+    else:
+        decoy = peptide[::-1].copy()
+
+    if AL_swap:
+        i = 0
+        while i < len(decoy) - 1:
+            if decoy[i] == A:
+                decoy[i] = decoy[i + 1]
+                decoy[i + 1] = A
+                i += 1
+            elif decoy[i] == L:
+                decoy[i] = decoy[i + 1]
+                decoy[i + 1] = L
+                i += 1
+            i += 1
+
+    if KR_swap:
+        if decoy[-1] == K:
+            decoy[-1] = R
+        elif decoy[-1] == R:
+            decoy[-1] = K
+
+    return decoy
+
+
+@njit
+def _hash_tokens(tokens:np.ndarray)->int:
+    """
+    FNV-1a hash of the token ids of a peptide.
+    """
+    h = np.uint64(14695981039346656037)
+    for token in tokens:
+        h ^= np.uint64(token)
+        h *= np.uint64(1099511628211)
+
+    return np.int64(h)
+
+
+@njit
+def _tokens_equal(a:np.ndarray, b:np.ndarray)->bool:
+    """
+    Check if two peptides have the same token ids.
+    """
+    if len(a) != len(b):
+        return False
+    for i in range(len(a)):
+        if a[i] != b[i]:
+            return False
+
+    return True
+
+
+@njit
+def _find_isoforms(peptide:np.ndarray, key:int, isoform_table:np.ndarray, isoform_hashes:np.ndarray, isoform_offsets:np.ndarray, isoform_data:np.ndarray)->int:
+    """
+    Find the slot of a peptide in the hash table of the isoform cache with linear probing.
+    Returns the slot of its entry or of the first empty slot if the peptide is not cached.
+    """
+    mask = len(isoform_table) - 1
+    slot = key & mask
+    while True:
+        entry = isoform_table[slot]
+        if entry < 0:
+            return slot
+        if isoform_hashes[entry] == key:
+            pos = isoform_offsets[entry]
+            if _tokens_equal(isoform_data[pos + 1:pos + 1 + isoform_data[pos]], peptide):
+                return slot
+        slot = (slot + 1) & mask
+
+
+@njit
+def _add_isoforms(peptide:np.ndarray, key:int, slot:int, out:List, out_decoy:List, n_start:int, isoform_table:np.ndarray, isoform_hashes:np.ndarray, isoform_offsets:np.ndarray, isoform_data:np.ndarray, isoform_state:np.ndarray):
+    """
+    Add the modified forms out[n_start:] of a peptide to the isoform cache, see `DigestionCache`.
+    If the peptide does not fit, the cache is marked as full.
+    """
+    n_entries = isoform_state[0]
+    pos = isoform_state[1]
+
+    n_needed = 2 + len(peptide)
+    for j in range(n_start, len(out)):
+        n_needed += 2 + len(out[j])
+
+    # The hash table is kept at most half full
+    if n_entries >= len(isoform_hashes) or 2 * (n_entries + 1) > len(isoform_table) or pos + n_needed > len(isoform_data):
+        isoform_state[2] = 1
+        return
+
+    isoform_table[slot] = n_entries
+    isoform_hashes[n_entries] = key
+    isoform_offsets[n_entries] = pos
+
+    isoform_data[pos] = len(peptide)
+    isoform_data[pos + 1:pos + 1 + len(peptide)] = peptide
+    pos += 1 + len(peptide)
+    isoform_data[pos] = len(out) - n_start
+    pos += 1
+    for j in range(n_start, len(out)):
+        # The first element of out is a placeholder
+        isoform_data[pos] = 1 if out_decoy[j-1] else 0
+        isoform_data[pos + 1] = len(out[j])
+        isoform_data[pos + 2:pos + 2 + len(out[j])] = out[j]
+        pos += 2 + len(out[j])
+
+    isoform_state[0] = n_entries + 1
+    isoform_state[1] = pos
+
+
+@njit
+def digest_tokens(tokens:np.ndarray, token_indptr:np.ndarray, cuts:np.ndarray, cut_indptr:np.ndarray, n_missed_cleavages:int, pep_length_min:int, pep_length_max:int, token_len:np.ndarray, token_valid:np.ndarray, fixed_indptr:np.ndarray, fixed_ids:np.ndarray, terminal_indptr:np.ndarray, terminal_ids:np.ndarray, terminal_n:np.ndarray, n_fixed_terminal:int, n_variable_n:int, n_variable_c:int, var_keys:np.ndarray, var_mods:np.ndarray, isoforms_max:int, n_modifications_max:int, pseudo_reverse:bool, AL_swap:bool, KR_swap:bool, isoform_table:np.ndarray, isoform_hashes:np.ndarray, isoform_offsets:np.ndarray, isoform_data:np.ndarray, isoform_state:np.ndarray)->tuple:
+    """
+    Compiled in-silico digestion of integer-encoded sequences. The same steps as in `generate_peptides` are performed for each sequence.
+    Args:
+        tokens (np.ndarray): token ids of all sequences.
+        token_indptr (np.ndarray): the tokens of sequence i are at tokens[token_indptr[i]:token_indptr[i+1]].
+        cuts (np.ndarray): the cleavage sites as token positions, starting with 0 and ending with the length of each sequence.
+        cut_indptr (np.ndarray): the cleavage sites of sequence i are at cuts[cut_indptr[i]:cut_indptr[i+1]].
+        n_missed_cleavages (int): the number of max missed cleavages.
+        pep_length_min (int): min peptide length.
+        pep_length_max (int): max peptide length.
+        token_len, token_valid, fixed_indptr, fixed_ids, terminal_indptr, terminal_ids, terminal_n, n_fixed_terminal, n_variable_n, n_variable_c, var_keys, var_mods: see `get_digestion_tables`.
+        isoforms_max (int): max number of modified forms per peptide sequence.
+        n_modifications_max (int): max number of variable modifications per peptide, 0 for no limit.
+        pseudo_reverse (bool): If True, reverse the peptide but keep the C-terminal amino acid.
+        AL_swap (bool): replace A with L, and vice versa.
+        KR_swap (bool): replace K with R at the C-terminal, and vice versa.
+        isoform_table, isoform_hashes, isoform_offsets, isoform_data, isoform_state: the isoform cache, see `DigestionCache`. An empty isoform_table disables it.
+    Returns:
+        np.ndarray: token ids of all peptides.
+        np.ndarray: indptr to the peptides.
+        np.ndarray: boolean array that is True for decoys.
+        np.ndarray: the index of the sequence for each peptide.
+        int: number of peptides that were found in the isoform cache.
+        int: number of peptides that were not found in the isoform cache.
+    """
+    # Token ids of the plain amino acids are the offset to 'A'
+    A, L, K, R = 0, 11, 10, 17
+
+    out = List()
+    out.append(np.zeros(0, dtype=np.int32))
+    out_decoy = List()
+    out_idx = List()
+
+    n_hits = 0
+    n_misses = 0
+
+    for seq_idx in range(len(token_indptr)-1):
+        sequence = tokens[token_indptr[seq_idx]:token_indptr[seq_idx+1]]
+        cutpos = cuts[cut_indptr[seq_idx]:cut_indptr[seq_idx+1]]
+        n_base = len(cutpos) - 1
+
+        # Peptides as start and end tokens, see cleave_sequence and get_missed_cleavages
+        starts = List()
+        ends = List()
+        for i in range(n_base):
+            starts.append(cutpos[i])
+            ends.append(cutpos[i+1])
+        for n_missed in range(1, n_missed_cleavages+1):
+            if n_missed == n_base:
+                starts.append(cutpos[n_base-1])
+                ends.append(cutpos[n_base])
+            for k in range(1, n_base - n_missed + 1):
+                starts.append(cutpos[k-1])
+                ends.append(cutpos[k+n_missed])
+
+        for i in range(len(starts)):
+            peptide = sequence[starts[i]:ends[i]]
+
+            length = 0
+            valid = True
+            for token in peptide:
+                length += token_len[token]
+                valid &= token_valid[token]
+
+            if length < pep_length_min or length > pep_length_max or not valid:
+                continue
+
+            key = 0
+            slot = -1
+            if len(isoform_table) > 0:
+                key = _hash_tokens(peptide)
+                slot = _find_isoforms(peptide, key, isoform_table, isoform_hashes, isoform_offsets, isoform_data)
+                entry = isoform_table[slot]
+                if entry >= 0:
+                    # Entry layout: key length, key tokens, number of isoforms, then decoy flag, length and tokens of each isoform
+                    pos = isoform_offsets[entry]
+                    pos += 1 + isoform_data[pos]
+                    n_cached = isoform_data[pos]
+                    pos += 1
+                    for j in range(n_cached):
+                        length = isoform_data[pos + 1]
+                        out.append(isoform_data[pos + 2:pos + 2 + length])
+                        out_decoy.append(isoform_data[pos] == 1)
+                        out_idx.append(seq_idx)
+                        pos += 2 + length
+                    n_hits += 1
+                    continue
+                n_misses += 1
+
+            n_start = len(out)
+            n_out = n_start
+            _modify_peptide(peptide, fixed_indptr, fixed_ids, terminal_indptr, terminal_ids, terminal_n, n_fixed_terminal, n_variable_n, n_variable_c, var_keys, var_mods, isoforms_max, n_modifications_max, out)
+            for _ in range(len(out) - n_out):
+                out_decoy.append(False)
+                out_idx.append(seq_idx)
+
+            decoy = _get_decoy_tokens(peptide, pseudo_reverse, AL_swap, KR_swap, A, L, K, R)
+            n_out = len(out)
+            _modify_peptide(decoy, fixed_indptr, fixed_ids, terminal_indptr, terminal_ids, terminal_n, n_fixed_terminal, n_variable_n, n_variable_c, var_keys, var_mods, isoforms_max, n_modifications_max, out)
+            for _ in range(len(out) - n_out):
+                out_decoy.append(True)
+                out_idx.append(seq_idx)
+
+            if slot >= 0:
+                _add_isoforms(peptide, key, slot, out, out_decoy, n_start, isoform_table, isoform_hashes, isoform_offsets, isoform_data, isoform_state)
+
+    # First element is a placeholder for typing
+    n_peptides = len(out) - 1
+    indptr = np.zeros(n_peptides + 1, dtype=np.int64)
+    for i in range(n_peptides):
+        indptr[i+1] = indptr[i] + len(out[i+1])
+    peptides = np.empty(indptr[-1], dtype=np.int32)
+    decoys = np.empty(n_peptides, dtype=np.bool_)
+    seq_idxs = np.empty(n_peptides, dtype=np.int64)
+    for i in range(n_peptides):
+        peptides[indptr[i]:indptr[i+1]] = out[i+1]
+        decoys[i] = out_decoy[i]
+        seq_idxs[i] = out_idx[i]
+
+    return peptides, indptr, decoys, seq_idxs, n_hits, n_misses
+
+
+def encode_sequence(sequence:str, token_ids:dict, pattern:re.Pattern)->tuple:
+    """
+    Integer-encodes a (protein) sequence and finds its cleavage sites.
+    Args:
+        sequence (str): the given (protein) sequence.
+        token_ids (dict): dictionary to look up the token ids. See `get_digestion_tables`.
+        pattern (re.Pattern): compiled pattern of the protease.
+    Returns:
+        np.ndarray: token ids, None if the sequence can not be encoded.
+        np.ndarray: cleavage sites as token positions, starting with 0 and ending with the number of tokens.
+    """
+    if not sequence.isascii() or '_' in sequence:
+        return None, None
+
+    cutpos = [m.start()+1 for m in pattern.finditer(sequence)]
+
+    if sequence.isalpha() and sequence.isupper():
+        # Plain sequence, the token id is the offset to 'A'
+        tokens = np.frombuffer(sequence.encode(), dtype=np.uint8).astype(np.int32) - ord('A')
+        cuts = np.array([0] + cutpos + [len(sequence)], dtype=np.int64)
+        return tokens, cuts
+
+    token_strs = tokenize(sequence)
+    token_ends = np.cumsum([len(_) for _ in token_strs])
+    if len(token_ends) == 0 or token_ends[-1] != len(sequence):
+        return None, None
+
+    tokens = np.array([token_ids.get(_, -1) for _ in token_strs], dtype=np.int32)
+    cuts = np.searchsorted(token_ends, cutpos) + 1
+    if np.any(tokens < 0) or np.any(token_ends[cuts-1] != cutpos):
+        # Unknown tokens or cleavage site within a modified amino acid
+        return None, None
+
+    return tokens, np.concatenate(([0], cuts, [len(tokens)])).astype(np.int64)
+
+
+class DigestionCache():
+    """
+    Caches for the digestion of repeated sequences and peptides, bounded by their memory.
+
+    The sequence cache is a LRU cache of the peptides of a (protein) sequence, which are stored as one string.
+    The isoform cache stores the modified target and decoy token ids of a peptide and is used within `digest_tokens`.
+    It is kept in flat preallocated arrays: an open-addressing hash table, the hash and offset of each entry and
+    one int32 buffer with the key and isoform tokens of all entries. It is cleared once it is full.
+    A cache is only valid for one set of digestion settings.
+    Args:
+        sequence_cache_mb (float): max memory of the sequence cache in MB, 0 to disable it.
+        isoform_cache_mb (float): max memory of the isoform cache in MB, 0 to disable it.
+    """
+    # Expected bytes of an entry of the isoform cache, which sets the number of entries for a given size
+    ISOFORM_ENTRY_BYTES = 512
+
+    def __init__(self, sequence_cache_mb:float=64, isoform_cache_mb:float=128):
+        self.sequence_bytes_max = int(sequence_cache_mb * 1024**2)
+        self.sequence_bytes = 0
+        self.sequences = OrderedDict()
+        self.sequence_hits = 0
+        self.sequence_misses = 0
+
+        isoform_bytes = int(isoform_cache_mb * 1024**2)
+        n_entries = isoform_bytes // self.ISOFORM_ENTRY_BYTES
+        n_slots = 1 << int(2 * n_entries - 1).bit_length() if n_entries > 0 else 0
+        n_data = max(isoform_bytes - 16 * n_entries - 8 * n_slots, 0) // 4
+
+        self.isoform_table = np.empty(n_slots, dtype=np.int64)
+        self.isoform_hashes = np.empty(n_entries, dtype=np.int64)
+        self.isoform_offsets = np.empty(n_entries, dtype=np.int64)
+        self.isoform_data = np.empty(n_data, dtype=np.int32)
+        # Number of entries, used length of isoform_data and a flag that the cache is full
+        self.isoform_state = np.zeros(3, dtype=np.int64)
+        self.isoform_hits = 0
+        self.isoform_misses = 0
+        self.clear_isoforms()
+
+    def clear_isoforms(self):
+        """
+        Reset the isoform cache, hit counts are kept.
+        """
+        self.isoform_table.fill(-1)
+        self.isoform_state[:] = 0
+
+    @property
+    def isoform_full(self)->bool:
+        """
+        True if a peptide did not fit into the isoform cache.
+        """
+        return self.isoform_state[2] == 1
+
+    def get_sequence(self, sequence:str)->list:
+        """
+        Get the cached peptides of a sequence or None.
+        """
+        if self.sequence_bytes_max <= 0:
+            return None
+
+        peptides = self.sequences.get(sequence)
+        if peptides is None:
+            self.sequence_misses += 1
+            return None
+
+        self.sequence_hits += 1
+        self.sequences.move_to_end(sequence)
+
+        return peptides.split(',') if peptides else []
+
+    def add_sequence(self, sequence:str, peptides:list):
+        """
+        Add the peptides of a sequence and drop the least recently used sequences if the cache is full.
+        """
+        if self.sequence_bytes_max <= 0 or sequence in self.sequences:
+            return
+
+        joined = ','.join(peptides)
+        self.sequences[sequence] = joined
+        self.sequence_bytes += sys.getsizeof(sequence) + sys.getsizeof(joined)
+
+        while self.sequence_bytes > self.sequence_bytes_max and len(self.sequences) > 0:
+            sequence, joined = self.sequences.popitem(last=False)
+            self.sequence_bytes -= sys.getsizeof(sequence) + sys.getsizeof(joined)
+
+    def log(self):
+        """
+        Log the hit rates of the caches.
+        """
+        for name, hits, misses in [('Sequence', self.sequence_hits, self.sequence_misses), ('Isoform', self.isoform_hits, self.isoform_misses)]:
+            total = hits + misses
+            if total > 0:
+                logging.info(f'{name} digestion cache: {hits:,} of {total:,} lookups were hits ({hits/total:.2%}).')
+
+
+_digestion_cache = {}
+
+def get_digestion_cache(settings:dict)->DigestionCache:
+    """
+    Get the digestion cache of the current process.
+    The cache is shared by all fasta blocks that are digested in the process and is reset when the settings change.
+    Args:
+        settings (dict): the fasta settings, including digestion_cache_mb and isoform_cache_mb.
+    Returns:
+        DigestionCache: the cache for these settings.
+    """
+    key = json.dumps(settings, sort_keys=True, default=str)
+    if _digestion_cache.get('key') != key:
+        _digestion_cache['key'] = key
+        _digestion_cache['cache'] = DigestionCache(settings.get('digestion_cache_mb', 64), settings.get('isoform_cache_mb', 128))
+
+    return _digestion_cache['cache']
+
+
+def digest_sequences(sequences:list, cache:'DigestionCache'=None, **kwargs)->list:
+    """
+    Compiled version of `generate_peptides` for a list of (protein) sequences.
+    Args:
+        sequences (list of str): the given (protein) sequences.
+        cache (DigestionCache): optional cache for repeated sequences and peptides. Needs to be specific to the settings in kwargs.
+    Returns:
+        list (of list of str): all modified peptides for each sequence.
+    """
+    if cache is None:
+        cache = DigestionCache(0, 0)
+
+    token_strs, token_ids, tables = get_digestion_tables(*[tuple(kwargs[_]) for _ in ['mods_fixed', 'mods_fixed_terminal', 'mods_variable', 'mods_variable_terminal', 'mods_fixed_terminal_prot', 'mods_variable_terminal_prot']])
+    pattern = re.compile(constants.protease_dict[kwargs.get('protease', 'trypsin')])
+
+    all_peptides = [None for _ in sequences]
+
+    all_tokens = []
+    all_cuts = []
+    seq_idxs = []
+    first_idx = {}
+    duplicates = []
+    for seq_idx, sequence in enumerate(sequences):
+        if sequence in first_idx:
+            duplicates.append((seq_idx, first_idx[sequence]))
+            cache.sequence_hits += 1
+            continue
+        cached = cache.get_sequence(sequence)
+        if cached is not None:
+            all_peptides[seq_idx] = cached
+            continue
+        first_idx[sequence] = seq_idx
+        all_peptides[seq_idx] = []
+
+        mod_sequences = add_fixed_mods_terminal([sequence], kwargs['mods_fixed_terminal_prot'])
+        mod_sequences = add_variable_mods_terminal(mod_sequences, kwargs['mods_variable_terminal_prot'])
+
+        encoded = [encode_sequence(_, token_ids, pattern) for _ in mod_sequences]
+        if any(tokens is None for tokens, cuts in encoded):
+            # Fall back to the python implementation
+            all_peptides[seq_idx] = generate_peptides(sequence, **kwargs)
+            continue
+
+        for tokens, cuts in encoded:
+            all_tokens.append(tokens)
+            all_cuts.append(cuts)
+            seq_idxs.append(seq_idx)
+
+    if len(all_tokens) > 0:
+        token_indptr = np.zeros(len(all_tokens)+1, dtype=np.int64)
+        token_indptr[1:] = np.cumsum([len(_) for _ in all_tokens])
+        cut_indptr = np.zeros(len(all_cuts)+1, dtype=np.int64)
+        cut_indptr[1:] = np.cumsum([len(_) for _ in all_cuts])
+
+        n_modifications_max = kwargs['n_modifications_max'] if kwargs['n_modifications_max'] else 0
+
+        peptides, indptr, decoys, peptide_seq_idxs, n_hits, n_misses = digest_tokens(np.concatenate(all_tokens), token_indptr, np.concatenate(all_cuts), cut_indptr,
+            kwargs.get('n_missed_cleavages', 0), kwargs.get('pep_length_min', 6), kwargs.get('pep_length_max', 65),
+            tables['token_len'], tables['token_valid'], tables['fixed_indptr'], tables['fixed_ids'],
+            tables['terminal_indptr'], tables['terminal_ids'], tables['terminal_n'], tables['n_fixed_terminal'], tables['n_variable_n'], tables['n_variable_c'],
+            tables['var_keys'], tables['var_mods'], kwargs['isoforms_max'], n_modifications_max,
+            kwargs.get('pseudo_reverse', False), kwargs.get('AL_swap', False), kwargs.get('KR_swap', False),
+            cache.isoform_table, cache.isoform_hashes, cache.isoform_offsets, cache.isoform_data, cache.isoform_state)
+        cache.isoform_hits += n_hits
+        cache.isoform_misses += n_misses
+        if cache.isoform_full:
+            cache.clear_isoforms()
+
+        # Decode all peptides at once
+        token_chars = np.frombuffer(''.join(token_strs).encode(), dtype=np.uint8)
+        token_starts = np.cumsum(tables['token_len']) - tables['token_len']
+        lens = tables['token_len'][peptides]
+        offsets = np.cumsum(lens) - lens
+        chars = token_chars[np.repeat(token_starts[peptides] - offsets, lens) + np.arange(lens.sum())].tobytes().decode()
+        char_indptr = np.concatenate(([0], np.cumsum(lens)))[indptr]
+
+        for i, seq_idx in enumerate(np.array(seq_idxs)[peptide_seq_idxs].tolist()):
+            peptide = chars[char_indptr[i]:char_indptr[i+1]]
+            if decoys[i]:
+                peptide += "_decoy"
+            all_peptides[seq_idx].append(peptide)
+
+    for sequence, seq_idx in first_idx.items():
+        cache.add_sequence(sequence, all_peptides[seq_idx])
+
+    for seq_idx, source_idx in duplicates:
+        all_peptides[seq_idx] = list(all_peptides[source_idx])
+
+    return all_peptides
+
+
+# %% ../nbs/03_fasta.ipynb 55
 from numba import njit
 from numba.typed import List
 import numpy as np
@@ -539,7 +1306,7 @@ def get_precmass(parsed_pep:list, mass_dict:numba.typed.Dict)->float:
 
     return tmass
 
-# %% ../nbs/03_fasta.ipynb 52
+# %% ../nbs/03_fasta.ipynb 59
 import numba
 
 @njit
@@ -579,7 +1346,7 @@ def get_fragmass(parsed_pep:list, mass_dict:numba.typed.Dict)->tuple:
 
     return frag_masses, frag_type
 
-# %% ../nbs/03_fasta.ipynb 55
+# %% ../nbs/03_fasta.ipynb 62
 def get_frag_dict(parsed_pep:list, mass_dict:dict)->dict:
     """
     Calculate the masses of the fragment ions
@@ -604,7 +1371,7 @@ def get_frag_dict(parsed_pep:list, mass_dict:dict)->dict:
            
     return frag_dict
 
-# %% ../nbs/03_fasta.ipynb 61
+# %% ../nbs/03_fasta.ipynb 68
 @njit
 def get_spectrum(peptide:str, mass_dict:numba.typed.Dict)->tuple:
     """
@@ -648,41 +1415,69 @@ def get_spectra(peptides:numba.typed.List, mass_dict:numba.typed.Dict)->List:
 
     return spectra
 
-# %% ../nbs/03_fasta.ipynb 65
-from Bio import SeqIO
+# %% ../nbs/03_fasta.ipynb 72
+import mmap
+import functools
 import os
 from glob import glob
 import logging
+import pandas as pd
 
-def read_fasta_file(fasta_filename:str=""):
+def read_fasta_file(fasta_filename:str="", callback = None):
     """
-    Read a FASTA file line by line
+    Read a FASTA file entry by entry.
+    The file is memory-mapped and the entries are found by searching for the '>' at the start of a line.
     Args:
         fasta_filename (str): fasta.
+        callback (function, optional): callback function that receives the fraction of bytes that were read.
     Yields:
         dict {id:str, name:str, description:str, sequence:str}: protein information.
     """
-    with open(fasta_filename, "rt") as handle:
-        iterator = SeqIO.parse(handle, "fasta")
-        while iterator:
-            try:
-                record = next(iterator)
-                parts = record.id.split("|")  # pipe char
+    with open(fasta_filename, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+
+            if buffer[:1] == b">":
+                start = 0
+            else:
+                start = buffer.find(b"\n>") + 1
+                if start == 0:
+                    return
+
+            while start < size:
+                end = buffer.find(b"\n>", start)
+                if end == -1:
+                    end = size
+
+                header_end = buffer.find(b"\n", start, end)
+                if header_end == -1:
+                    header_end = end
+
+                description = buffer[start+1:header_end].decode().rstrip()
+                sequence = buffer[header_end:end].translate(None, b" \t\r\n").decode()
+
+                name = description.split(maxsplit=1)[0] if description else ""
+                parts = name.split("|")  # pipe char
                 if len(parts) > 1:
                     id = parts[1]
                 else:
-                    id = record.name
-                sequence = str(record.seq)
+                    id = name
+
                 entry = {
                     "id": id,
-                    "name": record.name,
-                    "description": record.description,
+                    "name": name,
+                    "description": description,
                     "sequence": sequence,
                 }
 
                 yield entry
-            except StopIteration:
-                break
+
+                if callback:
+                    callback(end/size)
+
+                start = end + 1
 
 
 def read_fasta_file_entries(fasta_filename=""):
@@ -693,19 +1488,24 @@ def read_fasta_file_entries(fasta_filename=""):
     Returns:
         int: number of entries.
     """
-    with open(fasta_filename, "rt") as handle:
-        iterator = SeqIO.parse(handle, "fasta")
-        count = 0
-        while iterator:
-            try:
-                record = next(iterator)
-                count+=1
-            except StopIteration:
-                break
+    with open(fasta_filename, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            count = int(buffer[:1] == b">")
+            position = buffer.find(b"\n>")
+            while position != -1:
+                count += 1
+                position = buffer.find(b"\n>", position + 1)
 
         return count
 
 
+@functools.lru_cache()
+def _get_valid_bytes(AAs:frozenset)->bytes:
+    return "".join(sorted(AAs)).encode()
+
+
 def check_sequence(element:dict, AAs:set, verbose:bool = False)->bool:
     """
     Checks wheter a sequence from a FASTA entry contains valid AAs
@@ -716,17 +1516,17 @@ def check_sequence(element:dict, AAs:set, verbose:bool = False)->bool:
     Returns:
         bool: False if the protein sequence contains non-AA letters, otherwise True.
     """
-    if not set(element['sequence']).issubset(AAs):
-        unknown = set(element['sequence']) - set(AAs)
+    # Deleting all valid AAs from the byte buffer leaves the unknown ones
+    unknown = element['sequence'].encode().translate(None, _get_valid_bytes(frozenset(AAs)))
+    if len(unknown) > 0:
         if verbose:
-            logging.error(f'This FASTA entry contains unknown AAs {unknown} - Peptides with unknown AAs will be skipped: \n {element}\n')
+            logging.error(f'This FASTA entry contains unknown AAs {set(unknown.decode())} - Peptides with unknown AAs will be skipped: \n {element}\n')
         return False
     else:
         return True
     
 
-
-# %% ../nbs/03_fasta.ipynb 68
+# %% ../nbs/03_fasta.ipynb 76
 def add_to_pept_dict(pept_dict:dict, new_peptides:list, i:int)->tuple:
     """
     Add peptides to the peptide dictionary
@@ -749,7 +1549,7 @@ def add_to_pept_dict(pept_dict:dict, new_peptides:list, i:int)->tuple:
 
     return pept_dict, added_peptides
 
-# %% ../nbs/03_fasta.ipynb 71
+# %% ../nbs/03_fasta.ipynb 79
 def merge_pept_dicts(list_of_pept_dicts:list)->dict:
     """
     Merge a list of peptide dict into a single dict.
@@ -774,7 +1574,346 @@ def merge_pept_dicts(list_of_pept_dicts:list)->dict:
 
     return new_pept_dict
 
-# %% ../nbs/03_fasta.ipynb 75
+# %% ../nbs/03_fasta.ipynb 83
+def pack_sequences(sequences:np.ndarray)->tuple:
+    """
+    Store sequences as one UTF-8 byte buffer with offsets instead of a fixed-width str array padded to the longest sequence.
+    Args:
+        sequences (np.ndarray): sequences (str or UTF-8 bytes).
+    Returns:
+        np.ndarray: the bytes of all sequences (np.uint8).
+        np.ndarray: pointer array so that sequence i is stored at [sequence_indptr[i]:sequence_indptr[i+1]].
+    """
+    encoded = [_ if isinstance(_, bytes) else _.encode() for _ in np.asarray(sequences, dtype=object).tolist()]
+    sequence_indptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+    sequence_indptr[1:] = np.cumsum([len(_) for _ in encoded])
+    sequence_data = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+
+    return sequence_data, sequence_indptr
+
+
+def unpack_sequences(sequence_data:np.ndarray, sequence_indptr:np.ndarray)->np.ndarray:
+    """
+    Decode sequences that are stored with pack_sequences().
+    Returns:
+        np.ndarray: the sequences as an object array of str.
+    """
+    buffer = sequence_data.tobytes()
+    sequences = np.empty(len(sequence_indptr) - 1, dtype=object)
+    sequences[:] = [buffer[start:end].decode() for start, end in zip(sequence_indptr[:-1].tolist(), sequence_indptr[1:].tolist())]
+
+    return sequences
+
+
+@njit
+def _compare_packed(data_a:np.ndarray, start_a:int, end_a:int, data_b:np.ndarray, start_b:int, end_b:int)->int:
+    """
+    Compare two packed sequences byte by byte, which is the order of str for UTF-8.
+    Returns:
+        int: -1, 0 or 1 if sequence a is smaller, equal or larger than sequence b.
+    """
+    len_a, len_b = end_a - start_a, end_b - start_b
+    for i in range(min(len_a, len_b)):
+        if data_a[start_a + i] != data_b[start_b + i]:
+            return -1 if data_a[start_a + i] < data_b[start_b + i] else 1
+    if len_a == len_b:
+        return 0
+    return -1 if len_a < len_b else 1
+
+
+@njit
+def _is_sorted_packed(sequence_data:np.ndarray, sequence_indptr:np.ndarray)->bool:
+    for i in range(1, len(sequence_indptr) - 1):
+        if _compare_packed(sequence_data, sequence_indptr[i-1], sequence_indptr[i], sequence_data, sequence_indptr[i], sequence_indptr[i+1]) > 0:
+            return False
+    return True
+
+
+@njit
+def _search_packed(sequence_data:np.ndarray, sequence_indptr:np.ndarray, query_data:np.ndarray, query_indptr:np.ndarray)->np.ndarray:
+    """
+    Binary search of packed query sequences in sorted packed sequences.
+    Returns:
+        np.ndarray: the index of each query, -1 if it is not found.
+    """
+    n = len(sequence_indptr) - 1
+    idx = np.full(len(query_indptr) - 1, -1, dtype=np.int64)
+    for i in range(len(idx)):
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _compare_packed(sequence_data, sequence_indptr[mid], sequence_indptr[mid+1], query_data, query_indptr[i], query_indptr[i+1]) < 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < n and _compare_packed(sequence_data, sequence_indptr[lo], sequence_indptr[lo+1], query_data, query_indptr[i], query_indptr[i+1]) == 0:
+            idx[i] = lo
+    return idx
+
+
+class PeptideMap(object):
+    """
+    Maps peptide sequences to protein indices with sorted sequences and a CSR (compressed sparse row) protein array.
+    The proteins of the peptide sequences[i] are protein_indices[protein_indptr[i]:protein_indptr[i+1]].
+    The sequences are stored as a byte buffer with offsets, see pack_sequences(), and `sequences` decodes them on access.
+    """
+
+    def __init__(self, sequences:np.ndarray, protein_indptr:np.ndarray, protein_indices:np.ndarray, db_peptide_idx:np.ndarray = None):
+        """
+        Args:
+            sequences (np.ndarray): unique peptide sequences. If they are not sorted, the map is sorted.
+            protein_indptr (np.ndarray): offsets of the proteins of each peptide in protein_indices.
+            protein_indices (np.ndarray): protein indices of all peptides.
+            db_peptide_idx (np.ndarray, optional): peptide index of every entry of a database. Defaults to None.
+        """
+        sequence_data, sequence_indptr = pack_sequences(sequences)
+        protein_indptr = np.asarray(protein_indptr, dtype=np.int64)
+        protein_indices = np.asarray(protein_indices, dtype=np.int64)
+
+        if not _is_sorted_packed(sequence_data, sequence_indptr):
+            # Maps of older databases are in insertion order
+            sequences = unpack_sequences(sequence_data, sequence_indptr)
+            order = np.argsort(sequences, kind='stable')
+            lens = np.diff(protein_indptr)[order]
+            starts = protein_indptr[:-1][order]
+            protein_indptr = np.zeros(len(sequences) + 1, dtype=np.int64)
+            protein_indptr[1:] = np.cumsum(lens)
+            protein_indices = protein_indices[np.repeat(starts - protein_indptr[:-1], lens) + np.arange(protein_indptr[-1])]
+            sequence_data, sequence_indptr = pack_sequences(sequences[order])
+            if db_peptide_idx is not None:
+                db_peptide_idx = np.argsort(order)[db_peptide_idx]
+
+        self.sequence_data = sequence_data
+        self.sequence_indptr = sequence_indptr
+        self.protein_indptr = protein_indptr
+        self.protein_indices = protein_indices
+        self.db_peptide_idx = db_peptide_idx
+
+    @classmethod
+    def from_pairs(cls, peptides:np.ndarray, proteins:np.ndarray):
+        """
+        Create a peptide map from (peptide, protein) pairs. Duplicate pairs are removed.
+        Args:
+            peptides (np.ndarray): peptide sequence of each pair.
+            proteins (np.ndarray): protein index of each pair.
+        Returns:
+            PeptideMap: the peptide map, the proteins of each peptide are sorted.
+        """
+        peptides = np.asarray(peptides, dtype=object)
+        proteins = np.asarray(proteins, dtype=np.int64)
+
+        # Dedupe by hashing the str objects and only sort the unique sequences, a fixed-width str array would be padded to the longest peptide
+        inverse, sequences = pd.factorize(peptides)
+        order = np.argsort(sequences, kind='stable')
+        sequences = sequences[order]
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        inverse = rank[inverse]
+
+        order = np.lexsort((proteins, inverse))
+        inverse = inverse[order]
+        proteins = proteins[order]
+
+        unique = np.ones(len(proteins), dtype=np.bool_)
+        unique[1:] = (inverse[1:] != inverse[:-1]) | (proteins[1:] != proteins[:-1])
+
+        protein_indptr = np.zeros(len(sequences) + 1, dtype=np.int64)
+        protein_indptr[1:] = np.cumsum(np.bincount(inverse[unique], minlength=len(sequences)))
+
+        return cls(sequences, protein_indptr, proteins[unique])
+
+    @classmethod
+    def from_dict(cls, pept_dict:dict):
+        """
+        Create a peptide map from a peptide dict, see add_to_pept_dict().
+        """
+        peptides = np.array(list(pept_dict), dtype=object)
+        lens = [len(pept_dict[_]) for _ in peptides]
+        proteins = np.concatenate([pept_dict[_] for _ in peptides] + [np.zeros(0, dtype=np.int64)])
+
+        return cls.from_pairs(np.repeat(peptides, lens), proteins)
+
+    @classmethod
+    def merge(cls, pept_maps:list):
+        """
+        Merge a list of peptide maps into a single map.
+        """
+        if len(pept_maps) == 0:
+            raise ValueError('Need to pass at least 1 element.')
+
+        peptides, proteins = zip(*[_.to_pairs() for _ in pept_maps])
+
+        return cls.from_pairs(np.concatenate(peptides), np.concatenate(proteins))
+
+    @property
+    def sequences(self)->np.ndarray:
+        """
+        The sorted peptide sequences as an object array of str.
+        """
+        return unpack_sequences(self.sequence_data, self.sequence_indptr)
+
+    def to_pairs(self)->tuple:
+        """
+        Get all (peptide, protein) pairs.
+        Returns:
+            np.ndarray: peptide sequence of each pair.
+            np.ndarray: protein index of each pair.
+        """
+        return np.repeat(self.sequences, np.diff(self.protein_indptr)), self.protein_indices
+
+    def to_dict(self)->dict:
+        """
+        Convert to a peptide dict, see add_to_pept_dict().
+        """
+        return dict(self.items())
+
+    def get_idx(self, sequences:np.ndarray, missing_ok:bool = True)->np.ndarray:
+        """
+        Look up the peptide indices of sequences.
+        Args:
+            sequences (np.ndarray): peptide sequences.
+            missing_ok (bool, optional): If False, raise a KeyError for sequences that are not in the map. Defaults to True.
+        Returns:
+            np.ndarray: the peptide index of each sequence, -1 if a sequence is not in the map.
+        """
+        sequences = np.asarray(sequences, dtype=object)
+        query_data, query_indptr = pack_sequences(sequences)
+        idx = _search_packed(self.sequence_data, self.sequence_indptr, query_data, query_indptr)
+
+        if not missing_ok and np.any(idx < 0):
+            raise KeyError(sequences[idx < 0][0])
+
+        return idx
+
+    def get_idx_from_db(self, db_idx:np.ndarray)->np.ndarray:
+        """
+        Look up the peptide indices of database entries.
+        Args:
+            db_idx (np.ndarray): indices of entries in the database of this map.
+        Returns:
+            np.ndarray: the peptide index of each entry.
+        """
+        if self.db_peptide_idx is None:
+            raise ValueError('Peptide map has no database indices.')
+
+        return self.db_peptide_idx[db_idx]
+
+    def get_n_proteins(self, sequences:np.ndarray = None, idx:np.ndarray = None)->np.ndarray:
+        """
+        Get the number of proteins of peptides by sequence or by peptide index.
+        Args:
+            sequences (np.ndarray, optional): peptide sequences. Defaults to None.
+            idx (np.ndarray, optional): peptide indices, used if no sequences are passed. Defaults to None.
+        Returns:
+            np.ndarray: the number of proteins of each peptide.
+        """
+        if sequences is not None:
+            idx = self.get_idx(sequences, missing_ok=False)
+
+        return self.protein_indptr[idx + 1] - self.protein_indptr[idx]
+
+    def get_protein_pairs(self, sequences:np.ndarray = None, idx:np.ndarray = None)->tuple:
+        """
+        Get the proteins of peptides by sequence or by peptide index as flat arrays.
+        Args:
+            sequences (np.ndarray, optional): peptide sequences. Defaults to None.
+            idx (np.ndarray, optional): peptide indices, used if no sequences are passed. Defaults to None.
+        Returns:
+            np.ndarray: position of the peptide in the input for each protein.
+            np.ndarray: protein index.
+        """
+        if sequences is not None:
+            idx = self.get_idx(sequences, missing_ok=False)
+
+        starts = self.protein_indptr[idx]
+        lens = self.protein_indptr[idx + 1] - starts
+        offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lens)
+        positions = np.repeat(np.arange(len(lens)), lens)
+
+        return positions, self.protein_indices[np.repeat(starts - offsets[:-1], lens) + np.arange(offsets[-1])]
+
+    def get_proteins(self, sequences:np.ndarray = None, idx:np.ndarray = None)->list:
+        """
+        Get the proteins of peptides by sequence or by peptide index.
+        Args:
+            sequences (np.ndarray, optional): peptide sequences. Defaults to None.
+            idx (np.ndarray, optional): peptide indices, used if no sequences are passed. Defaults to None.
+        Returns:
+            list (of np.ndarray): the protein indices of each peptide.
+        """
+        if sequences is not None:
+            idx = self.get_idx(sequences, missing_ok=False)
+
+        return [self.protein_indices[self.protein_indptr[_]:self.protein_indptr[_ + 1]] for _ in idx]
+
+    def keys(self)->np.ndarray:
+        return self.sequences
+
+    def items(self):
+        for i, sequence in enumerate(self.sequences):
+            yield sequence, self.protein_indices[self.protein_indptr[i]:self.protein_indptr[i + 1]].tolist()
+
+    def get(self, sequence:str, default = None):
+        idx = self.get_idx([sequence])[0]
+        if idx < 0:
+            return default
+
+        return self.protein_indices[self.protein_indptr[idx]:self.protein_indptr[idx + 1]].tolist()
+
+    def __getitem__(self, sequence:str)->list:
+        proteins = self.get(sequence)
+        if proteins is None:
+            raise KeyError(sequence)
+
+        return proteins
+
+    def __contains__(self, sequence:str)->bool:
+        return self.get_idx([sequence])[0] >= 0
+
+    def __iter__(self):
+        return iter(self.sequences)
+
+    def __len__(self)->int:
+        return len(self.sequence_indptr) - 1
+
+    def __eq__(self, other)->bool:
+        if not isinstance(other, PeptideMap):
+            return NotImplemented
+
+        return (
+            np.array_equal(self.sequence_data, other.sequence_data)
+            and np.array_equal(self.sequence_indptr, other.sequence_indptr)
+            and np.array_equal(self.protein_indptr, other.protein_indptr)
+            and np.array_equal(self.protein_indices, other.protein_indices)
+        )
+
+    def __repr__(self)->str:
+        return f'PeptideMap with {len(self):,} peptides and {len(self.protein_indices):,} protein entries'
+
+
+def get_peptide_map(all_mod_peptides:list, fasta_index:int = 0)->tuple:
+    """
+    Create a peptide map from the digested proteins of a FASTA block.
+    Args:
+        all_mod_peptides (list of list of str): the (modified) peptides of each protein, see digest_sequences().
+        fasta_index (int, optional): protein index of the first protein. Defaults to 0.
+    Returns:
+        List (of str): the unique peptides.
+        PeptideMap: the peptide map of the proteins.
+    """
+    peptides = [peptide for mod_peptides in all_mod_peptides for peptide in mod_peptides]
+    proteins = np.repeat(np.arange(fasta_index, fasta_index + len(all_mod_peptides)), [len(_) for _ in all_mod_peptides])
+    pept_map = PeptideMap.from_pairs(np.array(peptides, dtype=object), proteins)
+
+    to_add = List()
+    if len(pept_map) > 0:
+        to_add.extend(pept_map.sequences.tolist())
+
+    return to_add, pept_map
+
+
+# %% ../nbs/03_fasta.ipynb 86
 from collections import OrderedDict
 
 def generate_fasta_list(fasta_paths:list, callback = None, **kwargs)->tuple:
@@ -801,8 +1940,6 @@ def generate_fasta_list(fasta_paths:list, callback = None, **kwargs)->tuple:
         n_fastas = len(fasta_paths)
 
     for f_id, fasta_file in enumerate(fasta_paths):
-        n_entries = read_fasta_file_entries(fasta_file)
-
         fasta_generator = read_fasta_file(fasta_file)
 
         for element in fasta_generator:
@@ -816,7 +1953,7 @@ def generate_fasta_list(fasta_paths:list, callback = None, **kwargs)->tuple:
 
 
 
-# %% ../nbs/03_fasta.ipynb 77
+# %% ../nbs/03_fasta.ipynb 88
 def generate_database(mass_dict:dict, fasta_paths:list, callback = None, **kwargs)->tuple:
     """
     Function to generate a database from a fasta file
@@ -826,14 +1963,14 @@ def generate_database(mass_dict:dict, fasta_paths:list, callback = None, **kwarg
         callback (function, optional): callback function.
     Returns:
         to_add (list of str): non-redundant (modified) peptides to be added.
-        pept_dict (dict{str:list of int}): the key is peptide sequence, and the value is protein id list indicating where the peptide is from.
+        pept_dict (PeptideMap): maps the peptide sequences to the protein ids where the peptides are from.
         fasta_dict (dict{int:dict}): the key is the protein id, the value is the protein entry dict {id:str, name:str, description:str, sequence:str}.
     """
-    to_add = List()
     fasta_dict = OrderedDict()
     fasta_index = 0
 
-    pept_dict = {}
+    all_mod_peptides = []
+    cache = get_digestion_cache(kwargs)
 
     if type(fasta_paths) is str:
         fasta_paths = [fasta_paths]
@@ -843,26 +1980,27 @@ def generate_database(mass_dict:dict, fasta_paths:list, callback = None, **kwarg
         n_fastas = len(fasta_paths)
 
     for f_id, fasta_file in enumerate(fasta_paths):
-        n_entries = read_fasta_file_entries(fasta_file)
+        if callback:
+            # Progress by bytes read, no separate pass to count the entries
+            file_callback = lambda progress, f_id=f_id: callback((f_id + progress)/n_fastas)
+        else:
+            file_callback = None
 
-        fasta_generator = read_fasta_file(fasta_file)
+        fasta_generator = read_fasta_file(fasta_file, callback=file_callback)
 
         for element in fasta_generator:
             
             fasta_dict[fasta_index] = element
-            mod_peptides = generate_peptides(element["sequence"], **kwargs)
-            pept_dict, added_seqs = add_to_pept_dict(pept_dict, mod_peptides, fasta_index)
-            if len(added_seqs) > 0:
-                to_add.extend(added_seqs)
+            all_mod_peptides.append(digest_sequences([element["sequence"]], cache=cache, **kwargs)[0])
 
             fasta_index += 1
 
-            if callback:
-                callback(fasta_index/n_entries/n_fastas+f_id)
+    cache.log()
+    to_add, pept_dict = get_peptide_map(all_mod_peptides)
 
     return to_add, pept_dict, fasta_dict
 
-# %% ../nbs/03_fasta.ipynb 80
+# %% ../nbs/03_fasta.ipynb 91
 def generate_spectra(to_add:list, mass_dict:dict, callback = None)->list:
     """
     Function to generate spectra list database from a fasta file
@@ -893,7 +2031,7 @@ def generate_spectra(to_add:list, mass_dict:dict, callback = None)->list:
 
     return spectra
 
-# %% ../nbs/03_fasta.ipynb 84
+# %% ../nbs/03_fasta.ipynb 95
 from typing import Generator
 
 def block_idx(len_list:int, block_size:int = 1000)->list:
@@ -928,31 +2066,23 @@ def blocks(l:int, n:int)->Generator[list, None, None]:
     n = max(1, n)
     return (l[i:i+n] for i in range(0, len(l), n))
 
-# %% ../nbs/03_fasta.ipynb 86
+# %% ../nbs/03_fasta.ipynb 97
 from multiprocessing import Pool
 from . import constants
 mass_dict = constants.mass_dict
 
 #This function is a wrapper function and to be tested by the integration test
-def digest_fasta_block(to_process:tuple)-> (list, dict):
+def digest_fasta_block(to_process:tuple)-> (list, PeptideMap):
     """
     Digest and create spectra for a whole fasta_block for multiprocessing. See generate_database_parallel.
     """
 
     fasta_index, fasta_block, settings = to_process
 
-    to_add = List()
-
-    f_index = 0
-
-    pept_dict = {}
-    for element in fasta_block:
-        sequence = element["sequence"]
-        mod_peptides = generate_peptides(sequence, **settings['fasta'])
-        pept_dict, added_peptides = add_to_pept_dict(pept_dict, mod_peptides, fasta_index+f_index)
-        if len(added_peptides) > 0:
-            to_add.extend(added_peptides)
-        f_index += 1
+    cache = get_digestion_cache(settings['fasta'])
+    all_mod_peptides = digest_sequences([element["sequence"] for element in fasta_block], cache=cache, **settings['fasta'])
+    cache.log()
+    to_add, pept_dict = get_peptide_map(all_mod_peptides, fasta_index)
 
     spectra = []
     if len(to_add) > 0:
@@ -971,7 +2101,7 @@ def generate_database_parallel(settings:dict, callback = None):
         settings: alphapept settings.
     Returns:
         list: theoretical spectra. See generate_spectra()
-        dict: peptide dict. See add_to_pept_dict()
+        PeptideMap: peptide map. See PeptideMap.
         dict: fasta_dict. See generate_fasta_list()
     """
     
@@ -1002,15 +2132,15 @@ def generate_database_parallel(settings:dict, callback = None):
     spectra_set = [spectra[idx] for idx in range(len(spectra)-1) if spectra[idx][1] != spectra[idx+1][1]]
     spectra_set.append(spectra[-1])
 
-    pept_dict = merge_pept_dicts(pept_dicts)
+    pept_dict = PeptideMap.merge(pept_dicts)
 
     return spectra_set, pept_dict, fasta_dict
 
-# %% ../nbs/03_fasta.ipynb 88
+# %% ../nbs/03_fasta.ipynb 99
 #This function is a wrapper function and to be tested by the integration test
 def pept_dict_from_search(settings:dict):
     """
-    Generates a peptide dict from a large search.
+    Generates a peptide map from a large search.
     """
 
     paths = settings['experiment']['file_paths']
@@ -1040,34 +2170,46 @@ def pept_dict_from_search(settings:dict):
           for col in df.columns.drop(lst_col)}
         ).assign(**{lst_col:np.concatenate(df[lst_col].values)})[df.columns]
 
-    df_['fasta_index'] = df_['fasta_index'].astype('int')
-    df_grouped = df_.groupby(['sequence'])['fasta_index'].unique()
-
-    pept_dict = {}
-    for keys, vals in zip(df_grouped.index, df_grouped.values):
-        pept_dict[keys] = vals.tolist()
+    pept_dict = PeptideMap.from_pairs(df_['sequence'].values, df_['fasta_index'].values.astype(np.int64))
 
     return pept_dict
 
-# %% ../nbs/03_fasta.ipynb 90
+# %% ../nbs/03_fasta.ipynb 101
 import alphapept.io
 import pandas as pd
+import json
+
+# These settings only affect the digestion speed or how a database is stored
+DATABASE_IGNORED_SETTINGS = ['spectra_block', 'fasta_block', 'save_db', 'fasta_size_max', 'database_cache', 'database_cache_size_max', 'database_incremental', 'database_sharded', 'database_shard_size', 'digestion_cache_mb', 'isoform_cache_mb', 'database_auto', 'database_auto_samples']
+
+def get_database_settings(fasta_settings:dict)->dict:
+    """
+    Get the fasta settings that change the content of a database.
+    Args:
+        fasta_settings (dict): The fasta settings.
+    Returns:
+        dict: The fasta settings without DATABASE_IGNORED_SETTINGS.
+    """
+    return {key: value for key, value in fasta_settings.items() if key not in DATABASE_IGNORED_SETTINGS}
 
-def save_database(spectra:list, pept_dict:dict, fasta_dict:dict, database_path:str, **kwargs):
+def save_database(spectra:list, pept_dict:PeptideMap, fasta_dict:dict, database_path:str, **kwargs):
     """
     Function to save a database to the *.hdf format. Write the database into hdf.
+    The spectra are sorted by precursor mass, ties are sorted by sequence so that databases can be merged, see update_database().
     
     Args:
         spectra (list): list: theoretical spectra. See generate_spectra().
-        pept_dict (dict): peptide dict. See add_to_pept_dict().
+        pept_dict (PeptideMap): peptide map. A peptide dict is converted, see add_to_pept_dict().
         fasta_dict (dict): fasta_dict. See generate_fasta_list().
         database_path (str): Path to database.
+        **kwargs: The fasta settings, which are stored with the database.
     """
     
     precmasses, seqs, fragmasses, fragtypes = zip(*spectra)
-    sortindex = np.argsort(precmasses)
-    fragmasses = np.array(fragmasses, dtype=object)[sortindex]
-    fragtypes = np.array(fragtypes, dtype=object)[sortindex]
+    sortindex = np.lexsort((np.array(seqs, dtype=str), np.array(precmasses)))
+    # An object array of spectra with the same number of fragments would be two-dimensional
+    fragmasses = [fragmasses[_] for _ in sortindex]
+    fragtypes = [fragtypes[_] for _ in sortindex]
 
     lens = [len(_) for _ in fragmasses]
 
@@ -1099,45 +2241,127 @@ def save_database(spectra:list, pept_dict:dict, fasta_dict:dict, database_path:s
     to_save["fragtypes"] = frag_types
     to_save["indices"] = indices
 
+    write_database(to_save, pept_dict, database_path, **kwargs)
+
+def write_database(to_save:dict, pept_dict:PeptideMap, database_path:str, **kwargs):
+    """
+    Write the arrays and the peptide map of a database to the *.hdf format.
+    The arrays of the peptide map are stored as they are, together with the peptide index of every database entry.
+    With database_compact, the encoded peptides are stored instead of the fragments, see compact_database().
+    Args:
+        to_save (dict): Mass-sorted arrays and proteins table of the database. See save_database().
+        pept_dict (PeptideMap): peptide map. A peptide dict is converted, see add_to_pept_dict().
+        database_path (str): Path to database.
+        **kwargs: The fasta settings, which are stored with the database.
+    """
+    if kwargs.get('database_compact', False):
+        to_save = compact_database(to_save)
+
     db_file = alphapept.io.HDF_File(database_path, is_new_file=True)
     for key, value in to_save.items():
         db_file.write(value, dataset_name=key)
+    write_precursor_buckets(db_file, to_save["precursors"])
+
+    db_file.write(json.dumps(get_database_settings(kwargs), sort_keys=True), attr_name="fasta_settings")
     
-    peps = np.array(list(pept_dict), dtype=object)
-    indices = np.empty(len(peps) + 1, dtype=np.int64)
-    indices[0] = 0
-    indices[1:] = np.cumsum([len(pept_dict[i]) for i in peps])
-    proteins = np.concatenate([pept_dict[i] for i in peps])
-    
-    db_file.write("peptides")
+    if isinstance(pept_dict, dict):
+        pept_dict = PeptideMap.from_dict(pept_dict)
+
+    write_pept_dict(db_file, pept_dict, pept_dict.get_idx(to_save["seqs"]))
+
+def write_pept_dict(db_file:alphapept.io.HDF_File, pept_dict:PeptideMap, db_peptide_idx:np.ndarray = None):
+    """
+    Write the arrays of a peptide map to the peptides group of a database.
+    Args:
+        db_file (alphapept.io.HDF_File): The database file.
+        pept_dict (PeptideMap): peptide map.
+        db_peptide_idx (np.ndarray, optional): The peptide index of every database entry. Not written if None. Defaults to None.
+    """
+    if "peptides" not in db_file.read():
+        db_file.write("peptides")
     db_file.write(
-        peps,
+        pept_dict.sequences,
         dataset_name="sequences",
         group_name="peptides"
     )
     db_file.write(
-        indices,
+        pept_dict.protein_indptr,
         dataset_name="protein_indptr",
         group_name="peptides"
     )
     db_file.write(
-        proteins,
+        pept_dict.protein_indices,
         dataset_name="protein_indices",
         group_name="peptides"
     )
+    if db_peptide_idx is not None:
+        db_file.write(
+            db_peptide_idx,
+            dataset_name="db_peptide_idx",
+            group_name="peptides"
+        )
 
-# %% ../nbs/03_fasta.ipynb 91
+# %% ../nbs/03_fasta.ipynb 102
 import collections
+from typing import Union
+
+def read_pept_dict(database_path:str)->PeptideMap:
+    """
+    Read the peptide map from a hdf database without reading the other arrays.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    return:
+        PeptideMap: maps the peptide sequences to protein indices.
+    """
+    db_file = alphapept.io.HDF_File(database_path)
+    peps = db_file.read(dataset_name="sequences", group_name="peptides")
+    protein_indptr = db_file.read(
+        dataset_name="protein_indptr",
+        group_name="peptides"
+    )
+    protein_indices = db_file.read(
+        dataset_name="protein_indices",
+        group_name="peptides"
+    )
+    try:
+        db_peptide_idx = db_file.read(
+            dataset_name="db_peptide_idx",
+            group_name="peptides"
+        )
+    except KeyError:
+        db_peptide_idx = None
+
+    return PeptideMap(peps, protein_indptr, protein_indices, db_peptide_idx)
 
-def read_database(database_path:str, array_name:str=None)->dict:
+def read_database(database_path:str, array_name:Union[str, list]=None)->dict:
     """
     Read database from hdf file.
+    Single arrays are memory-mapped from the flat export if it is up to date, see `export_flat_database`.
+    The fragment arrays of a compact database are calculated from the encoded peptides, see `expand_compact_database`.
     Args:
         database_path (str): hdf database file generate by alphapept.
-        array_name (str): the dataset name to read
+        array_name (str or list): the dataset name to read. For a list of names, a dict with these arrays is returned and the fragment arrays of a compact database are calculated only once.
     return:
         dict: key is the dataset_name in hdf file, value is the python object read from the dataset_name
     """
+    if isinstance(array_name, (list, tuple)):
+        db_data = {}
+        if any(_ in COMPACT_FRAGMENT_ARRAYS for _ in array_name) and is_compact_database(database_path):
+            db_data.update(zip(COMPACT_FRAGMENT_ARRAYS, expand_compact_database(get_compact_database(database_path))))
+        for key in array_name:
+            if key not in db_data:
+                db_data[key] = read_database(database_path, array_name=key)
+        return {key: db_data[key] for key in array_name}
+
+    if array_name in COMPACT_FRAGMENT_ARRAYS and is_compact_database(database_path):
+        fragmasses, fragtypes, indices = expand_compact_database(get_compact_database(database_path))
+        return {'fragmasses': fragmasses, 'fragtypes': fragtypes, 'indices': indices}[array_name]
+
+    if array_name is not None:
+        flat_data = read_flat_database(database_path, array_name)
+        if flat_data is not None:
+            return flat_data
+
     db_file = alphapept.io.HDF_File(database_path)
     if array_name is None:
         db_data = {
@@ -1151,25 +2375,1335 @@ def read_database(database_path:str, array_name:str=None)->dict:
         db_data["fasta_dict"] = np.array(
             collections.OrderedDict(db_file.read(dataset_name="proteins").T)
         )
-        peps = db_file.read(dataset_name="sequences", group_name="peptides")
-        protein_indptr = db_file.read(
-            dataset_name="protein_indptr",
-            group_name="peptides"
-        )
-        protein_indices = db_file.read(
-            dataset_name="protein_indices",
-            group_name="peptides"
-        )
-        db_data["pept_dict"] = np.array(
-            {
-                pep: (protein_indices[s: e]).tolist() for pep, s, e in zip(
-                    peps,
-                    protein_indptr[:-1],
-                    protein_indptr[1:],
-                )
-            }
-        )
+        # The map would be converted to an array by np.array()
+        db_data["pept_dict"] = np.empty((), dtype=object)
+        db_data["pept_dict"][()] = read_pept_dict(database_path)
         db_data["seqs"] = db_data["seqs"].astype(str)
     else:
         db_data = db_file.read(dataset_name=array_name)
     return db_data
+
+# %% ../nbs/03_fasta.ipynb 104
+# Width (Da) of the precursor mass buckets of a database
+PRECURSOR_BUCKET_WIDTH = 1.0
+
+def get_precursor_buckets(precursors:np.ndarray, bucket_width:float = PRECURSOR_BUCKET_WIDTH)->np.ndarray:
+    """
+    Get the index of the first entry of each precursor mass bucket.
+    Args:
+        precursors (np.ndarray): the sorted precursor masses of a database.
+        bucket_width (float): the width of a bucket in Da.
+    Returns:
+        np.ndarray: the entries of bucket i are stored at [buckets[i]:buckets[i+1]].
+    """
+    n_buckets = int(precursors[-1] / bucket_width) + 1 if len(precursors) > 0 else 0
+
+    return np.searchsorted(precursors, np.arange(n_buckets + 1) * bucket_width).astype(np.int64)
+
+
+def write_precursor_buckets(db_file:alphapept.io.HDF_File, precursors:np.ndarray):
+    """
+    Write the precursor buckets of a database, see get_precursor_buckets().
+    Args:
+        db_file (alphapept.io.HDF_File): The database file.
+        precursors (np.ndarray): the sorted precursor masses of the database.
+    """
+    db_file.write(get_precursor_buckets(precursors), dataset_name="precursor_buckets")
+    db_file.write(PRECURSOR_BUCKET_WIDTH, dataset_name="precursor_buckets", attr_name="bucket_width")
+
+
+def get_database_slice(database_path:str, mass_min:float, mass_max:float)->slice:
+    """
+    Get the database entries that cover a precursor mass range with the precursor buckets of a database.
+    The slice can contain entries outside of the mass range of the bordering buckets.
+    Databases without precursor buckets are searched with the precursors.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+        mass_min (float): lower bound of the mass range.
+        mass_max (float): upper bound of the mass range.
+    Returns:
+        slice: the database entries of the mass range.
+    """
+    db_file = alphapept.io.HDF_File(database_path)
+
+    if "precursor_buckets" not in db_file.read():
+        precursors = read_database(database_path, array_name="precursors")
+        start = np.searchsorted(precursors, mass_min, side='left')
+        end = np.searchsorted(precursors, mass_max, side='right')
+        return slice(int(start), int(end))
+
+    buckets = db_file.read(dataset_name="precursor_buckets")
+    bucket_width = db_file.read(dataset_name="precursor_buckets", attr_name="bucket_width")
+
+    n_buckets = len(buckets) - 1
+    bucket_min = min(max(int(np.floor(mass_min / bucket_width)), 0), n_buckets)
+    bucket_max = min(max(int(np.floor(mass_max / bucket_width)) + 1, 0), n_buckets)
+
+    return slice(int(buckets[bucket_min]), int(buckets[bucket_max]))
+
+
+def read_database_slice(database_path:str, mass_min:float, mass_max:float)->(dict, np.ndarray):
+    """
+    Read the search arrays of the database entries that cover a precursor mass range, see get_database_slice().
+    Only the slices of the arrays are read, from the flat database if it is up to date.
+    The fragment index of a flat database is memory-mapped as a whole, see read_fragment_index().
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+        mass_min (float): lower bound of the mass range.
+        mass_max (float): upper bound of the mass range.
+    Returns:
+        dict: the arrays of the entries. The pointer arrays start at 0.
+        np.ndarray: the indices of the entries in the database.
+    """
+    entries = get_database_slice(database_path, mass_min, mass_max)
+
+    if is_flat_database_current(database_path):
+        flat_path = get_flat_database_path(database_path)
+        available = [os.path.splitext(_)[0] for _ in os.listdir(flat_path)]
+        def read_slice(array_name, slice_):
+            return np.asarray(read_flat_database(database_path, array_name)[slice_])
+    else:
+        db_file = alphapept.io.HDF_File(database_path)
+        available = db_file.read()
+        def read_slice(array_name, slice_):
+            return db_file.read(dataset_name=array_name, return_dataset_slice=slice_)
+
+    db_data = {}
+    db_data['precursors'] = read_slice('precursors', entries)
+    db_data['seqs'] = read_slice('seqs', entries).astype(str)
+
+    if 'residues' in available:
+        pointer, arrays = 'residue_indptr', ['residues']
+        for array_name in ['tokens', 'token_masses']:
+            db_data[array_name] = read_slice(array_name, slice(None))
+    else:
+        pointer, arrays = 'indices', [_ for _ in ['fragmasses', 'fragtypes', 'db_ints'] if _ in available]
+
+    if 'frag_index_indptr' in available:
+        # The fragment index covers the whole database, the entries of the slice start at frag_index_offset
+        db_data.update(read_fragment_index(database_path))
+        db_data['frag_index_offset'] = entries.start
+
+    indptr = read_slice(pointer, slice(entries.start, entries.stop + 1))
+    db_data[pointer] = indptr - indptr[0]
+    for array_name in arrays:
+        db_data[array_name] = read_slice(array_name, slice(int(indptr[0]), int(indptr[-1])))
+
+    return db_data, np.arange(entries.start, entries.stop)
+
+
+# %% ../nbs/03_fasta.ipynb 106
+from typing import Union
+
+# Fragment arrays that are not stored in a compact database
+COMPACT_FRAGMENT_ARRAYS = ['fragmasses', 'fragtypes', 'indices']
+
+COMPACT_DATABASE_ARRAYS = ['residues', 'residue_indptr', 'tokens', 'token_masses']
+
+def get_database_tokens()->(np.ndarray, np.ndarray):
+    """
+    Get the vocabulary to encode peptides, which are all keys of the mass_dict.
+    Returns:
+        np.ndarray: the (modified) amino acids, the code of a token is its index.
+        np.ndarray: the masses of the tokens.
+    """
+    tokens = np.array(list(mass_dict.keys()))
+    token_masses = np.array([mass_dict[_] for _ in tokens])
+
+    return tokens, token_masses
+
+
+def encode_peptides(seqs:np.ndarray, tokens:np.ndarray)->(np.ndarray, np.ndarray):
+    """
+    Encode (modified) peptides as integer codes of their amino acids and modified amino acids.
+    Args:
+        seqs (np.ndarray): the (modified) peptides.
+        tokens (np.ndarray): the (modified) amino acids, the code of a token is its index.
+    Returns:
+        np.ndarray: the token codes of all peptides (np.uint16).
+        np.ndarray: pointer array so that the codes of peptide i are stored at [residue_indptr[i]:residue_indptr[i+1]].
+    """
+    token_codes = {token: code for code, token in enumerate(tokens)}
+    parsed = [tokenize(_) for _ in seqs]
+
+    residue_indptr = np.zeros(len(parsed) + 1, dtype=np.int64)
+    residue_indptr[1:] = np.cumsum([len(_) for _ in parsed])
+    residues = np.fromiter((token_codes[token] for peptide in parsed for token in peptide), dtype=np.uint16, count=residue_indptr[-1])
+
+    return residues, residue_indptr
+
+
+def compact_database(to_save:dict)->dict:
+    """
+    Replace the fragment arrays of a database by the encoded peptides.
+    Args:
+        to_save (dict): Mass-sorted arrays and proteins table of the database. See save_database().
+    Returns:
+        dict: The arrays of the compact database.
+    """
+    tokens, token_masses = get_database_tokens()
+
+    compact = {key: value for key, value in to_save.items() if key not in COMPACT_FRAGMENT_ARRAYS}
+    compact['residues'], compact['residue_indptr'] = encode_peptides(np.asarray(to_save['seqs']).astype(str), tokens)
+    compact['tokens'] = tokens.astype(object)
+    compact['token_masses'] = token_masses
+
+    return compact
+
+
+def is_compact_database(database_path:str)->bool:
+    """
+    Check if a database stores the encoded peptides instead of the fragments.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        bool: True if the database is compact.
+    """
+    if is_flat_database_current(database_path):
+        return os.path.isfile(os.path.join(get_flat_database_path(database_path), 'residues.npy'))
+
+    return 'residues' in alphapept.io.HDF_File(database_path).read()
+
+
+def get_compact_database(db_data:Union[dict, str])->dict:
+    """
+    Get the arrays to calculate the fragments of a compact database.
+    Args:
+        db_data (Union[dict, str]): Data structure containing the database data or path to database.
+    Returns:
+        dict: residues, residue_indptr, token_masses and the masses of a proton and H2O. None if the database is not compact.
+    """
+    if isinstance(db_data, str):
+        if not is_compact_database(db_data):
+            return None
+        db_data = {key: read_database(db_data, array_name=key) for key in COMPACT_DATABASE_ARRAYS}
+    elif 'residues' not in db_data:
+        return None
+
+    tokens = list(np.asarray(db_data['tokens']).astype(str))
+    token_masses = np.asarray(db_data['token_masses'])
+
+    compact = {}
+    compact['residues'] = db_data['residues']
+    compact['residue_indptr'] = db_data['residue_indptr']
+    compact['token_masses'] = token_masses
+    compact['proton'] = token_masses[tokens.index('Proton')]
+    compact['h2o'] = token_masses[tokens.index('H2O')]
+
+    return compact
+
+
+@njit
+def get_compact_spectrum(residues:np.ndarray, token_masses:np.ndarray, proton:float, h2o:float)->tuple:
+    """
+    Calculate the sorted fragment masses and types of an encoded peptide. This is the same as get_fragmass() and sorting in get_spectrum().
+    Args:
+        residues (np.ndarray): the token codes of the peptide.
+        token_masses (np.ndarray): the masses of the tokens.
+        proton (float): the mass of a proton.
+        h2o (float): the mass of H2O.
+    Returns:
+        Tuple[np.ndarray(np.float64), np.ndarray(np.int8)]: the fragment masses and the fragment types, see get_fragmass().
+    """
+    n_residues = len(residues)
+    n_frags = (n_residues - 1) * 2
+
+    frag_masses = np.zeros(n_frags, dtype=np.float64)
+    frag_type = np.zeros(n_frags, dtype=np.int8)
+
+    # b-ions > 0
+    n_frag = 0
+    frag_m = proton
+    for idx in range(n_residues - 1):
+        frag_m += token_masses[residues[idx]]
+        frag_masses[n_frag] = frag_m
+        frag_type[n_frag] = (idx+1)
+        n_frag += 1
+
+    # y-ions < 0
+    frag_m = proton + h2o
+    for idx in range(n_residues - 1):
+        frag_m += token_masses[residues[n_residues - 1 - idx]]
+        frag_masses[n_frag] = frag_m
+        frag_type[n_frag] = -(idx+1)
+        n_frag += 1
+
+    sortindex = np.argsort(frag_masses)
+
+    return frag_masses[sortindex], frag_type[sortindex]
+
+
+@njit
+def fill_compact_fragments(residues:np.ndarray, token_masses:np.ndarray, proton:float, h2o:float, frag_masses:np.ndarray)->int:
+    """
+    Write the sorted fragment masses of an encoded peptide to a buffer, these are the fragment masses of get_compact_spectrum().
+    The b-ions and y-ions increase in mass along the peptide, so both ladders are merged without sorting.
+    Args:
+        residues (np.ndarray): the token codes of the peptide.
+        token_masses (np.ndarray): the masses of the tokens.
+        proton (float): the mass of a proton.
+        h2o (float): the mass of H2O.
+        frag_masses (np.ndarray): the buffer for the fragment masses, at least (len(residues) - 1) * 2 long.
+    Returns:
+        int: the number of fragments, which are stored at frag_masses[:n_frags].
+    """
+    n_ions = len(residues) - 1
+
+    b_idx, y_idx = 0, 0
+    b_mass = proton + token_masses[residues[0]]
+    y_mass = proton + h2o + token_masses[residues[n_ions]]
+
+    for n_frag in range(n_ions * 2):
+        if y_idx == n_ions or (b_idx < n_ions and b_mass <= y_mass):
+            frag_masses[n_frag] = b_mass
+            b_idx += 1
+            if b_idx < n_ions:
+                b_mass += token_masses[residues[b_idx]]
+        else:
+            frag_masses[n_frag] = y_mass
+            y_idx += 1
+            if y_idx < n_ions:
+                y_mass += token_masses[residues[n_ions - y_idx]]
+
+    return n_ions * 2
+
+
+@njit
+def _expand_compact_database(residue_indptr:np.ndarray, residues:np.ndarray, token_masses:np.ndarray, proton:float, h2o:float, selection:np.ndarray)->tuple:
+    """
+    Numba helper of expand_compact_database.
+    """
+    n_db = len(residue_indptr) - 1
+
+    indices = np.zeros(n_db + 1, dtype=np.int64)
+    for i in range(n_db):
+        n_frags = 0
+        if selection[i]:
+            n_frags = (residue_indptr[i+1] - residue_indptr[i] - 1) * 2
+        indices[i+1] = indices[i] + n_frags
+
+    fragmasses = np.zeros(indices[-1], dtype=np.float64)
+    fragtypes = np.zeros(indices[-1], dtype=np.int8)
+
+    for i in range(n_db):
+        if selection[i]:
+            frag_masses, frag_type = get_compact_spectrum(residues[residue_indptr[i]:residue_indptr[i+1]], token_masses, proton, h2o)
+            fragmasses[indices[i]:indices[i+1]] = frag_masses
+            fragtypes[indices[i]:indices[i+1]] = frag_type
+
+    return fragmasses, fragtypes, indices
+
+
+def expand_compact_database(compact:dict, selection:np.ndarray = None)->tuple:
+    """
+    Calculate the fragment arrays of a compact database.
+    Args:
+        compact (dict): The arrays of the compact database. See get_compact_database().
+        selection (np.ndarray, optional): Boolean mask of the database entries to calculate, the others have no fragments. Defaults to None (all).
+    Returns:
+        np.ndarray: fragment masses (fragmasses).
+        np.ndarray: fragment types (fragtypes).
+        np.ndarray: pointer array to the fragments of each database entry (indices).
+    """
+    residue_indptr = np.asarray(compact['residue_indptr'])
+
+    if selection is None:
+        selection = np.ones(len(residue_indptr) - 1, dtype=np.bool_)
+
+    return _expand_compact_database(residue_indptr, np.asarray(compact['residues']), compact['token_masses'], compact['proton'], compact['h2o'], selection)
+
+
+# %% ../nbs/03_fasta.ipynb 108
+import os
+import shutil
+import uuid
+
+FLAT_DATABASE_ARRAYS = ['precursors', 'seqs', 'fragmasses', 'fragtypes', 'indices', 'db_ints', 'residues', 'residue_indptr', 'tokens', 'token_masses']
+
+# String arrays of a flat database that are stored with pack_sequences() and read as PackedSequences
+FLAT_PACKED_ARRAYS = ['seqs', 'tokens']
+
+# Arrays of the fragment index and the shifted fragment index of a flat database, see export_fragment_index()
+FRAGMENT_INDEX_ARRAYS = ['frag_index_indptr', 'frag_index_db_idx', 'frag_index_masses', 'shift_index_indptr', 'shift_index_db_idx', 'shift_index_masses']
+
+# Width (Da) of the bins of the fragment index of a flat database. The index can be searched with any fragment tolerance.
+FRAGMENT_INDEX_BIN_WIDTH = 0.02
+
+def get_flat_database_pointer(database_path:str)->str:
+    """
+    Get the file that names the folder of the current flat export of a database.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        str: Path to the pointer file.
+    """
+    base, ext = os.path.splitext(database_path)
+
+    return base + '.flat.current'
+
+
+def get_flat_database_path(database_path:str)->str:
+    """
+    Get the folder of the current flat export of a database.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        str: Path to the folder with the flat database or None if the database was not exported.
+    """
+    try:
+        with open(get_flat_database_pointer(database_path)) as f:
+            folder = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    return os.path.join(os.path.dirname(database_path), folder)
+
+
+def is_flat_database_current(database_path:str)->bool:
+    """
+    Check if the flat export of a database exists and is not older than the database.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        bool: True if the flat database can be used.
+    """
+    flat_path = get_flat_database_path(database_path)
+
+    if flat_path is None:
+        return False
+
+    marker = os.path.join(flat_path, 'precursors.npy')
+
+    if not os.path.isfile(marker) or not os.path.isfile(database_path):
+        return False
+
+    return os.path.getmtime(marker) >= os.path.getmtime(database_path)
+
+
+def export_flat_database(database_path:str)->str:
+    """
+    Export the search arrays of a database to uncompressed .npy files that can be memory-mapped.
+    The fragment index of a database that stores the fragments is created once and exported with them, see export_fragment_index().
+    Each export is written to a new folder. Readers are switched to it by atomically replacing the pointer file,
+    so that they never see a partial export and arrays that are already mapped stay valid.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        str: Path to the folder with the flat database.
+    """
+    if is_flat_database_current(database_path):
+        flat_path = get_flat_database_path(database_path)
+        logging.info(f'Flat database {flat_path} is up to date.')
+        return flat_path
+
+    previous_flat_path = get_flat_database_path(database_path)
+
+    base, ext = os.path.splitext(database_path)
+    flat_path = f'{base}.flat.{uuid.uuid4().hex[:12]}'
+    os.makedirs(flat_path)
+
+    db_file = alphapept.io.HDF_File(database_path)
+    available = db_file.read()
+
+    for key in FLAT_DATABASE_ARRAYS:
+        if key in available:
+            array = db_file.read(dataset_name=key)
+            if key in FLAT_PACKED_ARRAYS:
+                # A str array would be padded to the longest string
+                array, indptr = pack_sequences(array)
+                np.save(os.path.join(flat_path, f'{key}_indptr.npy'), indptr)
+            np.save(os.path.join(flat_path, f'{key}.npy'), np.ascontiguousarray(array))
+
+    if 'fragmasses' in available:
+        export_fragment_index(flat_path)
+
+    pointer_path = get_flat_database_pointer(database_path)
+    tmp_pointer_path = f'{pointer_path}.tmp{os.getpid()}'
+    with open(tmp_pointer_path, 'w') as f:
+        f.write(os.path.basename(flat_path))
+    os.replace(tmp_pointer_path, pointer_path)
+
+    # Processes that still map the previous export keep its files until they close them. Files that are
+    # still open can not be removed on Windows and are left behind.
+    if previous_flat_path is not None:
+        shutil.rmtree(previous_flat_path, ignore_errors=True)
+
+    logging.info(f'Exported flat database to {flat_path}.')
+
+    return flat_path
+
+
+class PackedSequences(object):
+    """
+    Strings of a flat database that are stored with pack_sequences() and memory-mapped.
+    Only the strings that are accessed are decoded, e.g. `seqs[start:stop]` returns an object array of str.
+    """
+
+    def __init__(self, sequence_data:np.ndarray, sequence_indptr:np.ndarray):
+        self.sequence_data = sequence_data
+        self.sequence_indptr = sequence_indptr
+
+    def __len__(self)->int:
+        return len(self.sequence_indptr) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            key = range(len(self))[key]
+            return self.sequence_data[self.sequence_indptr[key]:self.sequence_indptr[key+1]].tobytes().decode()
+
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            indptr = np.asarray(self.sequence_indptr[start:max(start, stop) + 1])
+            return unpack_sequences(np.asarray(self.sequence_data[indptr[0]:indptr[-1]]), indptr - indptr[0])
+
+        idx = np.arange(len(self))[key]
+        sequences = np.empty(len(idx), dtype=object)
+        sequences[:] = [self[_] for _ in idx.tolist()]
+        return sequences
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __array__(self, dtype=None):
+        return self.astype(object if dtype is None else dtype)
+
+    def astype(self, dtype)->np.ndarray:
+        """
+        Decode all strings.
+        """
+        return self[:].astype(dtype)
+
+
+def read_flat_database(database_path:str, array_name:str)->Union[np.ndarray, PackedSequences]:
+    """
+    Memory-map an array of the flat export of a database.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+        array_name (str): the dataset name to read
+    Returns:
+        Union[np.ndarray, PackedSequences]: The read-only array or None if there is no current flat database.
+            The strings of FLAT_PACKED_ARRAYS are returned as PackedSequences.
+    Raises:
+        KeyError: When the array is not part of the flat database.
+    """
+    if not is_flat_database_current(database_path):
+        return None
+
+    flat_path = get_flat_database_path(database_path)
+
+    try:
+        array = np.asarray(np.load(os.path.join(flat_path, f'{array_name}.npy'), mmap_mode='r'))
+        # Older exports store str arrays
+        if array_name in FLAT_PACKED_ARRAYS and array.dtype == np.uint8:
+            return PackedSequences(array, np.load(os.path.join(flat_path, f'{array_name}_indptr.npy'), mmap_mode='r'))
+        return array
+    except FileNotFoundError:
+        if os.path.isfile(os.path.join(flat_path, 'precursors.npy')):
+            raise KeyError(array_name)
+        # The export was replaced and removed in the meantime
+        return read_flat_database(database_path, array_name)
+
+def export_fragment_index(flat_path:str, bin_width:float = FRAGMENT_INDEX_BIN_WIDTH):
+    """
+    Create the fragment index and the shifted fragment index of a flat database and store them next to its fragments.
+    See alphapept.search.create_fragment_index() and alphapept.search.create_shifted_fragment_index().
+    Args:
+        flat_path (str): Folder with the flat database.
+        bin_width (float, optional): Width of a fragment mass bin in Dalton. Defaults to FRAGMENT_INDEX_BIN_WIDTH.
+    """
+    import alphapept.search
+
+    db_frags, db_indices, db_masses = [np.load(os.path.join(flat_path, f'{key}.npy'), mmap_mode='r') for key in ['fragmasses', 'indices', 'precursors']]
+
+    frag_index = alphapept.search.create_fragment_index(db_frags, db_indices, bin_width)
+    shift_index = alphapept.search.create_shifted_fragment_index(db_frags, db_indices, db_masses, bin_width)
+
+    for key, array in zip(FRAGMENT_INDEX_ARRAYS, frag_index + shift_index):
+        np.save(os.path.join(flat_path, f'{key}.npy'), array)
+    np.save(os.path.join(flat_path, 'frag_index_bin_width.npy'), np.array([bin_width]))
+
+
+def read_fragment_index(database_path:str)->dict:
+    """
+    Memory-map the fragment index and the shifted fragment index of the flat export of a database, see export_fragment_index().
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+    Returns:
+        dict: The arrays of FRAGMENT_INDEX_ARRAYS, the bin width (frag_index_bin_width) and the database index of the first indexed entry (frag_index_offset).
+            None if there is no current flat database with a fragment index.
+    """
+    try:
+        bin_width = read_flat_database(database_path, 'frag_index_bin_width')
+    except KeyError:
+        return None
+
+    if bin_width is None:
+        return None
+
+    fragment_index = {key: read_flat_database(database_path, key) for key in FRAGMENT_INDEX_ARRAYS}
+    fragment_index['frag_index_bin_width'] = float(bin_width[0])
+    fragment_index['frag_index_offset'] = 0
+
+    return fragment_index
+
+
+# %% ../nbs/03_fasta.ipynb 115
+import contextlib
+import hashlib
+import socket
+import threading
+import time
+import uuid
+from .__main__ import VERSION_NO
+
+def get_database_hash(fasta_paths:list, fasta_settings:dict, chunk_size:int=2**20)->str:
+    """
+    Get a hash that identifies the database that is generated from FASTA files with the given settings.
+    Args:
+        fasta_paths (list of str): Paths to the FASTA files. The order matters as it defines the protein indices.
+        fasta_settings (dict): The fasta settings.
+        chunk_size (int): Number of bytes that are read from the FASTA files at once. (Default: 2**20)
+    Returns:
+        str: The hex digest of the hash.
+    """
+    database_hash = hashlib.sha256()
+
+    for fasta_path in fasta_paths:
+        with open(fasta_path, 'rb') as fasta_file:
+            for chunk in iter(lambda: fasta_file.read(chunk_size), b''):
+                database_hash.update(chunk)
+        # Separate the files so that moving content between them changes the hash
+        database_hash.update(b'\0')
+
+    database_hash.update(json.dumps(get_database_settings(fasta_settings), sort_keys=True).encode())
+    database_hash.update(VERSION_NO.encode())
+
+    return database_hash.hexdigest()
+
+
+def remove_stale_lock(lock_path:str, stale_timeout:float)->bool:
+    """
+    Remove a lock file that was not refreshed for stale_timeout seconds, as its owner crashed.
+    The lock is moved away atomically first, so that only one process removes it.
+    Args:
+        lock_path (str): Path of the lock file.
+        stale_timeout (float): Seconds after which a lock that was not refreshed is stale.
+    Returns:
+        bool: True if the lock was removed or released in the meantime.
+    """
+    stale_path = f'{lock_path}.{uuid.uuid4().hex}.stale'
+
+    try:
+        if time.time() - os.path.getmtime(lock_path) <= stale_timeout:
+            return False
+        with open(lock_path) as f:
+            owner = f.read()
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return True
+
+    with open(stale_path) as f:
+        moved_owner = f.read()
+
+    if moved_owner != owner:
+        # Another process replaced the stale lock with its own lock in the meantime
+        os.replace(stale_path, lock_path)
+        return False
+
+    os.remove(stale_path)
+    try:
+        owner = json.loads(owner)
+        logging.info(f"Removed stale database cache lock of process {owner['pid']} on {owner['host']} from {time.ctime(owner['time'])}.")
+    except (ValueError, KeyError):
+        logging.info('Removed stale database cache lock.')
+
+    return True
+
+
+@contextlib.contextmanager
+def database_cache_lock(cache_path:str, database_hash:str, poll_interval:float=1, stale_timeout:float=600):
+    """
+    Context manager to get exclusive access to a database cache entry.
+    The lock file is created atomically with O_CREAT | O_EXCL and records the host, process and time of its owner.
+    While the lock is held, its modification time is refreshed in the background. A lock that was not refreshed
+    for stale_timeout seconds belongs to a process that crashed, also if it ran on another host, and is removed.
+    Args:
+        cache_path (str): Folder of the database cache.
+        database_hash (str): Hash of the database, see get_database_hash().
+        poll_interval (float): Seconds to wait before trying to get the lock again. (Default: 1)
+        stale_timeout (float): Seconds after which a lock that was not refreshed is stale. (Default: 600)
+    """
+    lock_path = os.path.join(cache_path, database_hash + '.lock')
+    waiting = False
+
+    while True:
+        try:
+            lock_file = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if remove_stale_lock(lock_path, stale_timeout):
+                continue
+            if not waiting:
+                logging.info('Waiting for another process that creates the same database.')
+                waiting = True
+            time.sleep(poll_interval)
+
+    with os.fdopen(lock_file, 'w') as f:
+        f.write(json.dumps({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time(), 'token': uuid.uuid4().hex}))
+
+    released = threading.Event()
+
+    def refresh_lock():
+        while not released.wait(stale_timeout / 4):
+            os.utime(lock_path)
+
+    refresh_thread = threading.Thread(target=refresh_lock, daemon=True)
+    refresh_thread.start()
+
+    try:
+        yield
+    finally:
+        released.set()
+        refresh_thread.join()
+        os.remove(lock_path)
+
+
+def get_cached_database_path(cache_path:str, database_hash:str)->str:
+    """
+    Get the path of a database in the cache.
+    Args:
+        cache_path (str): Folder of the database cache.
+        database_hash (str): Hash of the database, see get_database_hash().
+    Returns:
+        str: Path to the database in the cache.
+    """
+    return os.path.join(cache_path, database_hash + '.hdf')
+
+
+def copy_from_database_cache(cache_path:str, database_hash:str, database_path:str)->bool:
+    """
+    Copy a database from the cache if it exists. Should be called within database_cache_lock().
+    Args:
+        cache_path (str): Folder of the database cache.
+        database_hash (str): Hash of the database, see get_database_hash().
+        database_path (str): Target path of the database.
+    Returns:
+        bool: True if the database was found in the cache.
+    """
+    cached_path = get_cached_database_path(cache_path, database_hash)
+
+    if not os.path.isfile(cached_path):
+        return False
+
+    # The modification time marks the last use for the eviction
+    os.utime(cached_path)
+
+    temp_path = database_path + '.tmp'
+    shutil.copyfile(cached_path, temp_path)
+    os.replace(temp_path, database_path)
+
+    return True
+
+
+def add_to_database_cache(cache_path:str, database_hash:str, database_path:str, size_max:float):
+    """
+    Add a database to the cache and evict the least recently used entries if the cache is larger than size_max.
+    Should be called within database_cache_lock().
+    Args:
+        cache_path (str): Folder of the database cache.
+        database_hash (str): Hash of the database, see get_database_hash().
+        database_path (str): Path of the database to add.
+        size_max (float): Maximum size of the cache in GB.
+    """
+    cached_path = get_cached_database_path(cache_path, database_hash)
+
+    temp_path = cached_path + '.tmp'
+    shutil.copyfile(database_path, temp_path)
+    os.replace(temp_path, cached_path)
+
+    evict_database_cache(cache_path, size_max, keep=[cached_path])
+
+
+def evict_database_cache(cache_path:str, size_max:float, keep:list=[]):
+    """
+    Remove the least recently used databases until the cache is smaller than size_max.
+    Args:
+        cache_path (str): Folder of the database cache.
+        size_max (float): Maximum size of the cache in GB.
+        keep (list of str): Paths of databases that are never removed. (Default: [])
+    """
+    entries = []
+    for file_name in glob(os.path.join(cache_path, '*.hdf')):
+        try:
+            stat = os.stat(file_name)
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+        except FileNotFoundError:
+            pass
+
+    total_size = sum(_[1] for _ in entries)
+
+    for mtime, size, file_name in sorted(entries):
+        if total_size <= size_max * 1024**3:
+            break
+        if file_name in keep:
+            continue
+        database_hash = os.path.splitext(os.path.basename(file_name))[0]
+        if os.path.isfile(os.path.join(cache_path, database_hash + '.lock')):
+            continue
+        try:
+            os.remove(file_name)
+            total_size -= size
+            logging.info(f'Removed {file_name} with {size/1024**3:.2f} GB from the database cache.')
+        except OSError:
+            # Removed by another process or still open
+            pass
+
+# %% ../nbs/03_fasta.ipynb 118
+def merge_database_spectra(db_spectra:dict, new_spectra:dict)->dict:
+    """
+    Merge two sets of spectra that are sorted by precursor mass and sequence without sorting them again.
+    Args:
+        db_spectra (dict): Arrays precursors, seqs, fragmasses, fragtypes and indices of the database.
+        new_spectra (dict): Arrays of the spectra to add in the same format.
+    Returns:
+        dict: The merged arrays.
+    """
+    db_seqs = db_spectra["seqs"].astype(str)
+    new_seqs = new_spectra["seqs"].astype(str)
+
+    pos = np.searchsorted(db_spectra["precursors"], new_spectra["precursors"], side="left")
+    pos_right = np.searchsorted(db_spectra["precursors"], new_spectra["precursors"], side="right")
+
+    # Spectra with the same precursor mass are sorted by sequence
+    for i in np.flatnonzero(pos_right > pos):
+        pos[i] += np.searchsorted(db_seqs[pos[i]:pos_right[i]], new_seqs[i])
+
+    n_db = len(db_spectra["precursors"])
+    n_new = len(new_spectra["precursors"])
+
+    new_idx = pos + np.arange(n_new)
+    db_idx = np.arange(n_db) + np.searchsorted(pos, np.arange(n_db), side="right")
+
+    merged = {}
+    for key in ["precursors", "seqs"]:
+        merged[key] = np.empty(n_db + n_new, dtype=np.result_type(db_spectra[key], new_spectra[key]))
+        merged[key][db_idx] = db_spectra[key]
+        merged[key][new_idx] = new_spectra[key]
+
+    lens = np.empty(n_db + n_new, dtype=np.int64)
+    lens[db_idx] = np.diff(db_spectra["indices"])
+    lens[new_idx] = np.diff(new_spectra["indices"])
+
+    indices = np.zeros(n_db + n_new + 1, dtype=np.int64)
+    indices[1:] = np.cumsum(lens)
+    merged["indices"] = indices
+
+    for key in ["fragmasses", "fragtypes"]:
+        merged[key] = np.empty(indices[-1], dtype=db_spectra[key].dtype)
+
+    for spectra, idx in [(db_spectra, db_idx), (new_spectra, new_idx)]:
+        spectra_lens = np.diff(spectra["indices"])
+        frag_idx = np.repeat(indices[:-1][idx] - spectra["indices"][:-1], spectra_lens) + np.arange(spectra["indices"][-1])
+        for key in ["fragmasses", "fragtypes"]:
+            merged[key][frag_idx] = spectra[key]
+
+    return merged
+
+
+def update_database(database_path:str, settings:dict, callback = None)->bool:
+    """
+    Update a database incrementally to FASTA files where entries were appended or changed.
+    Only the entries from the first changed entry on are digested, see save_database() for the format.
+    Args:
+        database_path (str): hdf database file generate by alphapept.
+        settings (dict): alphapept settings.
+        callback (function, optional): callback function.
+    Returns:
+        bool: True if the database is up to date, False if it was created with different fasta settings.
+    """
+    db_file = alphapept.io.HDF_File(database_path)
+
+    try:
+        fasta_settings = db_file.read(attr_name="fasta_settings")
+    except KeyError:
+        fasta_settings = None
+
+    if fasta_settings != json.dumps(get_database_settings(settings['fasta']), sort_keys=True):
+        logging.info('Database was created with different fasta settings and can not be updated.')
+        return False
+
+    fasta_list, fasta_dict = generate_fasta_list(fasta_paths = settings['experiment']['fasta_paths'], **settings['fasta'])
+
+    proteins = db_file.read(dataset_name="proteins")
+    columns = sorted(proteins.columns)
+    new_proteins = pd.DataFrame(fasta_dict).T
+
+    n_common = min(len(proteins), len(new_proteins))
+    changed = np.flatnonzero(np.any(proteins[columns].values[:n_common] != new_proteins[columns].values[:n_common], axis=1))
+    n_kept = changed[0] if len(changed) > 0 else n_common
+
+    if n_kept == len(proteins) == len(new_proteins):
+        logging.info('Database is up to date.')
+        return True
+
+    logging.info(f'Keeping {n_kept:,} of {len(proteins):,} proteins, digesting {len(new_proteins)-n_kept:,} new or changed proteins.')
+
+    # Remove the proteins from the first changed entry on
+    old_pept_dict = read_pept_dict(database_path)
+    peptides, proteins = old_pept_dict.to_pairs()
+    kept = proteins < n_kept
+    pept_dicts = [PeptideMap.from_pairs(peptides[kept], proteins[kept])]
+
+    cache = get_digestion_cache(settings['fasta'])
+    for block_start in range(n_kept, len(fasta_list), settings['fasta']['fasta_block']):
+        fasta_block = fasta_list[block_start:block_start+settings['fasta']['fasta_block']]
+        all_mod_peptides = digest_sequences([element["sequence"] for element in fasta_block], cache=cache, **settings['fasta'])
+        pept_dicts.append(get_peptide_map(all_mod_peptides, block_start)[1])
+        if callback:
+            callback((block_start + len(fasta_block) - n_kept)/(len(fasta_list) - n_kept))
+
+    cache.log()
+    pept_dict = PeptideMap.merge(pept_dicts)
+
+    # Peptides that are still present keep their spectra
+    old_sequences, sequences = old_pept_dict.sequences, pept_dict.sequences
+    removed = old_sequences[pept_dict.get_idx(old_sequences) < 0]
+    to_add = List()
+    added = sequences[old_pept_dict.get_idx(sequences) < 0]
+    if len(added) > 0:
+        to_add.extend(added.tolist())
+
+    db_spectra = read_database(database_path, array_name=["precursors", "seqs", "fragmasses", "fragtypes", "indices"])
+
+    if len(removed) > 0:
+        keep = ~np.isin(db_spectra["seqs"], removed)
+        lens = np.diff(db_spectra["indices"])
+        frag_keep = np.repeat(keep, lens)
+        db_spectra["indices"] = np.concatenate([[0], np.cumsum(lens[keep])]).astype(np.int64)
+        for key in ["precursors", "seqs"]:
+            db_spectra[key] = db_spectra[key][keep]
+        for key in ["fragmasses", "fragtypes"]:
+            db_spectra[key] = db_spectra[key][frag_keep]
+
+    if len(to_add) > 0:
+        spectra = []
+        for spectra_block in blocks(to_add, settings['fasta']['spectra_block']):
+            spectra.extend(generate_spectra(spectra_block, mass_dict))
+
+        precmasses, seqs, fragmasses, fragtypes = zip(*spectra)
+        sortindex = np.lexsort((np.array(seqs, dtype=str), np.array(precmasses)))
+
+        indices = np.zeros(len(spectra) + 1, np.int64)
+        indices[1:] = np.cumsum([len(fragmasses[_]) for _ in sortindex])
+
+        new_spectra = {}
+        new_spectra["precursors"] = np.array(precmasses)[sortindex]
+        new_spectra["seqs"] = np.array(seqs, dtype=object)[sortindex]
+        new_spectra["fragmasses"] = np.concatenate([fragmasses[_] for _ in sortindex])
+        new_spectra["fragtypes"] = np.concatenate([fragtypes[_] for _ in sortindex])
+        new_spectra["indices"] = indices
+
+        db_spectra = merge_database_spectra(db_spectra, new_spectra)
+
+    db_spectra["seqs"] = db_spectra["seqs"].astype(object)
+    db_spectra["proteins"] = new_proteins
+
+    logging.info(f'Removed {len(removed):,} and added {len(to_add):,} peptides.')
+
+    # Write to a temporary file so that the database is never incomplete
+    temp_path = database_path + '.tmp'
+    write_database(db_spectra, pept_dict, temp_path, **settings['fasta'])
+    os.replace(temp_path, database_path)
+
+    return True
+
+# %% ../nbs/03_fasta.ipynb 121
+import tempfile
+import h5py
+
+# Resolution (Da) of the precursor mass histogram that is used to find the shard edges
+SHARD_BIN_WIDTH = 0.1
+
+SPECTRA_CHUNK_ARRAYS = ['precursors', 'seqs', 'indices', 'fragmasses', 'fragtypes']
+
+def write_spectra_chunk(spectra:list, chunk_path:str)->np.ndarray:
+    """
+    Write theoretical spectra sorted by precursor mass and sequence to uncompressed .npy files.
+    Args:
+        spectra (list): theoretical spectra. See generate_spectra().
+        chunk_path (str): Folder of the chunk.
+    Returns:
+        np.ndarray: Histogram of the precursor masses with bins of SHARD_BIN_WIDTH.
+    """
+    precmasses, seqs, fragmasses, fragtypes = zip(*spectra)
+    precmasses = np.array(precmasses)
+    seqs = np.array(seqs, dtype=str)
+    sortindex = np.lexsort((seqs, precmasses))
+
+    indices = np.zeros(len(spectra) + 1, np.int64)
+    indices[1:] = np.cumsum([len(fragmasses[_]) for _ in sortindex])
+
+    chunk = {}
+    chunk['precursors'] = precmasses[sortindex]
+    chunk['seqs'] = np.char.encode(seqs[sortindex], 'ascii')
+    chunk['indices'] = indices
+    chunk['fragmasses'] = np.concatenate([fragmasses[_] for _ in sortindex])
+    chunk['fragtypes'] = np.concatenate([fragtypes[_] for _ in sortindex])
+
+    os.makedirs(chunk_path, exist_ok=True)
+    for key in SPECTRA_CHUNK_ARRAYS:
+        np.save(os.path.join(chunk_path, f'{key}.npy'), chunk[key])
+
+    return np.bincount((precmasses / SHARD_BIN_WIDTH).astype(np.int64))
+
+
+def digest_fasta_block_to_chunk(to_process:tuple)->tuple:
+    """
+    Digest a fasta_block and write its spectra to a chunk for multiprocessing. See generate_database_sharded.
+    """
+    fasta_index, fasta_block, settings, chunk_path = to_process
+
+    cache = get_digestion_cache(settings['fasta'])
+    all_mod_peptides = digest_sequences([element["sequence"] for element in fasta_block], cache=cache, **settings['fasta'])
+    cache.log()
+    to_add, pept_dict = get_peptide_map(all_mod_peptides, fasta_index)
+
+    spectra = []
+    for specta_block in blocks(to_add, settings['fasta']['spectra_block']):
+        spectra.extend(generate_spectra(specta_block, mass_dict))
+
+    if len(spectra) > 0:
+        histogram = write_spectra_chunk(spectra, chunk_path)
+    else:
+        histogram = np.zeros(0, dtype=np.int64)
+
+    return pept_dict, histogram
+
+
+def get_shard_edges(histogram:np.ndarray, shard_size:int)->np.ndarray:
+    """
+    Split the precursor mass range into shards with at most shard_size spectra.
+    A shard can only be larger if a single histogram bin has more than shard_size spectra.
+    Args:
+        histogram (np.ndarray): Histogram of the precursor masses with bins of SHARD_BIN_WIDTH.
+        shard_size (int): Maximum number of spectra per shard.
+    Returns:
+        np.ndarray: Precursor mass edges of the shards, starting with -inf and ending with inf.
+    """
+    counts = np.cumsum(histogram)
+    edges = []
+    bin_idx = 0
+    while bin_idx < len(counts):
+        n_before = counts[bin_idx - 1] if bin_idx > 0 else 0
+        next_idx = np.searchsorted(counts, n_before + shard_size, side='right')
+        bin_idx = max(next_idx, bin_idx + 1)
+        edges.append(bin_idx * SHARD_BIN_WIDTH)
+
+    edges = np.array([-np.inf] + edges[:-1] + [np.inf])
+
+    return edges
+
+
+def _append_to_dataset(group:h5py.Group, dataset_name:str, values:np.ndarray):
+    """
+    Append values to a resizable dataset, the dataset is created if it does not exist.
+    """
+    if dataset_name not in group:
+        dtype = h5py.string_dtype() if values.dtype == np.dtype('O') else values.dtype
+        storage = alphapept.io.get_dataset_storage(dataset_name, values[:0], resizable=True)
+        group.create_dataset(dataset_name, shape=(0,), maxshape=(None,), dtype=dtype, **storage)
+
+    dataset = group[dataset_name]
+    n = len(dataset)
+    dataset.resize((n + len(values),))
+    dataset[n:] = values
+
+
+def merge_spectra_chunks(chunk_paths:list, shard_edges:np.ndarray, database_path:str, pept_dict:PeptideMap, compact:bool = False, callback = None)->int:
+    """
+    Merge the chunks shard by shard to the mass-sorted arrays of a database. Duplicate sequences are removed.
+    The arrays and the peptide index of every entry are appended to the database.
+    Args:
+        chunk_paths (list of str): Folders of the chunks. See write_spectra_chunk().
+        shard_edges (np.ndarray): Precursor mass edges of the shards. See get_shard_edges().
+        database_path (str): Path to database.
+        pept_dict (PeptideMap): The peptide map of the database.
+        compact (bool, optional): Append the encoded peptides instead of the fragments, see compact_database(). Defaults to False.
+        callback (function, optional): callback function.
+    Returns:
+        int: Number of spectra in the database.
+    """
+    chunks = [{key: np.load(os.path.join(path, f'{key}.npy'), mmap_mode='r') for key in SPECTRA_CHUNK_ARRAYS} for path in chunk_paths]
+
+    n_spectra = 0
+    n_frags = 0
+    n_residues = 0
+
+    tokens, token_masses = get_database_tokens()
+
+    with h5py.File(database_path, 'a') as hdf_file:
+        _append_to_dataset(hdf_file, 'residue_indptr' if compact else 'indices', np.zeros(1, dtype=np.int64))
+
+        for shard_idx, (mass_min, mass_max) in enumerate(zip(shard_edges[:-1], shard_edges[1:])):
+            shard = {key: [] for key in SPECTRA_CHUNK_ARRAYS}
+            frag_offset = 0
+
+            for chunk in chunks:
+                start, end = np.searchsorted(chunk['precursors'], [mass_min, mass_max])
+                if end > start:
+                    frag_start, frag_end = chunk['indices'][start], chunk['indices'][end]
+                    for key in ['precursors', 'seqs']:
+                        shard[key].append(np.asarray(chunk[key][start:end]))
+                    shard['indices'].append(chunk['indices'][start:end] - frag_start + frag_offset)
+                    for key in ['fragmasses', 'fragtypes']:
+                        shard[key].append(np.asarray(chunk[key][frag_start:frag_end]))
+                    frag_offset += frag_end - frag_start
+
+            if len(shard['precursors']) > 0:
+                shard = {key: np.concatenate(value) for key, value in shard.items()}
+                starts = shard['indices']
+                lens = np.diff(np.append(starts, frag_offset))
+
+                # Identical peptides have the same mass and are in the same shard
+                unique = np.flatnonzero(~pd.Series(shard['seqs']).duplicated().values)
+                order = unique[np.lexsort((shard['seqs'][unique], shard['precursors'][unique]))]
+
+                seqs = np.char.decode(shard['seqs'][order], 'ascii')
+                lens = lens[order]
+                indices = np.cumsum(lens) + n_frags
+                frag_idx = np.repeat(starts[order] - (indices - lens - n_frags), lens) + np.arange(indices[-1] - n_frags)
+
+                _append_to_dataset(hdf_file, 'precursors', shard['precursors'][order])
+                _append_to_dataset(hdf_file, 'seqs', seqs.astype(object))
+                if compact:
+                    residues, residue_indptr = encode_peptides(seqs, tokens)
+                    _append_to_dataset(hdf_file, 'residues', residues)
+                    _append_to_dataset(hdf_file, 'residue_indptr', residue_indptr[1:] + n_residues)
+                    n_residues += residue_indptr[-1]
+                else:
+                    _append_to_dataset(hdf_file, 'indices', indices)
+                    _append_to_dataset(hdf_file, 'fragmasses', shard['fragmasses'][frag_idx])
+                    _append_to_dataset(hdf_file, 'fragtypes', shard['fragtypes'][frag_idx])
+
+                if 'peptides' not in hdf_file:
+                    hdf_file.create_group('peptides')
+                _append_to_dataset(hdf_file['peptides'], 'db_peptide_idx', pept_dict.get_idx(seqs))
+
+                n_spectra += len(order)
+                n_frags = indices[-1]
+
+            if callback:
+                callback((shard_idx+1)/(len(shard_edges)-1))
+
+    return n_spectra
+
+
+def generate_database_sharded(settings:dict, database_path:str, callback = None)->tuple:
+    """
+    Generate a database from fasta files in parallel without holding all spectra in memory.
+    The spectra of each fasta block are written to a chunk on disk and merged shard by shard, see merge_spectra_chunks().
+    The database is the same as the one of generate_database_parallel() and save_database().
+    Args:
+        settings (dict): alphapept settings.
+        database_path (str): Path to database.
+        callback (function, optional): callback function.
+    Returns:
+        int: Number of spectra in the database.
+        PeptideMap: peptide map.
+        dict: fasta_dict. See generate_fasta_list()
+    """
+    n_processes = alphapept.performance.set_worker_count(
+        worker_count=settings['general']['n_processes'],
+        set_global=False
+    )
+
+    fasta_list, fasta_dict = generate_fasta_list(fasta_paths = settings['experiment']['fasta_paths'], **settings['fasta'])
+
+    logging.info(f'FASTA contains {len(fasta_list):,} entries.')
+
+    chunk_dir = tempfile.mkdtemp(prefix='shards_', dir=os.path.dirname(os.path.abspath(database_path)))
+
+    try:
+        to_process = [(idx_start, fasta_list[idx_start:idx_end], settings, os.path.join(chunk_dir, str(i))) for i, (idx_start, idx_end) in enumerate(block_idx(len(fasta_list), settings['fasta']['fasta_block']))]
+
+        pept_dicts = []
+        histogram = np.zeros(0, dtype=np.int64)
+        with Pool(n_processes) as p:
+            max_ = len(to_process)
+            for i, (block_pept_dict, block_histogram) in enumerate(p.imap_unordered(digest_fasta_block_to_chunk, to_process)):
+                if callback:
+                    callback((i+1)/max_)
+                pept_dicts.append(block_pept_dict)
+                if len(block_histogram) > len(histogram):
+                    histogram = np.pad(histogram, (0, len(block_histogram) - len(histogram)))
+                histogram[:len(block_histogram)] += block_histogram
+
+        if histogram.sum() == 0:
+            raise ValueError("No spectra to generate.")
+
+        pept_dict = PeptideMap.merge(pept_dicts)
+        chunk_paths = [_[3] for _ in to_process if os.path.isdir(_[3])]
+        shard_edges = get_shard_edges(histogram, settings['fasta']['database_shard_size'])
+
+        logging.info(f'Merging {len(chunk_paths):,} chunks in {len(shard_edges)-1:,} shards.')
+
+        db_file = alphapept.io.HDF_File(database_path, is_new_file=True)
+        n_spectra = merge_spectra_chunks(chunk_paths, shard_edges, database_path, pept_dict, compact=settings['fasta']['database_compact'])
+        write_precursor_buckets(db_file, db_file.read(dataset_name="precursors"))
+
+        if settings['fasta']['database_compact']:
+            tokens, token_masses = get_database_tokens()
+            db_file.write(tokens.astype(object), dataset_name="tokens")
+            db_file.write(token_masses, dataset_name="token_masses")
+        db_file.write(pd.DataFrame(fasta_dict).T, dataset_name="proteins")
+        db_file.write(json.dumps(get_database_settings(settings['fasta']), sort_keys=True), attr_name="fasta_settings")
+        write_pept_dict(db_file, pept_dict)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    return n_spectra, pept_dict, fasta_dict
+
+
+# %% ../nbs/03_fasta.ipynb 124
+import shutil
+import psutil
+
+# Approximate memory (bytes) of one spectrum tuple in a python list, without the fragment arrays
+SPECTRUM_OVERHEAD_BYTES = 400
+# Bytes per fragment: float64 mass and int8 type
+FRAGMENT_BYTES = 9
+
+
+def sample_fasta(fasta_paths:list, n_samples:int, seed:int = 42)->tuple:
+    """
+    Draw a random sample of entries from fasta files.
+    The files are read once with reservoir sampling, so that the number of entries does not need to be known in advance.
+    Args:
+        fasta_paths (str or list of str): fasta path or a list of fasta paths.
+        n_samples (int): number of entries to sample.
+        seed (int): seed of the random number generator.
+    Returns:
+        list (of dict): the sampled protein entries, see read_fasta_file().
+        int: total number of entries of all fasta files.
+    """
+    if type(fasta_paths) is str:
+        fasta_paths = [fasta_paths]
+
+    rng = np.random.default_rng(seed)
+
+    sample = []
+    n_total = 0
+    for fasta_file in fasta_paths:
+        for element in read_fasta_file(fasta_file):
+            if n_total < n_samples:
+                sample.append(element)
+            else:
+                # The i-th entry replaces a sampled entry with probability n_samples / (i + 1)
+                i = rng.integers(n_total + 1)
+                if i < n_samples:
+                    sample[i] = element
+            n_total += 1
+
+    return sample, n_total
+
+
+def estimate_database(settings:dict, database_path:str = None, n_samples:int = 1000, memory_available:float = None, disk_available:float = None)->dict:
+    """
+    Estimate the size of a database by digesting a sample of the proteins with the given settings and choose how to create it.
+    Peptides that are shared between proteins make the number of unique peptides grow sub-linearly with the number of proteins. The number of spectra is extrapolated with a power law whose exponent is estimated from the fraction of unique peptides in the sample and in a random half of it.
+    Args:
+        settings (dict): alphapept settings.
+        database_path (str, optional): path of the database, used to get the free disk space.
+        n_samples (int): number of proteins to sample.
+        memory_available (float, optional): available memory in GB. Defaults to the available system memory.
+        disk_available (float, optional): available disk space in GB. Defaults to the free space at the database path.
+    Returns:
+        dict: the estimate with the number of proteins, spectra and fragments, the database size and peak memory in GB for each mode, and the chosen mode ('memory', 'sharded' or 'search_parallel'), fasta_block and spectra_block.
+    """
+    n_processes = alphapept.performance.set_worker_count(
+        worker_count=settings['general']['n_processes'],
+        set_global=False
+    )
+    if memory_available is None:
+        memory_available = psutil.virtual_memory().available/1024**3
+    if disk_available is None:
+        disk_available = shutil.disk_usage(os.path.dirname(os.path.abspath(database_path or '.'))).free/1024**3
+
+    sample, n_proteins = sample_fasta(settings['experiment']['fasta_paths'], n_samples)
+    if len(sample) == 0:
+        raise ValueError("No proteins in FASTA files.")
+
+    all_mod_peptides = digest_sequences([element["sequence"] for element in sample], **settings['fasta'])
+    to_add, pept_dict = get_peptide_map(all_mod_peptides)
+    spectra = generate_spectra(to_add, mass_dict) if len(to_add) > 0 else []
+
+    # Unique peptides grow as n_proteins**exponent, exponent < 1 if proteins share peptides.
+    # The fraction of unique peptides is compared to a random half of the sample, which is independent of the protein lengths.
+    # The sample is in file order, where related proteins are often next to each other.
+    half = np.random.default_rng(42).permutation(len(sample))[:len(sample) // 2]
+    n_half = len(half)
+    n_peptides = sum(len(set(_)) for _ in all_mod_peptides)
+    n_peptides_half = sum(len(set(all_mod_peptides[_])) for _ in half)
+    n_unique_half = len(set(peptide for _ in half for peptide in all_mod_peptides[_]))
+    if n_half > 0 and n_unique_half > 0 and len(to_add) > 0:
+        unique_fraction_ratio = (len(to_add) / n_peptides) / (n_unique_half / n_peptides_half)
+        exponent = float(np.clip(1 + np.log(unique_fraction_ratio) / np.log(len(sample) / n_half), 0, 1))
+    else:
+        exponent = 1.0
+
+    scale = n_proteins / len(sample)
+    spectra_per_protein = len(spectra) / len(sample)
+    n_spectra = int(len(spectra) * scale**exponent)
+    fragments_per_spectrum = np.mean([len(_[2]) for _ in spectra]) if len(spectra) > 0 else 0
+    sequence_bytes = np.mean([len(_[1]) for _ in spectra]) if len(spectra) > 0 else 0
+    n_assignments = len(pept_dict.protein_indices) * scale
+
+    # precursors, seqs, indices and the peptide map, see save_database
+    base_bytes = n_spectra * (8 + sequence_bytes + 8 + 8 + sequence_bytes + 8) + n_assignments * 8
+    if settings['fasta']['database_compact']:
+        # uint16 residues with an indptr instead of the fragments
+        db_bytes = base_bytes + n_spectra * (2 * (fragments_per_spectrum / 2 + 1) + 8)
+    else:
+        db_bytes = base_bytes + n_spectra * fragments_per_spectrum * FRAGMENT_BYTES
+
+    spectrum_memory = SPECTRUM_OVERHEAD_BYTES + sequence_bytes + fragments_per_spectrum * FRAGMENT_BYTES
+    # generate_database_parallel keeps all spectra as python objects, save_database converts them to arrays
+    memory_bytes = n_spectra * spectrum_memory + db_bytes
+
+    # One fasta block per worker should hold about 1% of the memory budget
+    block_memory = 0.01 * memory_available * 1024**3 / n_processes
+    fasta_block = int(np.clip(block_memory / max(spectra_per_protein * spectrum_memory, 1), 100, 10000))
+    spectra_block = int(np.clip(block_memory / spectrum_memory, 1000, 1000000))
+
+    # Sharded generation keeps the blocks of the workers, one shard and the peptide map in memory
+    sharded_memory_bytes = n_processes * fasta_block * spectra_per_protein * spectrum_memory + min(settings['fasta']['database_shard_size'], n_spectra) * spectrum_memory + base_bytes
+
+    if memory_bytes < 0.5 * memory_available * 1024**3 and 2 * db_bytes < disk_available * 1024**3:
+        mode = 'memory'
+    elif sharded_memory_bytes < 0.5 * memory_available * 1024**3 and 3 * db_bytes < disk_available * 1024**3:
+        # Chunks and database are on disk at the same time
+        mode = 'sharded'
+    else:
+        mode = 'search_parallel'
+
+    estimate = {
+        'n_proteins': n_proteins,
+        'n_sampled': len(sample),
+        'n_spectra': n_spectra,
+        'spectra_exponent': exponent,
+        'fragments_per_spectrum': float(fragments_per_spectrum),
+        'database_size': db_bytes / 1024**3,
+        'memory': memory_bytes / 1024**3,
+        'sharded_memory': sharded_memory_bytes / 1024**3,
+        'memory_available': memory_available,
+        'disk_available': disk_available,
+        'mode': mode,
+        'fasta_block': fasta_block,
+        'spectra_block': spectra_block,
+    }
+
+    logging.info(f"Sampled {len(sample):,} of {n_proteins:,} proteins: about {n_spectra:,} spectra with {fragments_per_spectrum:.1f} fragments each.")
+    logging.info(f"Estimated database size {estimate['database_size']:.2f} GB, peak memory {estimate['memory']:.2f} GB in memory and {estimate['sharded_memory']:.2f} GB sharded ({memory_available:.2f} GB memory and {disk_available:.2f} GB disk available).")
+    logging.info(f"Using database mode {mode} with fasta_block {fasta_block:,} and spectra_block {spectra_block:,}.")
+
+    return estimate
@@ -81,6 +81,7 @@ def wrapped_partial(func: callable, *args, **kwargs) -> callable:
 import os
 import functools
 import copy
+import contextlib
 
 def create_database(
     settings: dict,
@@ -104,10 +105,12 @@ def create_database(
 
     """
     import alphapept.fasta
+    import alphapept.io
     if not logger_set:
         set_logger()
     if not settings_parsed:
         settings = check_version_and_hardware(settings)
+    alphapept.io.set_storage_policy(settings['general']['storage_policy'])
     if 'database_path' not in settings['experiment']:
         database_path = ''
     else:
@@ -126,7 +129,14 @@ def create_database(
 
     temp_settings = settings
 
-    if os.path.isfile(database_path):
+    database_exists = os.path.isfile(database_path)
+
+    if database_exists and settings['fasta']['database_incremental']:
+        if not alphapept.fasta.update_database(database_path, settings, callback=callback):
+            logging.info('Creating database {} again.'.format(database_path))
+            database_exists = False
+
+    if database_exists:
         logging.info(
             'Database path set and exists. Using {} as database.'.format(
                 database_path
@@ -162,48 +172,94 @@ def create_database(
 
         fasta_size_max = settings['fasta']['fasta_size_max']
 
-        if total_fasta_size >= fasta_size_max:
+        if settings['fasta']['database_auto']:
+            estimate = alphapept.fasta.estimate_database(settings, database_path, n_samples=settings['fasta']['database_auto_samples'])
+            settings['fasta']['fasta_block'] = estimate['fasta_block']
+            settings['fasta']['spectra_block'] = estimate['spectra_block']
+            settings['fasta']['database_sharded'] = estimate['mode'] == 'sharded'
+
+            if estimate['mode'] == 'search_parallel':
+                logging.info('Estimated database does not fit in memory or on disk. Searching without database.')
+
+                settings['experiment']['database_path'] = None
+
+                return settings
+
+        elif total_fasta_size >= fasta_size_max and not settings['fasta']['database_sharded']:
             logging.info(f'Total FASTA size {total_fasta_size:.2f} is larger than the set maximum size of {fasta_size_max:.2f} Mb')
 
             settings['experiment']['database_path'] = None
 
             return settings
 
-        logging.info('Creating a new database from FASTA.')
-
-        if not callback:
-            cb = functools.partial(tqdm_wrapper, tqdm.tqdm(total=1))
+        if settings['fasta']['database_cache']:
+            from alphapept.paths import DATABASE_CACHE_PATH
+            database_hash = alphapept.fasta.get_database_hash(settings['experiment']['fasta_paths'], settings['fasta'])
+            cache_lock = alphapept.fasta.database_cache_lock(DATABASE_CACHE_PATH, database_hash)
         else:
-            cb = callback
+            database_hash = None
+            cache_lock = contextlib.nullcontext()
 
-        (
-            spectra,
-            pept_dict,
-            fasta_dict
-        ) = alphapept.fasta.generate_database_parallel(
-            temp_settings,
-            callback=cb
-        )
-        logging.info(
-            'Digested {:,} proteins and generated {:,} spectra'.format(
-                len(fasta_dict),
-                len(spectra)
-            )
-        )
+        with cache_lock:
+            if database_hash is not None and alphapept.fasta.copy_from_database_cache(DATABASE_CACHE_PATH, database_hash, database_path):
+                logging.info(f'Found database in cache {DATABASE_CACHE_PATH}. Copied it to {database_path}.')
+            else:
+                logging.info('Creating a new database from FASTA.')
 
-        alphapept.fasta.save_database(
-            spectra,
-            pept_dict,
-            fasta_dict,
-            database_path = database_path,
-            **settings['fasta']
-        )
-        logging.info(
-            'Database saved to {}. Filesize of database is {:.2f} GB'.format(
-                database_path,
-                os.stat(database_path).st_size/(1024**3)
-            )
-        )
+                if not callback:
+                    cb = functools.partial(tqdm_wrapper, tqdm.tqdm(total=1))
+                else:
+                    cb = callback
+
+                if settings['fasta']['database_sharded']:
+                    (
+                        n_spectra,
+                        pept_dict,
+                        fasta_dict
+                    ) = alphapept.fasta.generate_database_sharded(
+                        temp_settings,
+                        database_path,
+                        callback=cb
+                    )
+                    logging.info(
+                        'Digested {:,} proteins and generated {:,} spectra'.format(
+                            len(fasta_dict),
+                            n_spectra
+                        )
+                    )
+                else:
+                    (
+                        spectra,
+                        pept_dict,
+                        fasta_dict
+                    ) = alphapept.fasta.generate_database_parallel(
+                        temp_settings,
+                        callback=cb
+                    )
+                    logging.info(
+                        'Digested {:,} proteins and generated {:,} spectra'.format(
+                            len(fasta_dict),
+                            len(spectra)
+                        )
+                    )
+
+                    alphapept.fasta.save_database(
+                        spectra,
+                        pept_dict,
+                        fasta_dict,
+                        database_path = database_path,
+                        **settings['fasta']
+                    )
+                logging.info(
+                    'Database saved to {}. Filesize of database is {:.2f} GB'.format(
+                        database_path,
+                        os.stat(database_path).st_size/(1024**3)
+                    )
+                )
+
+                if database_hash is not None:
+                    alphapept.fasta.add_to_database_cache(DATABASE_CACHE_PATH, database_hash, database_path, settings['fasta']['database_cache_size_max'])
+                    logging.info(f'Added database to cache {DATABASE_CACHE_PATH}.')
 
         settings['experiment']['database_path'] = database_path
 
@@ -312,16 +368,25 @@ def search_data(
 
     import alphapept.search
     import alphapept.io
+    import alphapept.fasta
 
     if not callback:
         cb = functools.partial(tqdm_wrapper, tqdm.tqdm(total=1))
     else:
         cb = callback
 
+    # The flat database also stores the fragment index, which is then created once for all searches
+    uses_fragment_index = settings['search']['search_engine'] == 'fragment_index' or settings['search']['open_search']
+    if settings['experiment']['database_path'] is not None and (settings['search']['mmap_database'] or uses_fragment_index):
+        alphapept.fasta.export_flat_database(settings['experiment']['database_path'])
+
     if first_search:
         logging.info('Starting first search.')
         if settings['experiment']['database_path'] is not None:
-            settings = parallel_execute(settings, wrapped_partial(alphapept.search.search_db, first_search = first_search), callback = cb)
+            if settings['search']['batch_search']:
+                settings = alphapept.search.search_db_batch(settings, first_search = first_search, callback = cb)
+            else:
+                settings = parallel_execute(settings, wrapped_partial(alphapept.search.search_db, first_search = first_search), callback = cb)
 
             db_data = alphapept.fasta.read_database(settings['experiment']['database_path'])
 
@@ -346,7 +411,10 @@ def search_data(
         logging.info('Starting second search with DB.')
 
         if settings['experiment']['database_path'] is not None:
-            settings = parallel_execute(settings, wrapped_partial(alphapept.search.search_db, first_search = first_search), callback = cb)
+            if settings['search']['batch_search']:
+                settings = alphapept.search.search_db_batch(settings, first_search = first_search, callback = cb)
+            else:
+                settings = parallel_execute(settings, wrapped_partial(alphapept.search.search_db, first_search = first_search), callback = cb)
 
             db_data = alphapept.fasta.read_database(settings['experiment']['database_path'])
 
@@ -448,7 +516,7 @@ def score(
 
     Args:
         settings (dict): A dictionary with settings how to process the data.
-        pept_dict (dict): A dictionary with peptides. Defaults to None.
+        pept_dict (alphapept.fasta.PeptideMap): A map with peptides, a dictionary with peptides also works. Defaults to None.
         fasta_dict (dict): A dictionary with fasta sequences. Defaults to None.
         logger_set (bool): If False, reset the default logger. Defaults to False.
         settings_parsed (bool): If True, reparse the settings. Defaults to False.
@@ -535,7 +603,7 @@ def protein_grouping(
 
     Args:
         settings (dict): A dictionary with settings how to process the data.
-        pept_dict (dict): A dictionary with peptides. Defaults to None.
+        pept_dict (alphapept.fasta.PeptideMap): A map with peptides, a dictionary with peptides also works. Defaults to None.
         fasta_dict (dict): A dictionary with fasta sequences. Defaults to None.
         logger_set (bool): If False, reset the default logger. Defaults to False.
         settings_parsed (bool): If True, reparse the settings. Defaults to False.
@@ -570,7 +638,7 @@ def protein_grouping(
     if pept_dict is None: #Pept dict extractions needs scored
         pept_dict = alphapept.fasta.pept_dict_from_search(settings)
 
-    logging.info(f'Fasta dict with length {len(fasta_dict):,}, Pept dict with length {len(pept_dict):,}')
+    logging.info(f'Fasta dict with length {len(fasta_dict):,}, Peptide map with length {len(pept_dict):,}')
 
     # Protein groups
     logging.info('Extracting protein groups.')
@@ -663,7 +731,7 @@ def read_label_intensity(df : pd.DataFrame, label: NamedTuple) ->  pd.DataFrame:
 
     for channel in label.channels:
 
-        _ = df[['protein_group', channel]].groupby('protein_group').sum()
+        _ = df[['protein_group', channel]].groupby('protein_group', observed=True).sum()
 
         all_channels.append(_)
 
@@ -739,15 +807,18 @@ def quantification(
                             'fraction_normalization'
                         )
                         df_grouped = df.groupby(
-                            ['sample_group', 'precursor', 'protein_group']
+                            ['sample_group', 'precursor', 'protein_group'],
+                            observed=True
                         )[['{}_dn'.format(field)]].sum().reset_index()
                     else:
                         df_grouped = df.groupby(
-                            ['sample_group', 'precursor', 'protein_group']
+                            ['sample_group', 'precursor', 'protein_group'],
+                            observed=True
                         )[field].sum().reset_index()
 
                     logging.info('Saving protein_groups after delayed normalization to combined_protein_fdr_dn')
-                    df.to_hdf(
+                    alphapept.utils.write_results_df(
+                        df,
                         settings['experiment']['results_path'],
                         'combined_protein_fdr_dn'
                     )
@@ -769,9 +840,10 @@ def quantification(
                     
             else:
                 logging.info('Exporting protein intensity.')
-                protein_table = df.groupby(['protein_group','sample_group'])[field].sum().unstack()
+                protein_table = df.groupby(['protein_group','sample_group'], observed=True)[field].sum().unstack()
                     
-            protein_table.to_hdf(
+            alphapept.utils.write_results_df(
+                protein_table,
                 settings['experiment']['results_path'],
                 'protein_table'
             )
@@ -782,7 +854,7 @@ def quantification(
 
             for field in ['sequence','precursor']:
                 col_ = 'n_'+ field+' '
-                m = df.groupby(['protein_group','sample_group'])[field].count().unstack()
+                m = df.groupby(['protein_group','sample_group'], observed=True)[field].count().unstack()
                 m.columns = [col_ +_ for _ in m.columns]
                 protein_summary.loc[m.index, m.columns] = m.values
 
@@ -796,8 +868,8 @@ def quantification(
             logging.info(f'Saved protein_summary of length {len(protein_summary):,} saved to {ps_out}')
 
             #protein summary
-            protein_summary.to_hdf(
-            settings['experiment']['results_path'],'protein_summary')
+            alphapept.utils.write_results_df(
+            protein_summary, settings['experiment']['results_path'],'protein_summary')
         
     else:
         logging.info('No results.hdf present.')
@@ -808,7 +880,8 @@ def quantification(
 
         logging.info('Updating protein_fdr.') #This now has delayed normalization in it
         
-        df.to_hdf(
+        alphapept.utils.write_results_df(
+            df,
             results_path,
             'protein_fdr'
         )
@@ -958,12 +1031,16 @@ def run_complete_workflow(
         if callback_overall:
             callback_overall((step/n_steps)+(current/n_steps))
 
+    import alphapept.io
+    alphapept.io.set_storage_policy(settings['general']['storage_policy'])
+
     pept_dict = None
     fasta_dict = None
 
     first_search = True
 
     time_dict = {}
+    hdf_dict = {}
 
     run_start = time()
 
@@ -989,6 +1066,7 @@ def run_complete_workflow(
             callback_task(step.__name__)
 
         start = time()
+        alphapept.io.HDF_HANDLE_POOL.reset_counts()
 
         if callback_overall:
             progress_wrapper(idx, n_steps, 0)
@@ -1028,7 +1106,12 @@ def run_complete_workflow(
 
         time_dict['total (min)'] = (end-run_start)/60
 
+        hdf_counts = alphapept.io.HDF_HANDLE_POOL.get_counts()
+        logging.info(f"HDF handles of {step.__name__} in the main process: {hdf_counts['open']:,} opened, {hdf_counts['close']:,} closed, {hdf_counts['reuse']:,} reused.")
+        hdf_dict[step.__name__] = hdf_counts
+
         summary['timing'] = time_dict
+        summary['hdf_handles'] = hdf_dict
         summary['version'] = VERSION_NO
         summary['time'] = f"{datetime.datetime.now()}"
 
@@ -1062,9 +1145,9 @@ def extract_median_unique(settings: dict, fields: list, summary_type='filename')
     """
     protein_fdr = pd.read_hdf(settings['experiment']['results_path'], 'protein_fdr')
     cols = [_ for _ in ['protein','protein_group','precursor','sequence_naked','sequence'] if _ in protein_fdr.columns]
-    n_unique = protein_fdr.groupby(summary_type)[cols].nunique()
+    n_unique = protein_fdr.groupby(summary_type, observed=True)[cols].nunique()
     cols = [_ for _ in fields if _ in protein_fdr.columns]
-    median = protein_fdr[[summary_type]+cols].groupby(summary_type).median()
+    median = protein_fdr[[summary_type]+cols].groupby(summary_type, observed=True).median()
     if(summary_type=='filename'):
         n_unique.index = [os.path.split(_)[1][:-12] for _ in n_unique.index]
         median.index = [os.path.split(_)[1][:-12] for _ in median.index]
@@ -1083,36 +1166,37 @@ def get_file_summary(ms_data: alphapept.io.MS_Data_File, fields: list) -> dict:
         dict: A dictionary with summary statistics.
 
     """
-    f_summary = {}
-    
-    
-    try:
-        f_summary['acquisition_date_time'] = ms_data.read(group_name = 'Raw', attr_name = 'acquisition_date_time')
-    except KeyError:
-        f_summary['acquisition_date_time'] = None
-    
-    try:
-        n_ms2 = ms_data.read(group_name='Raw/MS2_scans', dataset_name='prec_mass_list2', return_dataset_shape=True)[0]
-    except KeyError:
-        n_ms2 = 0
+    with ms_data.session(mode="r"):
+        f_summary = {}
 
-    for key in ms_data.read():
 
-        if "is_pd_dataframe" in ms_data.read(attr_name="", group_name=key):
-            df = ms_data.read(dataset_name=key)
+        try:
+            f_summary['acquisition_date_time'] = ms_data.read(group_name = 'Raw', attr_name = 'acquisition_date_time')
+        except KeyError:
+            f_summary['acquisition_date_time'] = None
 
-            f_summary[f"{key} (n in table)"] = len(df)
+        try:
+            n_ms2 = ms_data.read(group_name='Raw/MS2_scans', dataset_name='prec_mass_list2', return_dataset_shape=True)[0]
+        except KeyError:
+            n_ms2 = 0
 
-            if key in ['identifications']:
-                
-                m = df[df["q_value"].gt(0.01)]
-                
-                f_summary['id_rate (0.01)'] = round(float( m['raw_idx'].nunique() / n_ms2),2)
+        for key in ms_data.read():
+
+            if "is_pd_dataframe" in ms_data.read(attr_name="", group_name=key):
+                df = ms_data.read(dataset_name=key)
 
-            if key in ['feature_table','peptide_fdr']:
-                for field in fields:
-                    if field in df.columns:
-                        f_summary[f'{field} ({key}, median)'] = float(df[field].median())
+                f_summary[f"{key} (n in table)"] = len(df)
+
+                if key in ['identifications']:
+
+                    m = df[df["q_value"].gt(0.01)]
+
+                    f_summary['id_rate (0.01)'] = round(float( m['raw_idx'].nunique() / n_ms2),2)
+
+                if key in ['feature_table','peptide_fdr']:
+                    for field in fields:
+                        if field in df.columns:
+                            f_summary[f'{field} ({key}, median)'] = float(df[field].median())
 
     return f_summary
 
@@ -1217,6 +1301,9 @@ def parallel_execute(
         MEMORY_LIMITS['search_db'] = 8
     
 
+    import alphapept.io
+    alphapept.io.set_storage_policy(settings['general']['storage_policy'])
+
     files = settings['experiment']['file_paths']
     n_files = len(files)
     logging.info(f'Processing {len(files)} files for step {step.__name__}')
@@ -1257,8 +1344,14 @@ def parallel_execute(
                 raise NotImplementedError('Feature Finding: File extension {} not understood.'.format(ext))
 
         elif step.__name__ == 'search_db':
+            import alphapept.fasta
             memory_available = psutil.virtual_memory().available/1024**3
-            n_processes_temp = max((int(memory_available //8 ), 1)) # 8 gb per file: Todo: make this better
+            if alphapept.fasta.is_flat_database_current(settings['experiment']['database_path']):
+                # The database is memory-mapped and shared, only the query data is private
+                memory_per_process = 2
+            else:
+                memory_per_process = 8 # 8 gb per file: Todo: make this better
+            n_processes_temp = max((int(memory_available //memory_per_process ), 1))
             n_processes = min((n_processes, n_processes_temp))
             n_processes = min((n_processes, n_files)) #not more processes than files.
             logging.info(f'Searching. Setting Process limit to {n_processes}.')
@@ -1284,7 +1377,7 @@ def parallel_execute(
         failed = []
         rerun = []
         rerun_map = {}
-        with alphapept.performance.AlphaPool(n_processes) as p:
+        with alphapept.performance.AlphaPool(n_processes, initializer=alphapept.io.set_storage_policy, initargs=(settings['general']['storage_policy'],)) as p:
             for i, success in enumerate(p.imap(step, to_process)):
                 progress = (i+1)/n_files
                 if success is not True:
@@ -1,10 +1,13 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/02_io.ipynb.
 
 # %% auto 0
-__all__ = ['get_peaks', 'get_centroid', 'gaussian_estimator', 'centroid_data', 'get_local_intensity', 'get_most_abundant',
-           'load_thermo_raw', 'load_bruker_raw', 'one_over_k0_to_CCS', 'import_sciex_as_alphapept', 'load_sciex_raw',
-           'check_sanity', 'extract_mzml_info', 'load_mzml_data', 'extract_mq_settings', 'parse_mq_seq',
-           'list_to_numpy_f32', 'HDF_File', 'MS_Data_File', 'index_ragged_list', 'raw_conversion']
+__all__ = ['HDF_HANDLE_POOL', 'CATEGORICAL_MAX_UNIQUE_FRACTION', 'STORAGE_CHUNK_BYTES', 'STORAGE_DATASET_CLASSES',
+           'STORAGE_POLICIES', 'STORAGE_POLICY', 'get_peaks', 'get_centroid', 'gaussian_estimator', 'centroid_data',
+           'get_local_intensity', 'get_most_abundant', 'load_thermo_raw', 'load_bruker_raw', 'one_over_k0_to_CCS',
+           'import_sciex_as_alphapept', 'load_sciex_raw', 'check_sanity', 'extract_mzml_info', 'load_mzml_data',
+           'extract_mq_settings', 'parse_mq_seq', 'list_to_numpy_f32', 'HDF_Handle_Pool', 'HDF_File', 'encode_strings',
+           'decode_strings', 'encode_categories', 'encode_column', 'table_columns', 'read_column', 'set_storage_policy',
+           'get_dataset_storage', 'MS_Data_File', 'index_ragged_list', 'DDA_Query_Data', 'raw_conversion']
 
 # %% ../nbs/02_io.ipynb 3
 from numba import njit
@@ -765,6 +768,169 @@ import h5py
 import os
 import time
 from .__main__ import VERSION_NO
+import contextlib
+import collections
+import threading
+
+
+class HDF_Handle_Pool(object):
+    '''
+    A process-wide pool of open h5py.File handles.
+
+    Handles are only pooled while a session is active, see `HDF_File.session`.
+    Sessions are reference counted, so nested sessions or several HDF_File
+    objects of the same file share one handle, which is closed when the last
+    session ends and no access uses it anymore. Outside of sessions every
+    access opens and closes the file. A pooled handle is only reopened for
+    writing, swmr or truncation while a single session and no other access
+    use it. The numbers of opened, closed and reused handles are counted.
+    The pool can be used from several threads.
+    '''
+
+    def __init__(self):
+        self.handles = {}
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+    def _open(self, file_name: str, mode: str, swmr: bool) -> h5py.File:
+        self.counts["open"] += 1
+        return h5py.File(file_name, mode, swmr=swmr)
+
+    def _close(self, hdf_file: h5py.File):
+        self.counts["close"] += 1
+        hdf_file.close()
+
+    def acquire(self, file_name: str, mode: str = "r", swmr: bool = False):
+        """Start a session and keep a handle of a file open.
+
+        Args:
+            file_name (str): The file_name of the HDF file.
+            mode (str): "r" to read or "a" to read and write. Defaults to "r".
+            swmr (bool): Open the file in swmr mode. Defaults to False.
+
+        Raises:
+            OSError: If the pooled handle is shared and would need to be reopened for writing or swmr.
+
+        """
+        with self.lock:
+            if file_name in self.handles:
+                entry = self.handles[file_name]
+                entry["n_sessions"] += 1
+                try:
+                    self._reopen(file_name, mode, swmr)
+                except OSError:
+                    entry["n_sessions"] -= 1
+                    raise
+            else:
+                self.handles[file_name] = {
+                    "handle": self._open(file_name, mode, swmr),
+                    "mode": mode,
+                    "swmr": swmr,
+                    "n_sessions": 1,
+                    "n_accesses": 0,
+                }
+
+    def release(self, file_name: str):
+        """End a session and close the handle if it was the last one.
+
+        Args:
+            file_name (str): The file_name of the HDF file.
+
+        """
+        with self.lock:
+            entry = self.handles[file_name]
+            entry["n_sessions"] -= 1
+            if entry["n_sessions"] == 0:
+                del self.handles[file_name]
+                # Otherwise, the last access closes the handle
+                if entry["n_accesses"] == 0:
+                    self._close(entry["handle"])
+
+    def _check_unshared(self, file_name: str, action: str):
+        # Reopening closes the pooled handle, which must not be in use elsewhere
+        entry = self.handles[file_name]
+        if (entry["n_sessions"] > 1) or (entry["n_accesses"] > 0):
+            raise OSError(
+                f"Can not {action} {file_name}, its handle is shared by "
+                f"{entry['n_sessions']} sessions and {entry['n_accesses']} accesses."
+            )
+
+    def _reopen(self, file_name: str, mode: str, swmr: bool):
+        # Upgrade a pooled handle if it can not be used for the requested access
+        entry = self.handles[file_name]
+        needs_write = (mode != "r") and (entry["mode"] == "r")
+        needs_swmr = swmr and not entry["swmr"] and (entry["mode"] == "r")
+        if needs_write or needs_swmr:
+            self._check_unshared(file_name, "reopen for writing" if needs_write else "reopen in swmr mode")
+            self._close(entry["handle"])
+            entry["mode"] = "a" if needs_write else entry["mode"]
+            entry["swmr"] = entry["swmr"] or swmr
+            entry["handle"] = self._open(file_name, entry["mode"], entry["swmr"])
+
+    @contextlib.contextmanager
+    def open(self, file_name: str, mode: str = "r", swmr: bool = False):
+        """Get a handle of a file for a single access.
+
+        The pooled handle is used if a session is active, else the file is opened and closed.
+        A pooled handle that was opened for reading is reopened if writing or swmr is requested.
+
+        Args:
+            file_name (str): The file_name of the HDF file.
+            mode (str): "r" to read, "a" to read and write or "w" to truncate. Defaults to "r".
+            swmr (bool): Open the file in swmr mode. Defaults to False.
+
+        Yields:
+            h5py.File: The open file.
+
+        Raises:
+            OSError: If the pooled handle is shared and would need to be reopened for writing, swmr or truncation.
+
+        """
+        with self.lock:
+            entry = self.handles.get(file_name)
+            if entry is not None:
+                if mode == "w":
+                    # Truncating a file invalidates the pooled handle
+                    self._check_unshared(file_name, "truncate")
+                    self._close(entry["handle"])
+                    entry["handle"] = self._open(file_name, mode, swmr)
+                    entry["mode"] = "a"
+                else:
+                    self._reopen(file_name, mode, swmr)
+                entry["n_accesses"] += 1
+                self.counts["reuse"] += 1
+        if entry is not None:
+            try:
+                yield entry["handle"]
+            finally:
+                with self.lock:
+                    entry["n_accesses"] -= 1
+                    if (entry["n_accesses"] == 0) and (entry["n_sessions"] == 0):
+                        self._close(entry["handle"])
+        else:
+            with self.lock:
+                hdf_file = self._open(file_name, mode, swmr)
+            try:
+                yield hdf_file
+            finally:
+                with self.lock:
+                    self._close(hdf_file)
+
+    def get_counts(self) -> dict:
+        """Get the number of opened, closed and reused handles of this process.
+
+        Returns:
+            dict: The counts of "open", "close" and "reuse".
+
+        """
+        return {key: self.counts[key] for key in ["open", "close", "reuse"]}
+
+    def reset_counts(self):
+        """Reset the counts of opened, closed and reused handles."""
+        self.counts.clear()
+
+
+HDF_HANDLE_POOL = HDF_Handle_Pool()
 
 
 class HDF_File(object):
@@ -840,19 +1006,44 @@ class HDF_File(object):
             is_read_only = False
             if not os.path.exists(self.directory):
                 os.makedirs(self.directory)
-            with h5py.File(self.file_name, "w") as hdf_file:
+            with HDF_HANDLE_POOL.open(self.file_name, "w") as hdf_file:
                 current_time = time.asctime()
                 hdf_file.attrs["creation_time"] = current_time
                 hdf_file.attrs["original_file_name"] = self.__file_name
                 hdf_file.attrs["version"] = VERSION_NO
                 hdf_file.attrs["last_updated"] = current_time
-        else:
-            with h5py.File(self.file_name, "r") as hdf_file:
-                self.check()
         if is_overwritable:
             is_read_only = False
         self.__is_read_only = is_read_only
         self.__is_overwritable = is_overwritable
+        if not is_new_file:
+            with self.session(mode="r"):
+                self.check()
+
+    @contextlib.contextmanager
+    def session(self, mode: str = None, swmr: bool = False):
+        """Keep the file open while the context is active.
+
+        All reads and writes of HDF_Files with the same file_name in this process
+        use the same handle instead of opening and closing the file each time.
+        Other processes should not write to the file during a session unless swmr is used.
+
+        Args:
+            mode (str): "r" to read or "a" to read and write.
+                Defaults to "a" if this HDF_File is not read-only, else "r".
+            swmr (bool): Open the file in swmr mode. Defaults to False.
+
+        Yields:
+            HDF_File: This HDF_File.
+
+        """
+        if mode is None:
+            mode = "r" if self.is_read_only else "a"
+        HDF_HANDLE_POOL.acquire(self.file_name, mode, swmr)
+        try:
+            yield self
+        finally:
+            HDF_HANDLE_POOL.release(self.file_name)
 
     def __eq__(self, other):
         return self.file_name == other.file_name
@@ -903,6 +1094,158 @@ import pandas as pd
 from fastcore.foundation import patch
 
 
+def encode_strings(value:np.ndarray) -> np.ndarray:
+    """Encode an array of str as fixed-width UTF-8 bytes.
+
+    Fixed-width strings are decoded in bulk when reading, while variable-length strings are decoded one by one.
+
+    Args:
+        value (np.ndarray): An object array.
+
+    Returns:
+        np.ndarray: A bytes array or None if not all elements are str
+            or the longest string is more than twice as long as the average string with its variable-length overhead.
+
+    """
+    if (len(value) == 0) or (pd.api.types.infer_dtype(value, skipna=False) != "string"):
+        return None
+    try:
+        encoded = value.astype(bytes)
+    except UnicodeEncodeError:
+        encoded = np.char.encode(value.astype(str), "utf-8")
+    lengths = np.char.str_len(encoded)
+    if encoded.dtype.itemsize > 2 * (lengths.mean() + 16):
+        return None
+    return encoded
+
+
+def decode_strings(array:np.ndarray) -> np.ndarray:
+    """Decode fixed-width UTF-8 bytes to an object array of str.
+
+    Args:
+        array (np.ndarray): A bytes array, see `encode_strings`.
+
+    Returns:
+        np.ndarray: An object array of str.
+
+    """
+    # tolist() strips the padding, so each element is decoded once without an intermediate fixed-width str array
+    decoded = np.empty(len(array), dtype=object)
+    decoded[:] = list(map(bytes.decode, array.tolist()))
+    return decoded
+
+
+CATEGORICAL_MAX_UNIQUE_FRACTION = 0.5
+
+
+def encode_categories(value) -> tuple:
+    """Encode a pd.Categorical or an array of repeated str as integer codes and categories.
+
+    Args:
+        value (np.ndarray or pd.Categorical): The values of a column.
+
+    Returns:
+        tuple: The codes and the categories as np.ndarrays or None if `value` is neither a pd.Categorical
+            nor an array of str with at most CATEGORICAL_MAX_UNIQUE_FRACTION unique values.
+
+    """
+    if isinstance(value, pd.Categorical):
+        codes = value.codes
+        categories = np.asarray(value.categories)
+    elif (len(value) == 0) or (pd.api.types.infer_dtype(value, skipna=False) != "string"):
+        return None
+    else:
+        codes, categories = pd.factorize(value, sort=True)
+        if len(categories) > CATEGORICAL_MAX_UNIQUE_FRACTION * len(value):
+            return None
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if len(categories) <= np.iinfo(dtype).max:
+            break
+    return codes.astype(dtype), categories
+
+
+def encode_column(value) -> tuple:
+    """Encode a column of a pd.DataFrame for storage in an HDF_File.
+
+    Categoricals and repeated str are stored as codes with a separate dataset of categories,
+    other str as fixed-width UTF-8 bytes if possible.
+
+    Args:
+        value (np.ndarray or pd.Categorical): The values of a column.
+
+    Returns:
+        tuple: The np.ndarray to store, a dict of attrs of the dataset and the categories or None.
+
+    """
+    encoded = encode_categories(value)
+    if encoded is not None:
+        codes, categories = encoded
+        attrs = {
+            "string_encoding": "dictionary",
+            "is_categorical": isinstance(value, pd.Categorical),
+        }
+        if attrs["is_categorical"]:
+            attrs["ordered"] = value.ordered
+        return codes, attrs, categories
+    if value.dtype == np.dtype('O'):
+        encoded = encode_strings(value)
+        if encoded is not None:
+            return encoded, {"string_encoding": "utf-8"}, None
+    return value, {}, None
+
+
+def table_columns(group:h5py.Group) -> list:
+    """List the columns of a pd.DataFrame in an HDF_File.
+
+    Args:
+        group (h5py.Group): The group of the pd.DataFrame.
+
+    Returns:
+        list: The sorted column names, without the `_categories` group of dictionary-encoded columns.
+
+    """
+    return sorted(
+        name for name, item in group.items() if isinstance(item, h5py.Dataset)
+    )
+
+
+def read_column(dataset:h5py.Dataset, dataset_slice:slice=slice(None)):
+    """Read a column of a pd.DataFrame and decode strings.
+
+    Args:
+        dataset (h5py.Dataset): The column.
+        dataset_slice (slice): The rows to read. Defaults to slice(None).
+
+    Returns:
+        np.ndarray or pd.Categorical: The values of the column.
+
+    """
+    if dataset.attrs.get("string_encoding") == "dictionary":
+        codes = dataset[dataset_slice]
+        categories = read_column(
+            dataset.parent["_categories"][os.path.basename(dataset.name)]
+        )
+        if dataset.attrs.get("is_categorical", False):
+            return pd.Categorical.from_codes(
+                codes,
+                categories,
+                ordered=bool(dataset.attrs.get("ordered", False)),
+            )
+        return categories[codes]
+    elif dataset.attrs.get("string_encoding") == "utf-8":
+        return decode_strings(dataset[dataset_slice])
+    elif h5py.check_string_dtype(dataset.dtype) is not None:
+        return dataset.asstr()[dataset_slice]
+    else:
+        array = dataset[dataset_slice]
+        if array.dtype == object:
+            array = np.array(
+                [x if isinstance(x, str) else x.decode('UTF-8') for x in array],
+                dtype=object
+            )
+        return array
+
+
 @patch
 def read(
     self: HDF_File,
@@ -947,7 +1290,7 @@ def read(
         ValueError: When the requested dataset is not a np.ndarray or pd.dataframe.
 
     """
-    with h5py.File(self.file_name, "r", swmr=swmr) as hdf_file:
+    with HDF_HANDLE_POOL.open(self.file_name, "r", swmr=swmr) as hdf_file:
         if group_name is None:
             group = hdf_file
             group_name = "/"
@@ -993,31 +1336,26 @@ def read(
                         return array
                 elif dataset.attrs["is_pd_dataframe"]:
                     if return_dataset_shape:
-                        columns = list(dataset)
+                        columns = table_columns(dataset)
                         return (
                             len(dataset[columns[0]]),
                             len(columns)
                         )
                     elif return_dataset_dtype:
                         return [
-                            dataset[column].dtype for column in sorted(
+                            dataset[column].dtype for column in table_columns(
                                 dataset
                             )
                         ]
                     else:
                         df = pd.DataFrame(
                             {
-                                column: dataset[column][
+                                column: read_column(
+                                    dataset[column],
                                     return_dataset_slice
-                                ] for column in sorted(dataset)
+                                ) for column in table_columns(dataset)
                             }
                         )
-                        # TODO: This assumes any object array is a string array
-                        for column in dataset:
-                            if df[column].dtype == object:
-                                df[column] = df[column].apply(
-                                    lambda x: x if isinstance(x, str) else x.decode('UTF-8')
-                                )
                         return df
                 else:
                     raise ValueError(
@@ -1064,6 +1402,7 @@ def write(
             If the False, ignore the is_overwritable flag of this HDF_File.
             Defaults to None.
         dataset_compression (str): The compression type to use for datasets.
+            If None, the storage policy of this process is used, see `get_dataset_storage`.
             Defaults to None.
         swmr (bool): Open files in swmr mode. Defaults to False.
 
@@ -1079,7 +1418,7 @@ def write(
         )
     if overwrite is None:
         overwrite = self.is_overwritable
-    with h5py.File(self.file_name, "a", swmr=swmr) as hdf_file:
+    with HDF_HANDLE_POOL.open(self.file_name, "a", swmr=swmr) as hdf_file:
 
         if group_name is None:
             group = hdf_file
@@ -1117,6 +1456,8 @@ def write(
                 if dataset_name in group:
                     if overwrite:
                         del group[dataset_name]
+                        if ("_categories" in group) and (dataset_name in group["_categories"]):
+                            del group["_categories"][dataset_name]
                     else:
                         raise ValueError(
                             f"Dataset {dataset_name} already exists in group "
@@ -1124,40 +1465,66 @@ def write(
                         )
                 if isinstance(value, pd.core.frame.DataFrame):
                     new_group_name = f"{group_name}/{dataset_name}"
-                    self.write(
-                        dataset_name,
-                        group_name=group_name,
-                        overwrite=overwrite,
-                    )
-                    self.write(
-                        True,
-                        group_name=new_group_name,
-                        attr_name="is_pd_dataframe",
-                        overwrite=overwrite,
-                    )
-                    for column in value.columns:
+                    with self.session(mode="a"):
+                        self.write(
+                            dataset_name,
+                            group_name=group_name,
+                            overwrite=overwrite,
+                        )
                         self.write(
-                            value[column].values,
+                            True,
                             group_name=new_group_name,
-                            dataset_name=column,
+                            attr_name="is_pd_dataframe",
                             overwrite=overwrite,
-                            dataset_compression=dataset_compression,
                         )
+                        for column in value.columns:
+                            self.write(
+                                value[column].values,
+                                group_name=new_group_name,
+                                dataset_name=column,
+                                overwrite=overwrite,
+                                dataset_compression=dataset_compression,
+                            )
                 else:
-                    dtype = value.dtype
-                    if value.dtype == np.dtype('O'):
-                        dtype = h5py.string_dtype()
-                    try:
-                        hdf_dataset = group.create_dataset(
-                            dataset_name,
-                            data=value,
-                            compression=dataset_compression,
-                            dtype=dtype
+                    is_table = bool(group.attrs.get("is_pd_dataframe", False))
+                    attrs = {}
+                    categories = None
+                    if is_table:
+                        value, attrs, categories = encode_column(value)
+                    datasets = [(group, value, attrs)]
+                    if categories is not None:
+                        categories, categories_attrs, _ = encode_column(categories)
+                        datasets.append(
+                            (
+                                group.require_group("_categories"),
+                                categories,
+                                categories_attrs
+                            )
                         )
-                    except TypeError:
-                        # TODO
-                        # print(f"Cannot save array {value} to HDF, skipping it...")
-                        pass
+                    for parent, data, data_attrs in datasets:
+                        dtype = data.dtype
+                        if data.dtype == np.dtype('O'):
+                            dtype = h5py.string_dtype()
+                        if dataset_compression is None:
+                            storage = get_dataset_storage(
+                                dataset_name,
+                                data,
+                                is_table=is_table,
+                            )
+                        else:
+                            storage = {"compression": dataset_compression}
+                        try:
+                            hdf_dataset = parent.create_dataset(
+                                dataset_name,
+                                data=data,
+                                dtype=dtype,
+                                **storage
+                            )
+                            hdf_dataset.attrs.update(data_attrs)
+                        except TypeError:
+                            # TODO
+                            # print(f"Cannot save array {value} to HDF, skipping it...")
+                            pass
             else:
                 try:
                     dataset = group[dataset_name]
@@ -1178,12 +1545,109 @@ def write(
                     dataset.attrs[attr_name] = str(value) # e.g. dicts
         hdf_file.attrs["last_updated"] = time.asctime()
 
-# %% ../nbs/02_io.ipynb 49
+# %% ../nbs/02_io.ipynb 47
+# Datasets larger than this are stored in chunks of about this size
+STORAGE_CHUNK_BYTES = 1024**2
+
+STORAGE_DATASET_CLASSES = {
+    "mass_list_ms1": "peaks",
+    "int_list_ms1": "peaks",
+    "mass_list_ms2": "peaks",
+    "int_list_ms2": "peaks",
+    "corrected_fragment_mzs": "peaks",
+    "fragmasses": "fragments",
+    "fragtypes": "fragments",
+    "residues": "fragments",
+}
+
+# Codec and options per dataset class
+STORAGE_POLICIES = {
+    "none": {},
+    "balanced": {
+        "tables": ("lzf", None),
+    },
+    "lzf": {
+        "peaks": ("lzf", None),
+        "fragments": ("lzf", None),
+        "tables": ("lzf", None),
+        "index": ("lzf", None),
+    },
+    "gzip": {
+        "peaks": ("gzip", 4),
+        "fragments": ("gzip", 4),
+        "tables": ("gzip", 4),
+        "index": ("gzip", 4),
+    },
+}
+
+STORAGE_POLICY = "balanced"
+
+
+def set_storage_policy(policy:str):
+    """Set the storage policy of this process.
+
+    Args:
+        policy (str): The name of a policy in STORAGE_POLICIES.
+
+    Raises:
+        KeyError: When the policy does not exist.
+
+    """
+    global STORAGE_POLICY
+    if policy not in STORAGE_POLICIES:
+        raise KeyError(f"Storage policy {policy} does not exist, use one of {list(STORAGE_POLICIES)}.")
+    STORAGE_POLICY = policy
+
+
+def get_dataset_storage(
+    dataset_name:str,
+    value:np.ndarray,
+    is_table:bool=False,
+    resizable:bool=False,
+    policy:str=None,
+) -> dict:
+    """Get the chunk and compression arguments of h5py's create_dataset for a dataset.
+
+    Args:
+        dataset_name (str): The name of the dataset.
+        value (np.ndarray): The data or an empty array of the same dtype for resizable datasets.
+        is_table (bool): If True, the dataset is a column of a pd.DataFrame. Defaults to False.
+        resizable (bool): If True, the dataset is chunked even if it is small. Defaults to False.
+        policy (str): The storage policy. Defaults to the policy of this process.
+
+    Returns:
+        dict: The keyword arguments for create_dataset.
+
+    """
+    if policy is None:
+        policy = STORAGE_POLICY
+    if dataset_name in STORAGE_DATASET_CLASSES:
+        dataset_class = STORAGE_DATASET_CLASSES[dataset_name]
+    elif is_table:
+        dataset_class = "tables"
+    else:
+        dataset_class = "index"
+    row_bytes = max(value.dtype.itemsize * int(np.prod(value.shape[1:])), 1)
+    chunk_rows = max(STORAGE_CHUNK_BYTES // row_bytes, 1)
+    if value.dtype == np.dtype('O'):
+        return {"chunks": True} if resizable else {}
+    if not (resizable or (len(value) > chunk_rows)):
+        return {}
+    storage = {"chunks": (chunk_rows,) + value.shape[1:]}
+    if dataset_class in STORAGE_POLICIES[policy]:
+        compression, compression_opts = STORAGE_POLICIES[policy][dataset_class]
+        storage["compression"] = compression
+        storage["compression_opts"] = compression_opts
+        storage["shuffle"] = True
+    return storage
+
+
+# %% ../nbs/02_io.ipynb 53
 class MS_Data_File(HDF_File):
     """ A class to store and retrieve on-disk MS data with an HDF container."""
     pass
 
-# %% ../nbs/02_io.ipynb 51
+# %% ../nbs/02_io.ipynb 55
 @patch
 def import_raw_DDA_data(
     self:MS_Data_File,
@@ -1309,72 +1773,160 @@ def _save_DDA_query_data(
 ):
 #     if vendor == "Bruker":
 #         raise NotImplementedError("Unclear what are ms1 and ms2 attributes for bruker")
-    if "Raw" not in self.read():
-        self.write("Raw")
-    self.write(vendor, group_name="Raw", attr_name="vendor")
-    self.write(acquisition_date_time, group_name="Raw", attr_name="acquisition_date_time")
-    if "MS1_scans" not in self.read(group_name="Raw"):
-        self.write("MS1_scans", group_name="Raw")
-    if "MS2_scans" not in self.read(group_name="Raw"):
-        self.write("MS2_scans", group_name="Raw")
-    for key, value in query_data.items():
-        if key.endswith("1"):
-#             TODO: Weak check for ms2, imporve to _ms1 if consistency in naming is guaranteed
-            if key == "mass_list_ms1":
-                indices = np.zeros(len(value) + 1, np.int64)
-                indices[1:] = [len(i) for i in value]
-                indices = np.cumsum(indices)
+    with self.session():
+        if "Raw" not in self.read():
+            self.write("Raw")
+        self.write(vendor, group_name="Raw", attr_name="vendor")
+        self.write(acquisition_date_time, group_name="Raw", attr_name="acquisition_date_time")
+        if "MS1_scans" not in self.read(group_name="Raw"):
+            self.write("MS1_scans", group_name="Raw")
+        if "MS2_scans" not in self.read(group_name="Raw"):
+            self.write("MS2_scans", group_name="Raw")
+        for key, value in query_data.items():
+            if key.endswith("1"):
+    #             TODO: Weak check for ms2, imporve to _ms1 if consistency in naming is guaranteed
+                if key == "mass_list_ms1":
+                    indices = np.zeros(len(value) + 1, np.int64)
+                    indices[1:] = [len(i) for i in value]
+                    indices = np.cumsum(indices)
+                    self.write(
+                        indices,
+                        dataset_name="indices_ms1",
+                        group_name=f"Raw/MS1_scans"
+                    )
+                    value = np.concatenate(value)
+                elif key == "int_list_ms1":
+                    value = np.concatenate(value)
                 self.write(
-                    indices,
-                    dataset_name="indices_ms1",
+                    value,
+    #                 TODO: key should be trimmed: xxx_ms1 should just be e.g. xxx
+                    dataset_name=key,
                     group_name=f"Raw/MS1_scans"
                 )
-                value = np.concatenate(value)
-            elif key == "int_list_ms1":
-                value = np.concatenate(value)
-            self.write(
-                value,
-#                 TODO: key should be trimmed: xxx_ms1 should just be e.g. xxx
-                dataset_name=key,
-                group_name=f"Raw/MS1_scans"
-            )
-        elif key.endswith("2"):
-#             TODO: Weak check for ms2, imporve to _ms2 if consistency in naming is guaranteed
-            if key == "mass_list_ms2":
-                indices = np.zeros(len(value) + 1, np.int64)
-                indices[1:] = [len(i) for i in value]
-                indices = np.cumsum(indices)
+            elif key.endswith("2"):
+    #             TODO: Weak check for ms2, imporve to _ms2 if consistency in naming is guaranteed
+                if key == "mass_list_ms2":
+                    indices = np.zeros(len(value) + 1, np.int64)
+                    indices[1:] = [len(i) for i in value]
+                    indices = np.cumsum(indices)
+                    self.write(
+                        indices,
+                        dataset_name="indices_ms2",
+                        group_name=f"Raw/MS2_scans"
+                    )
+                    value = np.concatenate(value)
+                elif key == "int_list_ms2":
+                    value = np.concatenate(value)
+                elif key == "alphatims_spectrum_indptr_ms2":
+                    key = "indices_ms2"
+                elif key == "alphatims_spectrum_mz_values_ms2":
+                    key = "mass_list_ms2"
+                elif key == "alphatims_spectrum_intensity_values_ms2":
+                    key = "int_list_ms2"
                 self.write(
-                    indices,
-                    dataset_name="indices_ms2",
+                    value,
+    #                 TODO: key should be trimmed: xxx_ms2 should just be e.g. xxx
+                    dataset_name=key,
                     group_name=f"Raw/MS2_scans"
                 )
-                value = np.concatenate(value)
-            elif key == "int_list_ms2":
-                value = np.concatenate(value)
-            elif key == "alphatims_spectrum_indptr_ms2":
-                key = "indices_ms2"
-            elif key == "alphatims_spectrum_mz_values_ms2":
-                key = "mass_list_ms2"
-            elif key == "alphatims_spectrum_intensity_values_ms2":
-                key = "int_list_ms2"
-            self.write(
-                value,
-#                 TODO: key should be trimmed: xxx_ms2 should just be e.g. xxx
-                dataset_name=key,
-                group_name=f"Raw/MS2_scans"
-            )
-        else:
-            raise KeyError("Unspecified scan type")
+            else:
+                raise KeyError("Unspecified scan type")
     return
 
-# %% ../nbs/02_io.ipynb 55
+# %% ../nbs/02_io.ipynb 59
+import collections.abc
+
+
+class DDA_Query_Data(collections.abc.MutableMapping):
+    """A query_dict that reads the datasets of an MS_Data_File on first access.
+
+    Keys are the datasets of `Raw/MS1_scans` and `Raw/MS2_scans` and can be used as
+    the dictionary returned by `read_DDA_query_data`. Loaded and assigned values are kept in memory.
+
+    Args:
+        ms_file (MS_Data_File): The ms_data file to read from.
+        swmr (bool): Open the file in swmr mode. Defaults to False.
+        calibrated_fragments (bool): If True, mass_list_ms2 is corrected with the corrected_fragment_mzs of the file.
+            Defaults to False.
+
+    """
+
+    def __init__(self, ms_file, swmr:bool=False, calibrated_fragments:bool=False):
+        self.ms_file = ms_file
+        self.swmr = swmr
+        self.calibrated_fragments = calibrated_fragments
+        self.loaded = {}
+        self.groups = {}
+        with ms_file.session(mode="r", swmr=swmr):
+            for group_name in ["Raw/MS1_scans", "Raw/MS2_scans"]:
+                for dataset_name in ms_file.read(group_name=group_name, swmr=swmr):
+                    self.groups[dataset_name] = group_name
+            self.aliases = {}
+            if ms_file.read(attr_name="vendor", group_name="Raw", swmr=swmr) == "Bruker":
+                self.aliases = {"mobility": "mobility2", "prec_id": "prec_id2"}
+
+    def load(self, keys:list):
+        """Read several datasets with a single file handle.
+
+        Args:
+            keys (list): The keys to load.
+
+        """
+        with self.ms_file.session(mode="r", swmr=self.swmr):
+            for key in keys:
+                self[key]
+
+    def __getitem__(self, key:str):
+        if key not in self.loaded:
+            if key in self.aliases:
+                self.loaded[key] = self[self.aliases[key]]
+            elif key in self.groups:
+                value = self.ms_file.read(
+                    dataset_name=key,
+                    group_name=self.groups[key],
+                    swmr=self.swmr,
+                )
+                if (key == "mass_list_ms2") and self.calibrated_fragments:
+                    value = value * (
+                        1 - self.ms_file.read(
+                            dataset_name="corrected_fragment_mzs", swmr=self.swmr
+                        ) / 10**6
+                    )
+                self.loaded[key] = value
+            else:
+                raise KeyError(key)
+        return self.loaded[key]
+
+    def __setitem__(self, key:str, value):
+        self.loaded[key] = value
+
+    def __delitem__(self, key:str):
+        if key in self.loaded:
+            del self.loaded[key]
+        self.groups.pop(key, None)
+        self.aliases.pop(key, None)
+
+    def __contains__(self, key):
+        return (key in self.loaded) or (key in self.groups) or (key in self.aliases)
+
+    def __iter__(self):
+        return iter(dict.fromkeys([*self.groups, *self.aliases, *self.loaded]))
+
+    def __len__(self):
+        return len(set(self.groups) | set(self.aliases) | set(self.loaded))
+
+    def __repr__(self):
+        return f"<DDA_Query_Data {self.ms_file.file_name} loaded={sorted(self.loaded)}>"
+
+
 @patch
 def read_DDA_query_data(
     self:MS_Data_File,
     calibrated_fragments:bool=False,
     force_recalibrate:bool=False,
     swmr:bool=False,
+    fields:list=None,
+    lazy:bool=False,
     **kwargs
 ) -> dict:
     """Read query data from this ms_data object and return it as a query_dict.
@@ -1387,65 +1939,35 @@ def read_DDA_query_data(
             recalibrate mzs values even if a recalibration is already provided.
             Defaults to False.
         swmr (bool): Open the file in swmr mode. Defaults to False.
+        fields (list): Only read these datasets, e.g. to skip the MS1 data.
+            If None, all datasets are read unless `lazy` is True. Defaults to None.
+        lazy (bool): If True, return a `DDA_Query_Data` that reads datasets on first access.
+            Datasets in `fields` are read directly. Defaults to False.
         **kwargs (type): Can contain a database file name that was used for recalibration.
 
     Returns:
         dict: A query_dict with data for MS1 and MS2 scans.
 
     """
-    query_data = {}
-    for dataset_name in self.read(group_name="Raw/MS1_scans"):
-        values = self.read(
-            dataset_name=dataset_name,
-            group_name="Raw/MS1_scans",
-            swmr=swmr,
-        )
-        query_data[dataset_name] = values
-    for dataset_name in self.read(group_name="Raw/MS2_scans"):
-        values = self.read(
-            dataset_name=dataset_name,
-            group_name="Raw/MS2_scans",
-            swmr=swmr
-        )
-        query_data[dataset_name] = values
-#     indices_ms1 = query_data["indices_ms1"]
-#     mz_ms1 = query_data["mass_list_ms1"]
-#     query_data["mass_list_ms1"] = np.array(
-#         [mz_ms1[s:e] for s,e in zip(indices_ms1[:-1], indices_ms1[1:])]
-#     )
-#     int_ms1 = query_data["int_list_ms1"]
-#     query_data["int_list_ms1"] = np.array(
-#         [int_ms1[s:e] for s,e in zip(indices_ms1[:-1], indices_ms1[1:])]
-#     )
-    indices_ms2 = query_data["indices_ms2"]
-#     mz_ms2 = query_data["mass_list_ms2"]
-#     query_data["mass_list_ms2"] = np.array(
-#         [mz_ms2[s:e] for s,e in zip(indices_ms2[:-1], indices_ms2[1:])]
-#     )
-#     int_ms2 = query_data["int_list_ms2"]
-#     query_data["int_list_ms2"] = np.array(
-#         [int_ms2[s:e] for s,e in zip(indices_ms2[:-1], indices_ms2[1:])]
-#     )
-    if self.read(attr_name="vendor", group_name="Raw") == "Bruker":
-        query_data["mobility"] = query_data["mobility2"]
-        query_data["prec_id"] = query_data["prec_id2"]
     if calibrated_fragments:
-        if ("corrected_fragment_mzs" not in self.read()) or force_recalibrate:
-#         if True:
+        if ("corrected_fragment_mzs" not in self.read(swmr=swmr)) or force_recalibrate:
             logging.info("Calibrating fragments")
             import alphapept.recalibration
             alphapept.recalibration.calibrate_fragments(
                 kwargs["database_file_name"],
                 self.file_name,
             )
-        query_data["mass_list_ms2"] *= (
-            1 - self.read(
-                dataset_name="corrected_fragment_mzs", swmr=swmr
-            ) / 10**6
-        )
+    query_data = DDA_Query_Data(self, swmr=swmr, calibrated_fragments=calibrated_fragments)
+    if fields is None and not lazy:
+        fields = list(query_data)
+    if fields is not None:
+        query_data.load(fields)
+    if not lazy:
+        query_data = {key: query_data[key] for key in fields}
     return query_data
 
-# %% ../nbs/02_io.ipynb 58
+
+# %% ../nbs/02_io.ipynb 63
 def raw_conversion(
     to_process: dict,
     callback: callable = None,
@@ -1488,4 +2010,3 @@ def raw_conversion(
         logging.error(f'File conversion of file {file_name} failed. Exception {e}')
         return f"{e}" #Can't return exception object, cast as string
     return True
-
@@ -60,7 +60,7 @@ def search_label_on_ms_file(file_name:str, label:NamedTuple, reporter_frag_tol:f
     label_intensities = np.zeros((len(df), len(label.channels)))
     off_masses = np.zeros((len(df), len(label.channels)))
     labeled = df['sequence'].str.startswith(label.mod_name).values
-    query_data = ms_file.read_DDA_query_data()
+    query_data = ms_file.read_DDA_query_data(fields=["indices_ms2", "mass_list_ms2", "int_list_ms2"])
 
     query_indices = query_data["indices_ms2"]
     query_frags = query_data['mass_list_ms2']
@@ -179,7 +179,7 @@ def calculate_deltas(combos: list, calib:bool = False, callback:Callable=None) -
 
                 # dropping all unnecessary columns to save memory
                 df.drop(columns=columns_to_drop, inplace=True)
-                df_mean = df.groupby('precursor').mean()  # index is "precursor" now
+                df_mean = df.groupby('precursor', observed=True).mean()  # index is "precursor" now
                 df_cache[filename] = df_mean
 
                 cache_size_in_kbytes += sys.getsizeof(df_mean)/1024
@@ -359,7 +359,7 @@ def get_probability(df: pd.DataFrame, ref: pd.DataFrame, sigma:pd.DataFrame, ind
 
 # %% ../nbs/09_matching.ipynb 17
 from sklearn.neighbors import KDTree
-from .utils import assemble_df
+from .utils import assemble_df, categorize_columns
 
 def convert_decoy(float_):
     """
@@ -426,14 +426,14 @@ def match_datasets(settings:dict, callback:Callable = None):
             logging.info(f'Matching from {files_from} to {files_to}.')
 
             if len(files_from) > 2:
-                xx = x[x['shortname'].apply(lambda x: x in files_from)].copy()
+                xx = x[x['shortname'].isin(files_from)].copy()
 
-                grouped = xx[base_col + alignment_cols + extra_cols].groupby('precursor').mean()
+                grouped = xx[base_col + alignment_cols + extra_cols].groupby('precursor', observed=True).mean()
 
                 grouped['decoy'] = grouped['decoy'].apply(lambda x: convert_decoy(x))
                 grouped['target'] = grouped['target'].apply(lambda x: convert_decoy(x))
 
-                std_ = xx[base_col + alignment_cols].groupby('precursor').std()
+                std_ = xx[base_col + alignment_cols].groupby('precursor', observed=True).std()
 
                 grouped[[_+'_std' for _ in alignment_cols]] = std_
 
@@ -506,7 +506,7 @@ def match_datasets(settings:dict, callback:Callable = None):
 
                     shared_columns = list(set(matched.columns).intersection(set(df.columns)))
 
-                    df_ = pd.concat([df, matched[shared_columns]], ignore_index=True)
+                    df_ = categorize_columns(pd.concat([df, matched[shared_columns]], ignore_index=True))
 
                     logging.info(f"Saving {file} - peptide_fdr.")
                     ms_file = alphapept.io.MS_Data_File(file, is_overwritable=True)
@@ -10,6 +10,7 @@ QUEUE_PATH = os.path.join(HOME, ".alphapept", "queue")
 PROCESSED_PATH = os.path.join(HOME, ".alphapept", "finished")
 FAILED_PATH = os.path.join(HOME, ".alphapept", "failed")
 FASTA_PATH = os.path.join(HOME, ".alphapept", "fasta")
+DATABASE_CACHE_PATH = os.path.join(HOME, ".alphapept", "database_cache")
 
 DEFAULT_SETTINGS_PATH = os.path.join(AP_PATH, 'default_settings.yaml')
 SETTINGS_TEMPLATE_PATH = os.path.join(AP_PATH, 'settings_template.yaml')
@@ -19,7 +20,7 @@ PLOT_SETTINGS = os.path.join(AP_PATH, 'custom_plots.yaml')
 PROCESS_FILE = os.path.join(QUEUE_PATH, 'process')
 FILE_WATCHER_FILE = os.path.join(QUEUE_PATH, 'file_watcher')
 
-for folder in [AP_PATH, QUEUE_PATH, PROCESSED_PATH, FAILED_PATH, FASTA_PATH]:
+for folder in [AP_PATH, QUEUE_PATH, PROCESSED_PATH, FAILED_PATH, FASTA_PATH, DATABASE_CACHE_PATH]:
     if not os.path.isdir(folder):
         os.mkdir(folder)
 
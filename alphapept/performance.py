@@ -226,6 +226,7 @@ def performance_function(
     If an iterable is provided to the decorated function,
     the original (compiled) function will be applied to all elements of this iterable.
     The most efficient way to provide iterables are with ranges, but numpy arrays work as well.
+    A list of ranges or numpy arrays is treated as tiles, which are handed out dynamically to the workers.
     Functions can not return values,
     results should be stored in buffer arrays inside thge function instead.
 
@@ -273,6 +274,34 @@ def performance_function(
                 for index in iterable:
                     compiled_function(index, *func_args)
         _parallel_numba = numba.njit(nogil=True)(_parallel_python)
+        def _parallel_tiles(parallel_function, compiled_function, tiles, selected_compilation_mode, selected_worker_count, *func_args):
+            next_tile = [0]
+            lock = threading.Lock()
+            def _worker():
+                while True:
+                    with lock:
+                        tile_id = next_tile[0]
+                        next_tile[0] += 1
+                    if tile_id >= len(tiles):
+                        break
+                    tile = tiles[tile_id]
+                    tile_is_range = isinstance(tile, range)
+                    parallel_function(
+                        compiled_function,
+                        np.empty(0, dtype=np.int64) if tile_is_range else tile,
+                        tile.start if tile_is_range else -1,
+                        tile.stop if tile_is_range else -1,
+                        tile.step if tile_is_range else -1,
+                        *func_args
+                    )
+            if (selected_compilation_mode in ["python", "numba"]) or (selected_worker_count == 1):
+                _worker()
+            else:
+                workers = [threading.Thread(target=_worker) for _ in range(min(selected_worker_count, len(tiles)))]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
         def _parallel_cuda(compiled_function, iterable, *func_args):
             cuda_func_dict = {"cuda": cuda, "compiled_function": compiled_function}
             # Cuda functions cannot handle tuple unpacking but need a fixed number of arguments.
@@ -316,11 +345,17 @@ def performance_function(
                 iter(iterable)
             except TypeError:
                 iterable = np.array([iterable])
+            if isinstance(iterable, list) and (len(iterable) > 0) and all(isinstance(tile, (range, np.ndarray)) for tile in iterable):
+                tiles = iterable
+            else:
+                tiles = None
             if worker_count is None:
                 selected_worker_count = MAX_WORKER_COUNT
             else:
                 selected_worker_count = worker_count
             if selected_compilation_mode == "cuda":
+                if tiles is not None:
+                    iterable = np.concatenate([np.arange(tile.start, tile.stop, tile.step) if isinstance(tile, range) else tile for tile in tiles])
                 _parallel_cuda(_compiled_function, iterable, *func_args)
             else:
                 if "python" in selected_compilation_mode:
@@ -332,7 +367,9 @@ def performance_function(
                         f"Compilation mode {selected_compilation_mode} is not valid. "
                         "This error should not be possible, something is seriously wrong!!!"
                     )
-                if (selected_compilation_mode in ["python", "numba"]) or (selected_worker_count == 1):
+                if tiles is not None:
+                    _parallel_tiles(parallel_function, _compiled_function, tiles, selected_compilation_mode, selected_worker_count, *func_args)
+                elif (selected_compilation_mode in ["python", "numba"]) or (selected_worker_count == 1):
                     iterable_is_range = isinstance(iterable, range)
                     x = np.empty(0, dtype=np.int64) if iterable_is_range else iterable
                     parallel_function(
@@ -370,15 +407,17 @@ def performance_function(
     else:
         return _decorated_function(_func)
 
-# %% ../nbs/12_performance.ipynb 19
+# %% ../nbs/12_performance.ipynb 21
 from multiprocessing import Pool
 
-def AlphaPool(process_count: int) -> multiprocessing.Pool:
+def AlphaPool(process_count: int, initializer: callable = None, initargs: tuple = ()) -> multiprocessing.Pool:
     """Create a multiprocessing.Pool object.
 
     Args:
         process_count (int): The number of processes.
             If larger than available cores, it is trimmed to the available maximum.
+        initializer (callable): A function that is called with initargs when a worker starts. Defaults to None.
+        initargs (tuple): The arguments of initializer. Defaults to ().
 
 
     Returns:
@@ -392,4 +431,4 @@ def AlphaPool(process_count: int) -> multiprocessing.Pool:
         new_max = 1
     logging.info(f"AlphaPool was set to {process_count} processes. Setting max to {new_max}.")
 
-    return Pool(new_max)
+    return Pool(new_max, initializer=initializer, initargs=initargs)
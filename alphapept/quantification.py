@@ -197,7 +197,7 @@ def delayed_normalization(df: pd.DataFrame, field: str='ms1_int_sum', minimum_oc
     
     n_fractions = len(fractions)
 
-    df_max = df.groupby(['precursor','fraction','sample_group'])[field].max() #Maximum per fraction
+    df_max = df.groupby(['precursor','fraction','sample_group'], observed=True)[field].max() #Maximum per fraction
 
     prec_count = df_max.index.get_level_values('precursor').value_counts()
 
@@ -518,7 +518,7 @@ def protein_profile_parallel(df: pd.DataFrame, minimum_ratios: int, field: str,
     protein_table = pd.DataFrame(index=unique_proteins, columns=columnes_ext + samples)
 
     # Used to be max, now sum() (to group fractions)
-    grouped = df[[field, 'sample_group','precursor','protein_group']].groupby(['protein_group','sample_group','precursor']).sum()
+    grouped = df[[field, 'sample_group','precursor','protein_group']].groupby(['protein_group','sample_group','precursor'], observed=True).sum()
     
     
     results = []
@@ -557,7 +557,7 @@ def protein_profile_parallel(df: pd.DataFrame, minimum_ratios: int, field: str,
         protein_table[protein_table == 0] = np.nan
         protein_table = protein_table.astype('float')
     else:
-        protein_table = df.groupby(['protein_group'])[field].sum().to_frame().reset_index()
+        protein_table = df.groupby(['protein_group'], observed=True)[field].sum().to_frame().reset_index()
         protein_table = protein_table.set_index('protein_group')
         protein_table.index.name = None
         protein_table.columns=[samples[0]] 
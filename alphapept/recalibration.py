@@ -408,9 +408,10 @@ def calibrate_fragments_nn(ms_file_, file_name, settings):
 
             #Read required datasets
 
-            rt_list_ms2 = ms_file_.read_DDA_query_data()['rt_list_ms2']
-            mass_list_ms2 = ms_file_.read_DDA_query_data()['mass_list_ms2']
-            incides_ms2 = ms_file_.read_DDA_query_data()['indices_ms2']
+            query_data = ms_file_.read_DDA_query_data(fields=['rt_list_ms2', 'mass_list_ms2', 'indices_ms2'])
+            rt_list_ms2 = query_data['rt_list_ms2']
+            mass_list_ms2 = query_data['mass_list_ms2']
+            incides_ms2 = query_data['indices_ms2']
             scan_idx = np.searchsorted(incides_ms2, np.arange(len(mass_list_ms2)), side='right') - 1
 
             #Estimate offset
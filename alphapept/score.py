@@ -208,12 +208,12 @@ def cut_global_fdr(data: pd.DataFrame, analyte_level: str='sequence', fdr_level:
     """
     logging.info('Global FDR on {}'.format(analyte_level))
     data_sub = data[[analyte_level,'score','decoy']]
-    data_sub_unique = data_sub.groupby([analyte_level,'decoy'], as_index=False).agg({"score": "max"})
+    data_sub_unique = data_sub.groupby([analyte_level,'decoy'], as_index=False, observed=True).agg({"score": "max"})
 
     analyte_levels = ['precursor', 'sequence', 'protein_group','protein']
 
     if analyte_level in analyte_levels:
-        agg_score = data_sub_unique.groupby([analyte_level,'decoy'])['score'].max().reset_index()
+        agg_score = data_sub_unique.groupby([analyte_level,'decoy'], observed=True)['score'].max().reset_index()
     else:
         raise Exception('analyte_level should be either sequence or protein. The selected analyte_level was: {}'.format(analyte_level))
 
@@ -631,8 +631,9 @@ def filter_with_ML(df: pd.DataFrame,
 
 # %% ../nbs/06_score.ipynb 50
 import networkx as nx
+from .fasta import PeptideMap
 
-def assign_proteins(data: pd.DataFrame, pept_dict: dict) -> (pd.DataFrame, dict):
+def assign_proteins(data: pd.DataFrame, pept_dict: PeptideMap) -> (pd.DataFrame, dict):
     """
     Assign psms to proteins. 
     This function appends the dataframe with a column 'n_possible_proteins' which indicates how many proteins a psm could be matched to.
@@ -640,7 +641,7 @@ def assign_proteins(data: pd.DataFrame, pept_dict: dict) -> (pd.DataFrame, dict)
     
     Args:
         data (pd.DataFrame): psms table of scored and filtered search results from alphapept.
-        pept_dict (dict): dictionary that matches peptide sequences to proteins
+        pept_dict (PeptideMap): maps peptide sequences to proteins. A peptide dict is converted.
 
     Returns:
         pd.DataFrame: psms table of search results from alphapept appended with the number of matched proteins. 
@@ -650,34 +651,33 @@ def assign_proteins(data: pd.DataFrame, pept_dict: dict) -> (pd.DataFrame, dict)
     
     data = data.reset_index(drop=True)
     
-    data['n_possible_proteins'] = data['sequence'].apply(lambda x: len(pept_dict[x]))
+    if isinstance(pept_dict, dict):
+        pept_dict = PeptideMap.from_dict(pept_dict)
+
+    pept_idx = pept_dict.get_idx(data['sequence'].values, missing_ok=False)
+    data['n_possible_proteins'] = pept_dict.get_n_proteins(idx=pept_idx)
     unique_peptides = (data['n_possible_proteins'] == 1).sum()
     shared_peptides = (data['n_possible_proteins'] > 1).sum()
 
     logging.info(f'A total of {unique_peptides:,} unique and {shared_peptides:,} shared peptides.')
     
-    sub = data[data['n_possible_proteins']==1]
-    psms_to_protein = sub['sequence'].apply(lambda x: pept_dict[x])
-
-    found_proteins = {}
-    for idx, _ in enumerate(psms_to_protein):
-        idx_ = psms_to_protein.index[idx]
-        p_str = 'p' + str(_[0])
-        if p_str in found_proteins:
-            found_proteins[p_str] = found_proteins[p_str] + [str(idx_)]
-        else:
-            found_proteins[p_str] = [str(idx_)] 
+    unique = np.flatnonzero(data['n_possible_proteins'].values == 1)
+    psms_to_protein = pept_dict.protein_indices[pept_dict.protein_indptr[pept_idx[unique]]]
+
+    found_proteins = {
+        'p' + str(protein): psms.tolist() for protein, psms in pd.Series(unique.astype(str)).groupby(psms_to_protein, sort=False)
+    }
     
     return data, found_proteins
 
-def get_shared_proteins(data: pd.DataFrame, found_proteins: dict, pept_dict: dict) -> dict:
+def get_shared_proteins(data: pd.DataFrame, found_proteins: dict, pept_dict: PeptideMap) -> dict:
     """
     Assign peptides to razor proteins. 
     
     Args:
         data (pd.DataFrame): psms table of scored and filtered search results from alphapept, appended with `n_possible_proteins`.
         found_proteins (dict): dictionary mapping psms indices to proteins
-        pept_dict (dict): dictionary mapping peptide indices to the originating proteins as a list
+        pept_dict (PeptideMap): maps peptide sequences to the originating proteins. A peptide dict is converted.
 
     Returns:
         dict: dictionary mapping peptides to razor proteins
@@ -686,15 +686,16 @@ def get_shared_proteins(data: pd.DataFrame, found_proteins: dict, pept_dict: dic
     
     G = nx.Graph()
 
+    if isinstance(pept_dict, dict):
+        pept_dict = PeptideMap.from_dict(pept_dict)
+
     sub = data[data['n_possible_proteins']>1]
 
-    for i in range(len(sub)):
-        seq, score = sub.iloc[i][['sequence','score']]
-        idx = sub.index[i]
-        possible_proteins = pept_dict[seq]
+    positions, possible_proteins = pept_dict.get_protein_pairs(sub['sequence'].values)
+    psms = sub.index.values.astype(str)[positions]
+    scores = sub['score'].values[positions]
 
-        for p in possible_proteins:
-            G.add_edge(str(idx), 'p'+str(p), score=score)
+    G.add_edges_from((psm, 'p'+str(p), {'score': score}) for psm, p, score in zip(psms, possible_proteins, scores))
             
     connected_groups = np.array([list(c) for c in sorted(nx.connected_components(G), key=len, reverse=True)], dtype=object)
     n_groups = len(connected_groups)
@@ -759,7 +760,7 @@ def get_shared_proteins(data: pd.DataFrame, found_proteins: dict, pept_dict: dic
 
 
 
-def get_protein_groups(data: pd.DataFrame, pept_dict: dict, fasta_dict: dict, decoy = False, callback = None, **kwargs) -> pd.DataFrame:
+def get_protein_groups(data: pd.DataFrame, pept_dict: PeptideMap, fasta_dict: dict, decoy = False, callback = None, **kwargs) -> pd.DataFrame:
     """
     Function to perform protein grouping by razor approach.
     This function calls `assign_proteins` and `get_shared_proteins`.
@@ -768,7 +769,7 @@ def get_protein_groups(data: pd.DataFrame, pept_dict: dict, fasta_dict: dict, de
  
     Args:
         data (pd.DataFrame): psms table of scored and filtered search results from alphapept.
-        pept_dict (dict): A dictionary mapping peptide indices to the originating proteins as a list.
+        pept_dict (PeptideMap): Maps peptide sequences to the originating proteins. A peptide dict is converted.
         fasta_dict (dict): A dictionary with fasta sequences.
         decoy (bool, optional): Defaults to False.
         callback (bool, optional): Defaults to None.
@@ -776,6 +777,9 @@ def get_protein_groups(data: pd.DataFrame, pept_dict: dict, fasta_dict: dict, de
     Returns:
         pd.DataFrame: alphapept results table now including protein level information.
     """
+    if isinstance(pept_dict, dict):
+        pept_dict = PeptideMap.from_dict(pept_dict)
+
     data, found_proteins = assign_proteins(data, pept_dict)
     found_proteins_razor = get_shared_proteins(data, found_proteins, pept_dict)
 
@@ -828,20 +832,20 @@ def get_protein_groups(data: pd.DataFrame, pept_dict: dict, fasta_dict: dict, de
 
     return report
 
-def perform_protein_grouping(data: pd.DataFrame, pept_dict: dict, fasta_dict: dict, **kwargs) -> pd.DataFrame:
+def perform_protein_grouping(data: pd.DataFrame, pept_dict: PeptideMap, fasta_dict: dict, **kwargs) -> pd.DataFrame:
     """
     Wrapper function to perform protein grouping by razor approach
     
     Args:
         data (pd.DataFrame): psms table of scored and filtered search results from alphapept.
-        pept_dict (dict): A dictionary mapping peptide indices to the originating proteins as a list.
+        pept_dict (PeptideMap): Maps peptide sequences to the originating proteins.
         fasta_dict (dict): A dictionary with fasta sequences.
 
     Returns:
         pd.DataFrame: alphapept results table now including protein level information.
     """
     data_sub = data[['sequence','score','decoy']]
-    data_sub_unique = data_sub.groupby(['sequence','decoy'], as_index=False).agg({"score": "max"})
+    data_sub_unique = data_sub.groupby(['sequence','decoy'], as_index=False, observed=True).agg({"score": "max"})
 
     targets = data_sub_unique[data_sub_unique.decoy == False]
     targets = targets.reset_index(drop=True)
@@ -919,6 +923,7 @@ def ecdf(data:np.ndarray)-> (np.ndarray, np.ndarray):
 
 # %% ../nbs/06_score.ipynb 58
 import os
+import alphapept.utils
 from multiprocessing import Pool
 from scipy.interpolate import interp1d
 from typing import Callable, Union
@@ -1040,7 +1045,8 @@ def score_hdf(to_process: tuple, callback: Callable = None, parallel: bool=False
             except KeyError:
                 logging.info('No fragment_ions present.')
                     
-            export_df = df.reset_index(drop=True)
+            # Repeated str such as sequences and proteins are stored as categoricals
+            export_df = alphapept.utils.categorize_columns(df.reset_index(drop=True))
             
             #if 'level_0' in export_df.keys(): #Todo: Why is this in here?
             #    export_df.drop(columns=['level_0'])
@@ -1060,20 +1066,20 @@ def score_hdf(to_process: tuple, callback: Callable = None, parallel: bool=False
 import alphapept.utils
 
 #This function has no unit test and is covered by the quick_test    
-def protein_grouping_all(settings:dict, pept_dict:dict, fasta_dict:dict, callback=None):
+def protein_grouping_all(settings:dict, pept_dict:PeptideMap, fasta_dict:dict, callback=None):
     """Apply protein grouping on all files in an experiment.
     This function will load all dataframes (peptide_fdr level) and perform protein grouping.
     
     Args:
         settings: (dict): Settings file for the experiment
-        pept_dict: (dict): A peptide dictionary.
+        pept_dict: (PeptideMap): A peptide map.
         fast_dict: (dict): A FASTA dictionary.
         callback: (Callable): Optional callback. 
     """
     
     df = alphapept.utils.assemble_df(settings, field = 'peptide_fdr', callback=None)
     if len(df) > 0:
-        df_pg = perform_protein_grouping(df, pept_dict, fasta_dict, callback = None)
+        df_pg = alphapept.utils.categorize_columns(perform_protein_grouping(df, pept_dict, fasta_dict, callback = None))
 
         df_pg = cut_global_fdr(df_pg, analyte_level='protein_group',  plot=False, fdr_level = settings["search"]["protein_fdr"], **settings['search'])
         logging.info('FDR on proteins complete. For {} FDR found {:,} targets and {:,} decoys. A total of {:,} proteins found.'.format(settings["search"]["protein_fdr"], df_pg['target'].sum(), df_pg['decoy'].sum(), len(set(df_pg['protein']))))
@@ -1082,7 +1088,8 @@ def protein_grouping_all(settings:dict, pept_dict:dict, fasta_dict:dict, callbac
 
         base, ext = os.path.splitext(path)
 
-        df_pg.to_hdf(
+        alphapept.utils.write_results_df(
+            df_pg,
             path,
             'protein_fdr'
         )
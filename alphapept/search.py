@@ -1,10 +1,16 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/05_search.ipynb.
 
 # %% auto 0
-__all__ = ['FRAG_DTYPE', 'LOSS_DICT', 'LOSSES', 'mass_dict', 'compare_frags', 'ppm_to_dalton', 'get_idxs',
-           'compare_spectrum_parallel', 'query_data_to_features', 'get_psms', 'frag_delta', 'intensity_fraction',
-           'add_column', 'remove_column', 'get_hits', 'score', 'get_sequences', 'get_score_columns', 'plot_psms',
-           'store_hdf', 'search_db', 'search_fasta_block', 'filter_top_n', 'ion_extractor', 'search_parallel']
+__all__ = ['FRAG_DTYPE', 'LOSS_DICT', 'LOSSES', 'QUERY_SPECTRUM_KEYS', 'mass_dict', 'compare_frags', 'ppm_to_dalton', 'get_idxs',
+           'get_query_tiles', 'compare_spectrum_parallel', 'create_fragment_index', 'score_candidate', 'insert_top_n',
+           'compare_spectrum_fragment_index', 'create_shifted_fragment_index', 'count_shared_fragments',
+           'score_candidate_shifted', 'compare_spectrum_open_search', 'mass_shift_histogram',
+           'compare_spectrum_compact', 'query_data_to_features', 'get_fragment_index', 'get_psms', 'frag_delta',
+           'intensity_fraction', 'add_column', 'remove_column', 'get_hits', 'count_ions', 'fill_score_columns', 'score',
+           'get_sequences', 'get_score_columns', 'plot_psms', 'store_hdf', 'get_calibrated_search_settings',
+           'get_query_mass_range', 'search_db', 'get_reduced_database', 'concat_query_data', 'rescore_psms',
+           'get_batch_search_settings', 'score_batch_psms', 'search_db_batch', 'search_fasta_block', 'filter_top_n',
+           'insert_top_n_psms', 'TopNAccumulator', 'ion_extractor', 'search_parallel']
 
 # %% ../nbs/05_search.ipynb 5
 import logging
@@ -89,11 +95,30 @@ def get_idxs(db_masses:np.ndarray, query_masses:np.ndarray, prec_tol:float, ppm:
     return idxs_lower, idxs_higher
 
 # %% ../nbs/05_search.ipynb 15
+def get_query_tiles(query_masses:np.ndarray, tile_size:int = 1000)-> list:
+    """Function to split queries into tiles of contiguous precursor masses.
+    As the database is sorted by precursor mass, each tile only accesses one contiguous slice of the database.
+    The tiles can be handed to a `performance_function`, which distributes them dynamically to the workers.
+
+    Args:
+        query_masses (np.ndarray): Array containing query masses.
+        tile_size (int, optional): Number of queries per tile. Defaults to 1000.
+
+    Returns:
+        list: List of arrays with the query indices of each tile.
+    """
+    order = np.argsort(query_masses, kind='stable')
+
+    return [order[start:start + tile_size] for start in range(0, len(order), tile_size)]
+
+# %% ../nbs/05_search.ipynb 17
 import alphapept.performance
 
 @alphapept.performance.performance_function
-def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower:np.ndarray, idxs_higher:np.ndarray, query_indices:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, best_hits:np.ndarray, score:np.ndarray, frag_tol:float, ppm:bool):
+def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower:np.ndarray, idxs_higher:np.ndarray, query_indices:np.ndarray, query_selection:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, best_hits:np.ndarray, score:np.ndarray, n_pruned:np.ndarray, frag_tol:float, ppm:bool, prune:bool):
     """Compares a spectrum and writes to the best_hits and score.
+    With prune, candidates that can not exceed the worst score of the top-n are skipped or their comparison is stopped early.
+    The hits of a candidate are bounded by the number of possible matches + 1 as the matched intensity fraction is at most 1.
 
     Args:
         query_idx (int): Integer to the query_spectrum that should be compared.
@@ -101,21 +126,25 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
         idxs_lower (np.ndarray): Array with indices for lower search boundary.
         idxs_higher (np.ndarray): Array with indices for upper search boundary.
         query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
         query_frags (np.ndarray): Array with frag types of the query data.
         query_ints (np.ndarray): Array with fragment intensities from the query.
         db_indices (np.ndarray):  Array with indices to the database data.
         db_frags (np.ndarray): Array with frag types of the db data.
         best_hits (np.ndarray): Reporting array which stores indices to the best hits.
         score (np.ndarray): Reporting array that stores the scores of the best hits.
+        n_pruned (np.ndarray): Reporting array that stores the number of pruned candidates per query.
         frag_tol (float): Fragment tolerance for search.
         ppm (bool): Flag to use ppm instead of Dalton.
+        prune (bool): Flag to skip candidates that can not enter the top-n.
     """    
 
     idx_low = idxs_lower[query_idx]
     idx_high = idxs_higher[query_idx]
 
-    query_idx_start = query_indices[query_idx]
-    query_idx_end = query_indices[query_idx + 1]
+    spectrum_idx = query_selection[query_idx]
+    query_idx_start = query_indices[spectrum_idx]
+    query_idx_end = query_indices[spectrum_idx + 1]
     query_frag = query_frags[query_idx_start:query_idx_end]
     query_int = query_ints[query_idx_start:query_idx_end]
 
@@ -123,6 +152,8 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
     for qi in query_int:
         query_int_sum += qi
 
+    len_ = best_hits.shape[1]
+
     for db_idx in range(idx_low, idx_high):
         db_idx_start = db_indices[db_idx]
         db_idx_next = db_idx +1
@@ -133,10 +164,24 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
         q_max = len(query_frag)
         d_max = len(db_frag)
 
+        # Small margin so that rounding of the intensity fraction can not change results
+        worst_score = score[query_idx, len_-1] - 1.000001
+        check_bound = prune and worst_score >= 0
+
+        if check_bound and min(q_max, d_max) <= worst_score:
+            n_pruned[query_idx] += 1
+            continue
+
         hits = 0
+        n_hits = 0
 
         q, d = 0, 0  # q > query, d > database
         while q < q_max and d < d_max:
+            if check_bound and n_hits + min(q_max - q, d_max - d) <= worst_score:
+                n_pruned[query_idx] += 1
+                hits = 0
+                break
+
             mass1 = query_frag[q]
             mass2 = db_frag[d]
             delta_mass = mass1 - mass2
@@ -150,6 +195,7 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
             if abs(mass_difference) <= frag_tol:
                 hits += 1
                 hits += query_int[q]/query_int_sum
+                n_hits += 1
                 d += 1
                 q += 1  # Only one query for each db element
             elif delta_mass < 0:
@@ -157,7 +203,6 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
             elif delta_mass > 0:
                 d += 1
 
-        len_ = best_hits.shape[1]
         for i in range(len_):
             if score[query_idx, i] < hits:
 
@@ -183,7 +228,454 @@ def compare_spectrum_parallel(query_idx:int, query_masses:np.ndarray, idxs_lower
                 best_hits[query_idx, i] = db_idx
                 break
 
-# %% ../nbs/05_search.ipynb 18
+# %% ../nbs/05_search.ipynb 24
+def create_fragment_index(db_frags:np.ndarray, db_indices:np.ndarray, bin_width:float)-> (np.ndarray, np.ndarray, np.ndarray):
+    """Creates an inverted index that maps fragment mass bins to database entries.
+
+    Args:
+        db_frags (np.ndarray): Array with fragment masses of the database.
+        db_indices (np.ndarray): Array with indices to the database data.
+        bin_width (float): Width of a fragment mass bin in Dalton.
+
+    Returns:
+        np.ndarray: Pointer array so that the entries of bin i are stored at [indptr[i]:indptr[i+1]].
+        np.ndarray: Database indices of the fragments, sorted by bin and database index. Stored as np.int32 if possible.
+        np.ndarray: Fragment masses, in the same order as the database indices.
+    """
+    n_db = len(db_indices) - 1
+    db_idx = np.repeat(np.arange(n_db, dtype=np.int32 if n_db < 2**31 else np.int64), np.diff(db_indices))
+    bins = (db_frags / bin_width).astype(np.int64)
+
+    # Stable sort keeps the database indices sorted within a bin
+    order = np.argsort(bins, kind='stable')
+
+    n_bins = bins.max() + 1 if len(bins) > 0 else 0
+    frag_index_indptr = np.zeros(n_bins + 1, dtype=np.int64)
+    frag_index_indptr[1:] = np.cumsum(np.bincount(bins, minlength=n_bins))
+
+    return frag_index_indptr, db_idx[order], db_frags[order]
+
+
+@njit
+def score_candidate(query_frag:np.ndarray, query_int:np.ndarray, query_int_sum:float, db_frag:np.ndarray, frag_tol:float, ppm:bool)->float:
+    """Compares a query spectrum with a database spectrum and returns the hits (number of hits + matched intensity fraction).
+    This is the same pointer based comparison as used in `compare_spectrum_parallel`.
+
+    Args:
+        query_frag (np.ndarray): Array with query fragments.
+        query_int (np.ndarray): Array with query intensities.
+        query_int_sum (float): Summed intensity of the query.
+        db_frag (np.ndarray): Array with database fragments.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+
+    Returns:
+        float: The hits of the comparison.
+    """
+    q_max = len(query_frag)
+    d_max = len(db_frag)
+
+    hits = 0
+
+    q, d = 0, 0  # q > query, d > database
+    while q < q_max and d < d_max:
+        mass1 = query_frag[q]
+        mass2 = db_frag[d]
+        delta_mass = mass1 - mass2
+
+        if ppm:
+            sum_mass = mass1 + mass2
+            mass_difference = 2 * delta_mass / sum_mass * 1e6
+        else:
+            mass_difference = delta_mass
+
+        if abs(mass_difference) <= frag_tol:
+            hits += 1
+            hits += query_int[q]/query_int_sum
+            d += 1
+            q += 1  # Only one query for each db element
+        elif delta_mass < 0:
+            q += 1
+        elif delta_mass > 0:
+            d += 1
+
+    return hits
+
+
+@njit
+def insert_top_n(query_idx:int, db_idx:int, hits:float, best_hits:np.ndarray, score:np.ndarray):
+    """Inserts a hit into the top-n reporting arrays, keeping them sorted by score.
+
+    Args:
+        query_idx (int): Index of the query.
+        db_idx (int): Index of the database entry.
+        hits (float): The hits of the comparison.
+        best_hits (np.ndarray): Reporting array which stores indices to the best hits.
+        score (np.ndarray): Reporting array that stores the scores of the best hits.
+    """
+    len_ = best_hits.shape[1]
+    for i in range(len_):
+        if score[query_idx, i] < hits:
+            for k in range(len_ - 1, i, -1):
+                score[query_idx, k] = score[query_idx, k-1]
+                best_hits[query_idx, k] = best_hits[query_idx, k-1]
+
+            score[query_idx, i] = hits
+            best_hits[query_idx, i] = db_idx
+            break
+
+
+@alphapept.performance.performance_function
+def compare_spectrum_fragment_index(query_idx:int, query_masses:np.ndarray, idxs_lower:np.ndarray, idxs_higher:np.ndarray, query_indices:np.ndarray, query_selection:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, frag_index_indptr:np.ndarray, frag_index_db_idx:np.ndarray, frag_index_masses:np.ndarray, index_offset:int, bin_width:float, min_shared:int, best_hits:np.ndarray, score:np.ndarray, frag_tol:float, ppm:bool):
+    """Compares a spectrum with the help of a fragment index and writes to the best_hits and score.
+
+    Args:
+        query_idx (int): Integer to the query_spectrum that should be compared.
+        query_masses (np.ndarray): Array with query masses.
+        idxs_lower (np.ndarray): Array with indices for lower search boundary.
+        idxs_higher (np.ndarray): Array with indices for upper search boundary.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        query_ints (np.ndarray): Array with fragment intensities from the query.
+        db_indices (np.ndarray):  Array with indices to the database data.
+        db_frags (np.ndarray): Array with frag types of the db data.
+        frag_index_indptr (np.ndarray): Pointer array of the fragment index. See `create_fragment_index`.
+        frag_index_db_idx (np.ndarray): Database indices of the fragment index. See `create_fragment_index`.
+        frag_index_masses (np.ndarray): Fragment masses of the fragment index. See `create_fragment_index`.
+        index_offset (int): Database index in the fragment index of the first entry of db_indices, e.g. when a slice of the database is searched with the index of the whole database.
+        bin_width (float): Width of a fragment mass bin in Dalton.
+        min_shared (int): Minimum number of shared fragments for a candidate to be scored.
+        best_hits (np.ndarray): Reporting array which stores indices to the best hits.
+        score (np.ndarray): Reporting array that stores the scores of the best hits.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+    """
+    idx_low = idxs_lower[query_idx]
+    idx_high = idxs_higher[query_idx]
+
+    if idx_high > idx_low:
+        spectrum_idx = query_selection[query_idx]
+        query_idx_start = query_indices[spectrum_idx]
+        query_idx_end = query_indices[spectrum_idx + 1]
+        query_frag = query_frags[query_idx_start:query_idx_end]
+        query_int = query_ints[query_idx_start:query_idx_end]
+
+        query_int_sum = 0
+        for qi in query_int:
+            query_int_sum += qi
+
+        n_bins = len(frag_index_indptr) - 1
+        shared = np.zeros(idx_high - idx_low, dtype=np.int32)
+
+        for mass1 in query_frag:
+            if ppm:
+                # Upper bound for the Dalton offset, the exact tolerance is checked below
+                offset = 2 * mass1 / 1e6 * frag_tol
+            else:
+                offset = frag_tol
+
+            bin_low = max(int((mass1 - offset) / bin_width), 0)
+            bin_high = min(int((mass1 + offset) / bin_width), n_bins - 1)
+
+            for bin_ in range(bin_low, bin_high + 1):
+                start = frag_index_indptr[bin_]
+                end = frag_index_indptr[bin_ + 1]
+
+                i = start + np.searchsorted(frag_index_db_idx[start:end], idx_low + index_offset)
+                while i < end:
+                    db_idx = frag_index_db_idx[i] - index_offset
+                    if db_idx >= idx_high:
+                        break
+                    mass2 = frag_index_masses[i]
+                    delta_mass = mass1 - mass2
+
+                    if ppm:
+                        sum_mass = mass1 + mass2
+                        mass_difference = 2 * delta_mass / sum_mass * 1e6
+                    else:
+                        mass_difference = delta_mass
+
+                    if abs(mass_difference) <= frag_tol:
+                        shared[db_idx - idx_low] += 1
+                    i += 1
+
+        for db_idx in range(idx_low, idx_high):
+            if shared[db_idx - idx_low] >= min_shared:
+                db_frag = db_frags[db_indices[db_idx]:db_indices[db_idx + 1]]
+                hits = score_candidate(query_frag, query_int, query_int_sum, db_frag, frag_tol, ppm)
+                insert_top_n(query_idx, db_idx, hits, best_hits, score)
+
+# %% ../nbs/05_search.ipynb 29
+def create_shifted_fragment_index(db_frags:np.ndarray, db_indices:np.ndarray, db_masses:np.ndarray, bin_width:float)-> (np.ndarray, np.ndarray, np.ndarray):
+    """Creates an inverted index of the distances between the fragments and the precursor mass of each database entry.
+    A fragment that carries the precursor mass shift of a query matches db_frag + delta with delta = query_mass - db_mass.
+    This is the case when query_mass - query_frag == db_mass - db_frag, so shifted fragments can be looked up independent of delta.
+
+    Args:
+        db_frags (np.ndarray): Array with fragment masses of the database.
+        db_indices (np.ndarray): Array with indices to the database data.
+        db_masses (np.ndarray): Array with precursor masses of the database.
+        bin_width (float): Width of a bin in Dalton.
+
+    Returns:
+        np.ndarray: Pointer array so that the entries of bin i are stored at [indptr[i]:indptr[i+1]].
+        np.ndarray: Database indices of the fragments, sorted by bin and database index.
+        np.ndarray: Distances of the fragments to their precursor mass, in the same order as the database indices.
+    """
+    distances = np.maximum(np.repeat(db_masses, np.diff(db_indices)) - db_frags, 0)
+
+    return create_fragment_index(distances, db_indices, bin_width)
+
+
+@njit
+def count_shared_fragments(mass:float, offset:float, frag_index_indptr:np.ndarray, frag_index_db_idx:np.ndarray, frag_index_masses:np.ndarray, index_offset:int, bin_width:float, idx_low:int, idx_high:int, query_mass:float, db_masses:np.ndarray, min_delta:float, shared:np.ndarray):
+    """Counts a fragment for all database entries in [idx_low, idx_high) that have a fragment index entry within offset of mass.
+
+    Args:
+        mass (float): The mass to look up in the fragment index.
+        offset (float): Tolerance in Dalton.
+        frag_index_indptr (np.ndarray): Pointer array of the fragment index. See `create_fragment_index`.
+        frag_index_db_idx (np.ndarray): Database indices of the fragment index. See `create_fragment_index`.
+        frag_index_masses (np.ndarray): Fragment masses of the fragment index. See `create_fragment_index`.
+        index_offset (int): Database index in the fragment index of the first entry of db_masses.
+        bin_width (float): Width of a fragment mass bin in Dalton.
+        idx_low (int): First database index of the precursor window.
+        idx_high (int): Database index after the precursor window.
+        query_mass (float): Precursor mass of the query.
+        db_masses (np.ndarray): Array with precursor masses of the database.
+        min_delta (float): Entries are only counted when their precursor mass differs by more than min_delta from query_mass.
+        shared (np.ndarray): Number of shared fragments of each entry in the precursor window.
+    """
+    n_bins = len(frag_index_indptr) - 1
+    bin_low = max(int((mass - offset) / bin_width), 0)
+    bin_high = min(int((mass + offset) / bin_width), n_bins - 1)
+
+    for bin_ in range(bin_low, bin_high + 1):
+        start = frag_index_indptr[bin_]
+        end = frag_index_indptr[bin_ + 1]
+
+        i = start + np.searchsorted(frag_index_db_idx[start:end], idx_low + index_offset)
+        while i < end:
+            db_idx = frag_index_db_idx[i] - index_offset
+            if db_idx >= idx_high:
+                break
+            if abs(mass - frag_index_masses[i]) <= offset:
+                if abs(query_mass - db_masses[db_idx]) > min_delta:
+                    shared[db_idx - idx_low] += 1
+            i += 1
+
+
+@njit
+def score_candidate_shifted(query_frag:np.ndarray, query_int:np.ndarray, query_int_sum:float, db_frag:np.ndarray, delta:float, frag_tol:float, ppm:bool)->float:
+    """Compares a query spectrum with a database spectrum whose fragments can carry the precursor mass delta.
+    Each query fragment is counted once, either unshifted or shifted by delta.
+
+    Args:
+        query_frag (np.ndarray): Array with query fragments.
+        query_int (np.ndarray): Array with query intensities.
+        query_int_sum (float): Summed intensity of the query.
+        db_frag (np.ndarray): Array with database fragments.
+        delta (float): Precursor mass delta between the query and the database entry.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+
+    Returns:
+        float: The hits of the comparison.
+    """
+    q_max = len(query_frag)
+    d_max = len(db_frag)
+
+    matched = np.zeros(q_max, dtype=np.bool_)
+
+    for shift in (0.0, delta):
+        q, d = 0, 0  # q > query, d > database
+        while q < q_max and d < d_max:
+            mass1 = query_frag[q]
+            mass2 = db_frag[d] + shift
+            delta_mass = mass1 - mass2
+
+            if ppm:
+                sum_mass = mass1 + mass2
+                mass_difference = 2 * delta_mass / sum_mass * 1e6
+            else:
+                mass_difference = delta_mass
+
+            if abs(mass_difference) <= frag_tol:
+                matched[q] = True
+                d += 1
+                q += 1
+            elif delta_mass < 0:
+                q += 1
+            elif delta_mass > 0:
+                d += 1
+
+    hits = 0
+    for q in range(q_max):
+        if matched[q]:
+            hits += 1
+            hits += query_int[q]/query_int_sum
+
+    return hits
+
+
+@alphapept.performance.performance_function
+def compare_spectrum_open_search(query_idx:int, query_masses:np.ndarray, idxs_lower:np.ndarray, idxs_higher:np.ndarray, query_indices:np.ndarray, query_selection:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_masses:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, frag_index_indptr:np.ndarray, frag_index_db_idx:np.ndarray, frag_index_masses:np.ndarray, shift_index_indptr:np.ndarray, shift_index_db_idx:np.ndarray, shift_index_masses:np.ndarray, index_offset:int, bin_width:float, min_shared:int, n_candidates:int, best_hits:np.ndarray, score:np.ndarray, frag_tol:float, ppm:bool):
+    """Compares a spectrum within a wide precursor window and writes to the best_hits and score.
+    Only the n_candidates database entries with the most shared fragments are scored.
+    Shared fragments are counted and scored unshifted and shifted by the precursor mass delta of each entry.
+
+    Args:
+        query_idx (int): Integer to the query_spectrum that should be compared.
+        query_masses (np.ndarray): Array with query masses.
+        idxs_lower (np.ndarray): Array with indices for lower search boundary.
+        idxs_higher (np.ndarray): Array with indices for upper search boundary.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        query_ints (np.ndarray): Array with fragment intensities from the query.
+        db_masses (np.ndarray): Array with precursor masses of the database.
+        db_indices (np.ndarray):  Array with indices to the database data.
+        db_frags (np.ndarray): Array with frag types of the db data.
+        frag_index_indptr (np.ndarray): Pointer array of the fragment index. See `create_fragment_index`.
+        frag_index_db_idx (np.ndarray): Database indices of the fragment index. See `create_fragment_index`.
+        frag_index_masses (np.ndarray): Fragment masses of the fragment index. See `create_fragment_index`.
+        shift_index_indptr (np.ndarray): Pointer array of the shifted fragment index. See `create_shifted_fragment_index`.
+        shift_index_db_idx (np.ndarray): Database indices of the shifted fragment index. See `create_shifted_fragment_index`.
+        shift_index_masses (np.ndarray): Distances of the shifted fragment index. See `create_shifted_fragment_index`.
+        index_offset (int): Database index in the fragment indices of the first entry of db_indices, e.g. when a slice of the database is searched with the indices of the whole database.
+        bin_width (float): Width of a fragment mass bin in Dalton.
+        min_shared (int): Minimum number of shared fragments for a candidate to be scored.
+        n_candidates (int): Maximum number of candidates that are scored per query.
+        best_hits (np.ndarray): Reporting array which stores indices to the best hits.
+        score (np.ndarray): Reporting array that stores the scores of the best hits.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+    """
+    idx_low = idxs_lower[query_idx]
+    idx_high = idxs_higher[query_idx]
+
+    if idx_high > idx_low:
+        spectrum_idx = query_selection[query_idx]
+        query_idx_start = query_indices[spectrum_idx]
+        query_idx_end = query_indices[spectrum_idx + 1]
+        query_frag = query_frags[query_idx_start:query_idx_end]
+        query_int = query_ints[query_idx_start:query_idx_end]
+        query_mass = query_masses[query_idx]
+
+        query_int_sum = 0
+        for qi in query_int:
+            query_int_sum += qi
+
+        shared = np.zeros(idx_high - idx_low, dtype=np.int32)
+
+        for mass1 in query_frag:
+            if ppm:
+                offset = ppm_to_dalton(mass1, frag_tol)
+            else:
+                offset = frag_tol
+
+            count_shared_fragments(mass1, offset, frag_index_indptr, frag_index_db_idx, frag_index_masses, index_offset, bin_width, idx_low, idx_high, query_mass, db_masses, -1.0, shared)
+            # Entries without a mass shift already matched this fragment unshifted
+            count_shared_fragments(query_mass - mass1, offset, shift_index_indptr, shift_index_db_idx, shift_index_masses, index_offset, bin_width, idx_low, idx_high, query_mass, db_masses, offset, shared)
+
+        candidates = np.nonzero(shared >= min_shared)[0]
+        if len(candidates) > n_candidates:
+            candidates = candidates[np.argsort(-shared[candidates], kind='mergesort')[:n_candidates]]
+
+        for candidate in candidates:
+            db_idx = candidate + idx_low
+            db_frag = db_frags[db_indices[db_idx]:db_indices[db_idx + 1]]
+            hits = score_candidate_shifted(query_frag, query_int, query_int_sum, db_frag, query_mass - db_masses[db_idx], frag_tol, ppm)
+            insert_top_n(query_idx, db_idx, hits, best_hits, score)
+
+
+def mass_shift_histogram(prec_offset:np.ndarray, bin_width:float = 0.01, min_count:int = 0)-> (np.ndarray, np.ndarray):
+    """Calculates a histogram of precursor mass shifts, e.g. the prec_offset of an open search.
+
+    Args:
+        prec_offset (np.ndarray): Array with precursor mass offsets in Dalton.
+        bin_width (float, optional): Width of a histogram bin in Dalton. Defaults to 0.01.
+        min_count (int, optional): Only bins with more counts are reported. Defaults to 0.
+
+    Returns:
+        np.ndarray: Centers of the histogram bins in Dalton.
+        np.ndarray: Counts of the histogram bins.
+    """
+    bins = np.round(np.asarray(prec_offset) / bin_width).astype(np.int64)
+    values, counts = np.unique(bins, return_counts=True)
+    valid = counts > min_count
+
+    return values[valid] * bin_width, counts[valid]
+
+# %% ../nbs/05_search.ipynb 34
+from .fasta import fill_compact_fragments, get_compact_database, expand_compact_database
+
+@alphapept.performance.performance_function
+def compare_spectrum_compact(query_idx:int, query_masses:np.ndarray, idxs_lower:np.ndarray, idxs_higher:np.ndarray, query_indices:np.ndarray, query_selection:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, residue_indptr:np.ndarray, residues:np.ndarray, token_masses:np.ndarray, proton:float, h2o:float, best_hits:np.ndarray, score:np.ndarray, n_pruned:np.ndarray, frag_tol:float, ppm:bool, prune:bool):
+    """Compares a spectrum with the entries of a compact database and writes to the best_hits and score.
+    The results are the same as for `compare_spectrum_parallel` with the fragments of the database.
+    The fragments of each candidate are written to a buffer that is allocated once per query, see `fill_compact_fragments`.
+
+    Args:
+        query_idx (int): Integer to the query_spectrum that should be compared.
+        query_masses (np.ndarray): Array with query masses.
+        idxs_lower (np.ndarray): Array with indices for lower search boundary.
+        idxs_higher (np.ndarray): Array with indices for upper search boundary.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        query_ints (np.ndarray): Array with fragment intensities from the query.
+        residue_indptr (np.ndarray): Array with indices to the encoded peptides of the database.
+        residues (np.ndarray): Array with the token codes of the database peptides.
+        token_masses (np.ndarray): Array with the masses of the tokens.
+        proton (float): Mass of a proton.
+        h2o (float): Mass of H2O.
+        best_hits (np.ndarray): Reporting array which stores indices to the best hits.
+        score (np.ndarray): Reporting array that stores the scores of the best hits.
+        n_pruned (np.ndarray): Reporting array that stores the number of pruned candidates per query.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        prune (bool): Flag to skip candidates that can not enter the top-n.
+    """
+    idx_low = idxs_lower[query_idx]
+    idx_high = idxs_higher[query_idx]
+
+    spectrum_idx = query_selection[query_idx]
+    query_idx_start = query_indices[spectrum_idx]
+    query_idx_end = query_indices[spectrum_idx + 1]
+    query_frag = query_frags[query_idx_start:query_idx_end]
+    query_int = query_ints[query_idx_start:query_idx_end]
+
+    query_int_sum = 0
+    for qi in query_int:
+        query_int_sum += qi
+
+    len_ = best_hits.shape[1]
+    q_max = len(query_frag)
+
+    max_residues = 0
+    for db_idx in range(idx_low, idx_high):
+        max_residues = max(max_residues, residue_indptr[db_idx + 1] - residue_indptr[db_idx])
+    db_frag = np.empty(max(max_residues - 1, 0) * 2, dtype=np.float64)
+
+    for db_idx in range(idx_low, idx_high):
+        residue_start = residue_indptr[db_idx]
+        residue_end = residue_indptr[db_idx + 1]
+        d_max = (residue_end - residue_start - 1) * 2
+
+        # Small margin so that rounding of the intensity fraction can not change results
+        worst_score = score[query_idx, len_-1] - 1.000001
+        if prune and worst_score >= 0 and min(q_max, d_max) <= worst_score:
+            n_pruned[query_idx] += 1
+            continue
+
+        n_frags = fill_compact_fragments(residues[residue_start:residue_end], token_masses, proton, h2o, db_frag)
+        hits = score_candidate(query_frag, query_int, query_int_sum, db_frag[:n_frags], frag_tol, ppm)
+        insert_top_n(query_idx, db_idx, hits, best_hits, score)
+
+
+# %% ../nbs/05_search.ipynb 37
 import pandas as pd
 import logging
 from .fasta import read_database
@@ -211,8 +703,52 @@ def query_data_to_features(query_data: dict)->pd.DataFrame:
 
     return features
 
-# %% ../nbs/05_search.ipynb 20
-from typing import Callable
+# %% ../nbs/05_search.ipynb 39
+from typing import Callable, Union
+from .fasta import FRAGMENT_INDEX_ARRAYS, read_fragment_index
+
+def get_fragment_index(db_data:Union[dict, str], db_frags:np.ndarray, db_indices:np.ndarray, db_masses:np.ndarray, frag_tol:float, ppm:bool, shifted:bool = False)->dict:
+    """Gets the fragment index of a database.
+    The index that is stored with the flat export of the database is memory-mapped, see `export_fragment_index`.
+    Otherwise, the index is created with a bin width that matches the fragment tolerance, see `create_fragment_index`.
+
+    Args:
+        db_data (Union[dict, str]): Data structure containing the database data or path to database.
+        db_frags (np.ndarray): Array with fragment masses of the database.
+        db_indices (np.ndarray): Array with indices to the database data.
+        db_masses (np.ndarray): Array with precursor masses of the database.
+        frag_tol (float): Fragment tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        shifted (bool, optional): Flag to also create the shifted fragment index, see `create_shifted_fragment_index`. Defaults to False.
+
+    Returns:
+        dict: The arrays of FRAGMENT_INDEX_ARRAYS, the bin width (frag_index_bin_width) and the database index of the first entry of db_indices (frag_index_offset).
+    """
+    if isinstance(db_data, str):
+        fragment_index = read_fragment_index(db_data)
+    elif 'frag_index_indptr' in db_data:
+        fragment_index = {key: db_data[key] for key in FRAGMENT_INDEX_ARRAYS + ['frag_index_bin_width', 'frag_index_offset']}
+    else:
+        fragment_index = None
+
+    if fragment_index is not None:
+        logging.info(f'Using stored fragment index with bins of {fragment_index["frag_index_bin_width"]:.4f} Da.')
+        return fragment_index
+
+    if ppm:
+        bin_width = ppm_to_dalton(1000, frag_tol)
+    else:
+        bin_width = frag_tol
+
+    fragment_index = dict(zip(FRAGMENT_INDEX_ARRAYS[:3], create_fragment_index(db_frags, db_indices, bin_width)))
+    if shifted:
+        fragment_index.update(zip(FRAGMENT_INDEX_ARRAYS[3:], create_shifted_fragment_index(db_frags, db_indices, db_masses, bin_width)))
+    fragment_index['frag_index_bin_width'] = bin_width
+    fragment_index['frag_index_offset'] = 0
+
+    logging.info(f'Created fragment index with {len(fragment_index["frag_index_indptr"])-1:,} bins of {bin_width:.4f} Da.')
+
+    return fragment_index
 
 #this wrapper function is covered by the quick_test
 def get_psms(
@@ -228,9 +764,16 @@ def get_psms(
     prec_tol_calibrated:float = None,
     frag_tol_calibrated:float = None,
     top_n: int = 10,
+    search_engine: str = 'pointer',
+    open_search: bool = False,
+    open_search_window: float = 500,
+    open_search_candidates: int = 50,
+    prune_candidates: bool = False,
     **kwargs
 )->(np.ndarray, int):
     """[summary]
+    The fragments of a compact database are calculated on the fly by the pointer-based search, see `compare_spectrum_compact`.
+    The other search engines calculate the fragments of all database entries first.
 
     Args:
         query_data (dict): Data structure containing the query data.
@@ -245,20 +788,39 @@ def get_psms(
         prec_tol_calibrated (float, optional): Precursor tolerance if calibration exists. Defaults to None.
         frag_tol_calibrated (float, optional): Fragment tolerance if calibration exists. Defaults to None.
         top_n (int): Number of top-n hits to keep.
+        search_engine (str): Either 'pointer' to compare each query against all entries in the precursor window
+            or 'fragment_index' to use an inverted fragment index. Defaults to 'pointer'.
+        open_search (bool): Flag to perform an open search with a wide precursor window. Defaults to False.
+        open_search_window (float): Precursor window in Dalton for the open search. Defaults to 500.
+        open_search_candidates (int): Number of candidates per query that are scored in the open search. Defaults to 50.
+        prune_candidates (bool): Flag to skip candidates that can not enter the top-n in the pointer-based search, see `compare_spectrum_parallel`. Defaults to False.
 
     Returns:
         np.ndarray: Numpy recordarray storing the PSMs.
         int: 0
+
+    Raises:
+        NotImplementedError: When the search engine is not known or an open search is performed in cuda mode.
     """
 
+    compact = get_compact_database(db_data)
+
     if isinstance(db_data, str):
         db_masses = read_database(db_data, array_name = 'precursors')
-        db_frags = read_database(db_data, array_name = 'fragmasses')
-        db_indices = read_database(db_data, array_name = 'indices')
+        if compact is None:
+            db_frags = read_database(db_data, array_name = 'fragmasses')
+            db_indices = read_database(db_data, array_name = 'indices')
     else:
         db_masses = db_data['precursors']
-        db_frags = db_data['fragmasses']
-        db_indices = db_data['indices']
+        if compact is None:
+            db_frags = db_data['fragmasses']
+            db_indices = db_data['indices']
+
+    # Fragments are only calculated on the fly by the pointer-based search on the cpu
+    if compact is not None and (open_search or search_engine != 'pointer' or alphapept.performance.COMPILATION_MODE == "cuda"):
+        logging.info('Calculating the fragments of the compact database.')
+        db_frags, _, db_indices = expand_compact_database(compact)
+        compact = None
 
     query_indices = query_data["indices_ms2"]
     query_frags = query_data['mass_list_ms2']
@@ -275,26 +837,8 @@ def get_psms(
             query_masses = features['mass_matched'].values
         query_mz = features['mz_matched'].values
         query_rt = features['rt_matched'].values
-        query_selection = features['query_idx'].values
-        indices = np.zeros(len(query_selection) + 1, np.int64)
-        indices[1:] = np.diff(query_indices)[query_selection]
-        indices = np.cumsum(indices)
-        query_frags = np.concatenate(
-            [
-                query_frags[s: e] for s, e in zip(
-                    query_indices[query_selection], query_indices[query_selection + 1]
-                )
-            ]
-        )
-
-        query_ints = np.concatenate(
-            [
-                query_ints[s: e] for s, e in zip(
-                    query_indices[query_selection], query_indices[query_selection + 1]
-                )
-            ]
-        )
-        query_indices = indices
+        # Features point to their spectrum, no fragments are copied
+        query_selection = features['query_idx'].values.astype(np.int64)
     else:
         if prec_tol_calibrated:
             prec_tol = prec_tol_calibrated
@@ -302,17 +846,25 @@ def get_psms(
         query_masses = query_data['prec_mass_list2']
         query_mz = query_data['mono_mzs2']
         query_rt = query_data['rt_list_ms2']
+        query_selection = np.arange(len(query_masses))
 
-    idxs_lower, idxs_higher = get_idxs(
-        db_masses,
-        query_masses,
-        prec_tol,
-        ppm
-    )
+    if open_search:
+        prec_tol = open_search_window
+        idxs_lower, idxs_higher = get_idxs(db_masses, query_masses, prec_tol, False)
+    else:
+        idxs_lower, idxs_higher = get_idxs(
+            db_masses,
+            query_masses,
+            prec_tol,
+            ppm
+        )
 
     n_queries = len(query_masses)
     n_db = len(db_masses)
 
+    # Queries are processed in tiles of similar precursor mass that access a contiguous slice of the database
+    query_tiles = get_query_tiles(query_masses)
+
     if alphapept.performance.COMPILATION_MODE == "cuda":
         import cupy
         cupy = cupy
@@ -320,6 +872,7 @@ def get_psms(
         idxs_lower = cupy.array(idxs_lower)
         idxs_higher = cupy.array(idxs_higher)
         query_indices = cupy.array(query_indices)
+        query_selection = cupy.array(query_selection)
         query_ints = cupy.array(query_ints)
         query_frags = cupy.array(query_frags)
         db_indices = cupy.array(db_indices)
@@ -335,7 +888,31 @@ def get_psms(
 
     logging.info(f'Performing search on {n_queries:,} query and {n_db:,} db entries with frag_tol = {frag_tol:.2f} and prec_tol = {prec_tol:.2f}.')
 
-    compare_spectrum_parallel(cupy.arange(n_queries), cupy.arange(n_queries), idxs_lower, idxs_higher, query_indices, query_frags, query_ints, db_indices, db_frags, best_hits, score, frag_tol, ppm)
+    if open_search:
+        if cupy.__name__ != 'numpy':
+            raise NotImplementedError('Open search is not available in cuda mode.')
+        fragment_index = get_fragment_index(db_data, db_frags, db_indices, db_masses, frag_tol, ppm, shifted=True)
+        min_shared = max(1, int(np.floor(min_frag_hits)))
+
+        logging.info(f'Performing open search with a precursor window of {open_search_window:.2f} Da and {open_search_candidates:,} candidates per query.')
+
+        compare_spectrum_open_search(query_tiles, query_masses, idxs_lower, idxs_higher, query_indices, query_selection, query_frags, query_ints, db_masses, db_indices, db_frags, *[fragment_index[_] for _ in FRAGMENT_INDEX_ARRAYS], fragment_index['frag_index_offset'], fragment_index['frag_index_bin_width'], min_shared, open_search_candidates, best_hits, score, frag_tol, ppm)
+    elif search_engine == 'pointer' or cupy.__name__ != 'numpy':
+        n_pruned = cupy.zeros(n_queries, dtype=cupy.int_)
+        if cupy.__name__ != 'numpy':
+            query_tiles = cupy.arange(n_queries)
+        if compact is not None:
+            compare_spectrum_compact(query_tiles, cupy.arange(n_queries), idxs_lower, idxs_higher, query_indices, query_selection, query_frags, query_ints, compact['residue_indptr'], compact['residues'], compact['token_masses'], compact['proton'], compact['h2o'], best_hits, score, n_pruned, frag_tol, ppm, prune_candidates)
+        else:
+            compare_spectrum_parallel(query_tiles, cupy.arange(n_queries), idxs_lower, idxs_higher, query_indices, query_selection, query_frags, query_ints, db_indices, db_frags, best_hits, score, n_pruned, frag_tol, ppm, prune_candidates)
+        logging.info(f'Pruned {int(n_pruned.sum()):,} of {int((idxs_higher - idxs_lower).sum()):,} candidates.')
+    elif search_engine == 'fragment_index':
+        fragment_index = get_fragment_index(db_data, db_frags, db_indices, db_masses, frag_tol, ppm)
+        min_shared = max(1, int(np.floor(min_frag_hits)))
+
+        compare_spectrum_fragment_index(query_tiles, query_masses, idxs_lower, idxs_higher, query_indices, query_selection, query_frags, query_ints, db_indices, db_frags, *[fragment_index[_] for _ in FRAGMENT_INDEX_ARRAYS[:3]], fragment_index['frag_index_offset'], fragment_index['frag_index_bin_width'], min_shared, best_hits, score, frag_tol, ppm)
+    else:
+        raise NotImplementedError(f"Search engine '{search_engine}' is not available.")
 
     query_idx, db_idx_ = cupy.where(score > min_frag_hits)
     db_idx = best_hits[query_idx, db_idx_]
@@ -354,7 +931,7 @@ def get_psms(
 
     return psms, 0
 
-# %% ../nbs/05_search.ipynb 23
+# %% ../nbs/05_search.ipynb 43
 @njit
 def frag_delta(query_frag:np.ndarray, db_frag:np.ndarray, hits:np.ndarray)-> (float, float):
     """Calculates the mass difference for a given array of hits in Dalton and ppm.
@@ -375,7 +952,7 @@ def frag_delta(query_frag:np.ndarray, db_frag:np.ndarray, hits:np.ndarray)-> (fl
 
     return delta_m, delta_m_ppm
 
-# %% ../nbs/05_search.ipynb 26
+# %% ../nbs/05_search.ipynb 46
 @njit
 def intensity_fraction(query_int:np.ndarray, hits:np.ndarray)->float:
     """Calculate the fraction of matched intensity
@@ -397,7 +974,7 @@ def intensity_fraction(query_int:np.ndarray, hits:np.ndarray)->float:
 
     return i_frac
 
-# %% ../nbs/05_search.ipynb 29
+# %% ../nbs/05_search.ipynb 49
 from numpy.lib.recfunctions import append_fields, drop_fields
 
 
@@ -434,7 +1011,7 @@ def remove_column(recarray:np.ndarray, name:str)->np.ndarray:
         recarray = drop_fields(recarray, name, usemask=False, asrecarray=True)
     return recarray
 
-# %% ../nbs/05_search.ipynb 32
+# %% ../nbs/05_search.ipynb 52
 from numba.typed import List
 
 FRAG_DTYPE = np.dtype([('ion_index', 'int64'), ('fragment_ion_type', 'int64'), ('fragment_ion_int', 'int64'), ('db_int', 'int64'),
@@ -487,20 +1064,193 @@ def get_hits(query_frag:np.ndarray, query_int:np.ndarray, db_frag:np.ndarray, db
         fragment_ions['query_idx'][pointer:pointer+n_hits] = query_range[hitpos] # index to query entry
         fragment_ions['db_idx'][pointer:pointer+n_hits]= db_range[hit] # index to db entry
 
-        pointer += n_hits
+        pointer += n_hits
+
+    fragment_ions = fragment_ions[:pointer]
+
+    return fragment_ions
+
+
+# %% ../nbs/05_search.ipynb 54
+from . import constants
+LOSS_DICT = constants.loss_dict
+LOSSES = np.array(list(LOSS_DICT.values()))
+
+@alphapept.performance.performance_function(compilation_mode="numba-multithread")
+def count_ions(psm_idx:int, psms_query_idx:np.ndarray, psms_db_idx:np.ndarray, query_selection:np.ndarray, query_indices:np.ndarray, query_frags:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, mtol:float, ppm:bool, losses:np.ndarray, n_ions:np.ndarray):
+    """Counts the matched fragment ions of a PSM for all losses. This is the first pass of `score`.
+
+    Args:
+        psm_idx (int): Index of the PSM.
+        psms_query_idx (np.ndarray): Array with the query indices of the PSMs.
+        psms_db_idx (np.ndarray): Array with the database indices of the PSMs.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        db_indices (np.ndarray): Array with indices to the database array.
+        db_frags (np.ndarray): Array with fragment masses.
+        mtol (float): Mass tolerance.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        losses (np.ndarray): Array with the mass losses.
+        n_ions (np.ndarray): Reporting array that stores the number of matched ions per PSM.
+    """
+    spectrum_idx = query_selection[psms_query_idx[psm_idx]]
+    query_frag = query_frags[query_indices[spectrum_idx]:query_indices[spectrum_idx + 1]]
+    db_idx = psms_db_idx[psm_idx]
+    db_frag = db_frags[db_indices[db_idx]:db_indices[db_idx + 1]]
+
+    count = 0
+    for off in losses:
+        q, d = 0, 0
+        while q < len(query_frag) and d < len(db_frag):
+            mass1 = query_frag[q]
+            mass2 = db_frag[d] - off
+            delta_mass = mass1 - mass2
+
+            if ppm:
+                mass_difference = 2 * delta_mass / (mass1 + mass2) * 1e6
+            else:
+                mass_difference = delta_mass
+
+            if abs(mass_difference) <= mtol:
+                count += 1
+                d += 1
+                q += 1
+            elif delta_mass < 0:
+                q += 1
+            elif delta_mass > 0:
+                d += 1
+
+    n_ions[psm_idx] = count
+
+
+@alphapept.performance.performance_function(compilation_mode="numba-multithread")
+def fill_score_columns(psm_idx:int, psms_query_idx:np.ndarray, psms_db_idx:np.ndarray, query_masses:np.ndarray, query_masses_raw:np.ndarray, query_selection:np.ndarray, query_indices:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_masses:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, db_ints:np.ndarray, frag_types:np.ndarray, mtol:float, ppm:bool, losses:np.ndarray, ion_offsets:np.ndarray, ions:np.ndarray, psms_:np.ndarray):
+    """Writes the matched fragment ions and the score columns of a PSM. This is the second pass of `score`.
+    The ions of a PSM are written to ions[ion_offsets[psm_idx]:ion_offsets[psm_idx+1]].
+
+    Args:
+        psm_idx (int): Index of the PSM.
+        psms_query_idx (np.ndarray): Array with the query indices of the PSMs.
+        psms_db_idx (np.ndarray): Array with the database indices of the PSMs.
+        query_masses (np.ndarray): Array with query masses.
+        query_masses_raw (np.ndarray): Array with raw query masses.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        query_ints (np.ndarray): Array with fragment intensities from the query.
+        db_masses (np.ndarray): Array with database masses.
+        db_indices (np.ndarray): Array with indices to the database array.
+        db_frags (np.ndarray): Array with fragment masses.
+        db_ints (np.ndarray): Array with database intensities in the same layout as db_frags. Empty to use an intensity of 1.
+        frag_types (np.ndarray): Array with fragment types.
+        mtol (float): Mass tolerance.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        losses (np.ndarray): Array with the mass losses.
+        ion_offsets (np.ndarray): Array with the offsets of the ions of each PSM.
+        ions (np.ndarray): Reporting array with FRAG_DTYPE that stores the matched ions.
+        psms_ (np.ndarray): Reporting array that stores the score columns.
+    """
+    query_idx = psms_query_idx[psm_idx]
+    spectrum_idx = query_selection[query_idx]
+    query_frag = query_frags[query_indices[spectrum_idx]:query_indices[spectrum_idx + 1]]
+    query_int = query_ints[query_indices[spectrum_idx]:query_indices[spectrum_idx + 1]]
+    db_idx = psms_db_idx[psm_idx]
+    db_start = db_indices[db_idx]
+    db_frag = db_frags[db_start:db_indices[db_idx + 1]]
+    frag_type = frag_types[db_start:db_indices[db_idx + 1]]
+
+    k = ion_offsets[psm_idx]
+    for loss_idx in range(len(losses)):
+        off = losses[loss_idx]
+        q, d = 0, 0
+        while q < len(query_frag) and d < len(db_frag):
+            mass1 = query_frag[q]
+            mass2 = db_frag[d] - off
+            delta_mass = mass1 - mass2
+
+            if ppm:
+                mass_difference = 2 * delta_mass / (mass1 + mass2) * 1e6
+            else:
+                mass_difference = delta_mass
+
+            if abs(mass_difference) <= mtol:
+                ions['ion_index'][k] = frag_type[d]
+                ions['fragment_ion_type'][k] = loss_idx
+                ions['fragment_ion_int'][k] = query_int[q]
+                if len(db_ints) > 0:
+                    ions['db_int'][k] = db_ints[db_start + d]
+                else:
+                    ions['db_int'][k] = 1
+                ions['fragment_ion_mass'][k] = mass1
+                ions['db_mass'][k] = mass2
+                ions['query_idx'][k] = q
+                ions['db_idx'][k] = d
+                ions['psms_idx'][k] = psm_idx
+                k += 1
+                d += 1
+                q += 1
+            elif delta_mass < 0:
+                q += 1
+            elif delta_mass > 0:
+                d += 1
 
-    fragment_ions = fragment_ions[:pointer]
+    start = ion_offsets[psm_idx]
+    end = ion_offsets[psm_idx + 1]
+
+    psms_['mass_db'][psm_idx] = db_masses[db_idx]
+    psms_['n_frags_db'][psm_idx] = len(db_frag)
+
+    psms_['prec_offset'][psm_idx] = query_masses[query_idx] - db_masses[db_idx]
+    psms_['prec_offset_ppm'][psm_idx] = 2 * psms_['prec_offset'][psm_idx] / (query_masses[query_idx]  + db_masses[db_idx] ) * 1e6
+
+    psms_['prec_offset_raw'][psm_idx] = query_masses_raw[query_idx] - db_masses[db_idx]
+    psms_['prec_offset_raw_ppm'][psm_idx] = 2 * psms_['prec_offset_raw'][psm_idx] / (query_masses_raw[query_idx]  + db_masses[db_idx] ) * 1e6
+
+    n_by = 0
+    delta_m = 0.0
+    matched_int_sum = 0
+    int_ratio = 0.0
+    hits = np.zeros(6, dtype=np.int64) # b, y, b-H2O, y-H2O, b-NH3, y-NH3
+    for i in range(start, end):
+        ion_type = ions['fragment_ion_type'][i]
+        if ion_type == 0:
+            n_by += 1
+            delta_m += ions['fragment_ion_mass'][i] - ions['db_mass'][i]
+        if ions['ion_index'][i] > 0:
+            hits[2 * ion_type] += 1
+        elif ions['ion_index'][i] < 0:
+            hits[2 * ion_type + 1] += 1
+        matched_int_sum += ions['fragment_ion_int'][i]
+        int_ratio += ions['fragment_ion_int'][i] / ions['db_int'][i]
+
+    psms_['delta_m'][psm_idx] = delta_m / n_by if n_by > 0 else np.nan
+    delta_m_ppm = 0.0
+    for i in range(start, end):
+        if ions['fragment_ion_type'][i] == 0:
+            delta_m_ppm += 2 * psms_['delta_m'][psm_idx] / (ions['fragment_ion_mass'][i] + ions['db_mass'][i]) * 1e6
+    psms_['delta_m_ppm'][psm_idx] = delta_m_ppm / n_by if n_by > 0 else np.nan
+
+    int_sum = 0.0
+    for qi in query_int:
+        int_sum += qi
+    psms_['fragments_int_sum'][psm_idx] = int_sum
+    psms_['fragments_matched_int_sum'][psm_idx] = matched_int_sum
+    psms_['fragments_matched_int_ratio'][psm_idx] = psms_['fragments_matched_int_sum'][psm_idx] / psms_['fragments_int_sum'][psm_idx]
+    psms_['fragments_int_ratio'][psm_idx] = int_ratio / (end - start) if end > start else np.nan
 
-    return fragment_ions
+    psms_['hits_b'][psm_idx] = hits[0]
+    psms_['hits_y'][psm_idx] = hits[1]
+    psms_['hits_b-H2O'][psm_idx] = hits[2]
+    psms_['hits_y-H2O'][psm_idx] = hits[3]
+    psms_['hits_b-NH3'][psm_idx] = hits[4]
+    psms_['hits_y-NH3'][psm_idx] = hits[5]
 
+    psms_['n_fragments_matched'][psm_idx] = end - start
+    psms_['fragment_ion_idx'][psm_idx] = start
 
-# %% ../nbs/05_search.ipynb 34
-from . import constants
-LOSS_DICT = constants.loss_dict
-LOSSES = np.array(list(LOSS_DICT.values()))
 
 #This function is a wrapper and ist tested by the quick_test
-@njit
 def score(
     psms: np.recarray,
     query_masses: np.ndarray,
@@ -508,6 +1258,7 @@ def score(
     query_frags: np.ndarray,
     query_ints: np.ndarray,
     query_indices: np.ndarray,
+    query_selection: np.ndarray,
     db_masses: np.ndarray,
     db_frags: np.ndarray,
     frag_types: np.ndarray,
@@ -515,10 +1266,12 @@ def score(
     db_indices: np.ndarray,
     ppm: bool,
     psms_dtype: list,
-    db_ints: np.ndarray = None,
-    parallel: bool = False
+    db_ints: np.ndarray = None
 ) -> (np.ndarray, np.ndarray):
     """Function to extract score columns when giving a recordarray with PSMs.
+    The matched ions are counted in a first pass (`count_ions`). After a prefix sum, they are written
+    to exactly-sized arrays in a second pass (`fill_score_columns`). Both passes are multithreaded with `set_worker_count`
+    or run in python in the python compilation modes. The record arrays are always filled on the cpu, also in cuda mode.
 
     Args:
         psms (np.recarray): Recordarray containing PSMs.
@@ -527,6 +1280,7 @@ def score(
         query_frags (np.ndarray): Array with frag types of the query data.
         query_ints (np.ndarray): Array with fragment intensities from the query.
         query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
         db_masses (np.ndarray): Array with database masses.
         db_frags (np.ndarray): Array with fragment masses.
         frag_types (np.ndarray): Array with fragment types.
@@ -534,82 +1288,33 @@ def score(
         db_indices (np.ndarray): Array with indices to the database array.
         ppm (bool): Flag to use ppm instead of Dalton.
         psms_dtype (list): List describing the dtype of the PSMs record array.
-        db_ints (np.ndarray, optional): Array with database intensities. Defaults to None.
-        parallel (bool, optional): Flag to use parallel processing. Defaults to False.
+        db_ints (np.ndarray, optional): Array with database intensities in the same layout as db_frags. Defaults to None.
 
     Returns:
         np.recarray: Recordarray containing PSMs with additional columns.
         np.ndarray: NumPy array containing ion information.
     """
+    n_psms = len(psms)
+    psms_query_idx = np.ascontiguousarray(psms['query_idx'])
+    psms_db_idx = np.ascontiguousarray(psms['db_idx'])
 
-    psms_ = np.zeros(len(psms), dtype=psms_dtype)
-    ions_ = np.zeros(np.sum(psms['hits'].astype('int')*len(LOSSES)), dtype=FRAG_DTYPE)
-    
-    ion_count = 0
-
-    for i in range(len(psms)):
-        query_idx = psms[i]["query_idx"]
-        db_idx = psms[i]["db_idx"]
-        query_idx_start = query_indices[query_idx]
-        query_idx_end = query_indices[query_idx + 1]
-        query_frag = query_frags[query_idx_start:query_idx_end]
-        query_int = query_ints[query_idx_start:query_idx_end]
-        db_frag = db_frags[db_indices[db_idx]:db_indices[db_idx+1]]
-        frag_type = frag_types[db_indices[db_idx]:db_indices[db_idx+1]]
-
-        if db_ints is None:
-            db_int = np.ones(len(db_frag))
-        else:
-            db_int = db_ints[i]
-
-        fragment_ions = get_hits(query_frag, query_int, db_frag, db_int, frag_type, mtol, ppm, LOSSES)
-        
-        psms_['mass_db'][i] = db_masses[db_idx]
-        
-        psms_['n_frags_db'][i] = len(db_frag)
-        
-        psms_['prec_offset'][i] = query_masses[query_idx] - db_masses[db_idx]
-        psms_['prec_offset_ppm'][i] = 2 * psms_['prec_offset'][i] / (query_masses[query_idx]  + db_masses[db_idx] ) * 1e6
-
-        psms_['prec_offset_raw'][i] = query_masses_raw[query_idx] - db_masses[db_idx]
-        psms_['prec_offset_raw_ppm'][i] = 2 * psms_['prec_offset_raw'][i] / (query_masses_raw[query_idx]  + db_masses[db_idx] ) * 1e6
-
-        ions_by = fragment_ions[fragment_ions['fragment_ion_type']==0]
-        ions_h2o = fragment_ions[fragment_ions['fragment_ion_type']==1]
-        ions_nh3 = fragment_ions[fragment_ions['fragment_ion_type']==2]
-
-        psms_['delta_m'][i] = np.mean(ions_by['fragment_ion_mass']-ions_by['db_mass'])
-        psms_['delta_m_ppm'][i] = np.mean(2 * psms_['delta_m'][i] / (ions_by['fragment_ion_mass']  + ions_by['db_mass'] ) * 1e6)
-
-        psms_['fragments_int_sum'][i] = np.sum(query_int)
-        psms_['fragments_matched_int_sum'][i] = np.sum(fragment_ions['fragment_ion_int'])
-        psms_['fragments_matched_int_ratio'][i] = psms_['fragments_matched_int_sum'][i] / psms_['fragments_int_sum'][i]
-        psms_['fragments_int_ratio'][i] = np.mean(fragment_ions['fragment_ion_int']/fragment_ions['db_int']) #3 is db_int, 2 is query_int
-
-        psms_['hits_b'][i] = np.sum(ions_by['ion_index']>0)
-        psms_['hits_y'][i] = np.sum(ions_by['ion_index']<0)
-
-        psms_['hits_b-H2O'][i] = np.sum(ions_h2o['ion_index']>0)
-        psms_['hits_y-H2O'][i] = np.sum(ions_h2o['ion_index']<0)
+    if db_ints is None:
+        db_ints = np.zeros(0, dtype=np.float64)
 
-        psms_['hits_b-NH3'][i] = np.sum(ions_nh3['ion_index']>0)
-        psms_['hits_y-NH3'][i] = np.sum(ions_nh3['ion_index']<0)
+    n_ions = np.zeros(n_psms, dtype=np.int64)
+    count_ions(range(n_psms), psms_query_idx, psms_db_idx, query_selection, query_indices, query_frags, db_indices, db_frags, mtol, ppm, LOSSES, n_ions)
 
-        n_fragments_matched = len(fragment_ions)
+    ion_offsets = np.zeros(n_psms + 1, dtype=np.int64)
+    ion_offsets[1:] = np.cumsum(n_ions)
 
-        psms_['n_fragments_matched'][i] = n_fragments_matched
-        psms_['fragment_ion_idx'][i] = ion_count
-        fragment_ions['psms_idx'][:] = i #Save psms index
-        
-        ions_[ion_count:ion_count+len(fragment_ions)] = fragment_ions
+    psms_ = np.zeros(n_psms, dtype=psms_dtype)
+    ions_ = np.zeros(ion_offsets[-1], dtype=FRAG_DTYPE)
 
-        ion_count += n_fragments_matched
-    
-    ions_ = ions_[:ion_count]
+    fill_score_columns(range(n_psms), psms_query_idx, psms_db_idx, query_masses, query_masses_raw, query_selection, query_indices, query_frags, query_ints, db_masses, db_indices, db_frags, db_ints, frag_types, mtol, ppm, LOSSES, ion_offsets, ions_, psms_)
 
     return psms_, ions_
 
-# %% ../nbs/05_search.ipynb 35
+# %% ../nbs/05_search.ipynb 56
 from numba.typed import Dict
 def get_sequences(psms: np.recarray, db_seqs:np.ndarray)-> np.ndarray:
     """Get sequences to add them to a recarray
@@ -625,7 +1330,7 @@ def get_sequences(psms: np.recarray, db_seqs:np.ndarray)-> np.ndarray:
 
     return sequence_list
 
-# %% ../nbs/05_search.ipynb 37
+# %% ../nbs/05_search.ipynb 58
 from typing import Union
 
 #This function is a wrapper and ist tested by the quick_test
@@ -676,7 +1381,17 @@ def get_score_columns(
     else:
         bruker = False
 
-    if isinstance(db_data, str):
+    compact = get_compact_database(db_data)
+
+    if compact is not None:
+        # Only the fragments of the PSMs are calculated
+        db_masses = read_database(db_data, array_name = 'precursors') if isinstance(db_data, str) else db_data['precursors']
+        selection = np.zeros(len(db_masses), dtype=np.bool_)
+        selection[psms['db_idx']] = True
+        db_frags, frag_types, db_indices = expand_compact_database(compact, selection)
+        db_ints = None
+
+    elif isinstance(db_data, str):
         db_masses = read_database(db_data, array_name = 'precursors')
         db_frags = read_database(db_data, array_name = 'fragmasses')
         db_indices = read_database(db_data, array_name = 'indices')
@@ -714,31 +1429,15 @@ def get_score_columns(
         if bruker:
             query_prec_id = query_prec_id[features['query_idx'].values]
 
-        query_selection = features['query_idx'].values
-        indices = np.zeros(len(query_selection) + 1, np.int64)
-        indices[1:] = np.diff(query_indices)[query_selection]
-        indices = np.cumsum(indices)
-        query_frags = np.concatenate(
-            [
-                query_frags[s: e] for s, e in zip(
-                    query_indices[query_selection], query_indices[query_selection + 1]
-                )
-            ]
-        )
-        query_ints = np.concatenate(
-            [
-                query_ints[s: e] for s, e in zip(
-                    query_indices[query_selection], query_indices[query_selection + 1]
-                )
-            ]
-        )
-        query_indices = indices
+        # Features point to their spectrum, no fragments are copied
+        query_selection = features['query_idx'].values.astype(np.int64)
     else:
         #TODO: This code is outdated, callin with features = None will crash.
         query_masses = query_data['prec_mass_list2']
         query_masses_raw = query_data['prec_mass_list2']
         query_mz = query_data['mono_mzs2']
         query_rt = query_data['rt_list_ms2']
+        query_selection = np.arange(len(query_masses))
 
     float_fields = ['mass_db','prec_offset', 'prec_offset_ppm', 'prec_offset_raw','prec_offset_raw_ppm','delta_m','delta_m_ppm','fragments_matched_int_ratio','fragments_int_ratio']
     int_fields = ['fragments_int_sum','fragments_matched_int_sum','n_fragments_matched','fragment_ion_idx', 'n_frags_db'] + [f'hits_{a}{_}' for _ in LOSS_DICT for a in ['b','y']]
@@ -752,6 +1451,7 @@ def get_score_columns(
         query_frags,
         query_ints,
         query_indices,
+        query_selection,
         db_masses,
         db_frags,
         frag_types,
@@ -807,7 +1507,7 @@ def get_score_columns(
 
     return psms, fragment_ions
 
-# %% ../nbs/05_search.ipynb 39
+# %% ../nbs/05_search.ipynb 60
 import matplotlib.pyplot as plt
 
 def plot_psms(index, ms_file):
@@ -823,7 +1523,7 @@ def plot_psms(index, ms_file):
     start = spectrum['fragment_ion_idx']
     end = spectrum['n_fragments_matched'] + start
 
-    query_data = ms_file.read_DDA_query_data()
+    query_data = ms_file.read_DDA_query_data(lazy=True)
     fragment_ions = ms_file.read(dataset_name="fragment_ions")
 
     ion = [('b'+str(int(_))).replace('b-','y') for _ in fragment_ions.iloc[start:end]['ion_index']]
@@ -865,8 +1565,9 @@ def plot_psms(index, ms_file):
     plt.title(figure_title)
     plt.show()
 
-# %% ../nbs/05_search.ipynb 42
+# %% ../nbs/05_search.ipynb 63
 import os
+import time
 import pandas as pd
 import copy
 import alphapept.io
@@ -900,10 +1601,89 @@ def store_hdf(df: pd.DataFrame, path: str, key:str, replace:bool=False, swmr:boo
             except KeyError: # File is created new
                 ms_file.write(df, dataset_name=key, swmr = swmr)
 
+def get_calibrated_search_settings(ms_file_:alphapept.io.MS_Data_File, search_settings:dict) -> (dict, bool):
+    """Gets the search settings with the calibrated tolerances of a file for the second search.
+
+    Args:
+        ms_file_ (alphapept.io.MS_Data_File): The ms_data file with the calibration.
+        search_settings (dict): The search settings.
+
+    Returns:
+        dict: A copy of the search settings with the calibrated tolerances.
+        bool: Flag whether the second search can be skipped.
+    """
+    search_settings = copy.deepcopy(search_settings)
+    skip = False
+
+    try:
+        calibration = float(ms_file_.read(group_name = 'features', dataset_name='corrected_mass', attr_name='estimated_max_precursor_ppm'))
+        if calibration == 0:
+            logging.info('Calibration is 0, skipping second database search.')
+            skip = True
+        else:
+            search_settings['prec_tol_calibrated'] = calibration*search_settings['calibration_std_prec']
+            calib = search_settings['prec_tol_calibrated']
+            logging.info(f"Found calibrated prec_tol with value {calib:.2f}")
+    except KeyError as e:
+        logging.info(f'{e}')
+
+    try:
+        fragment_std = float(ms_file_.read(dataset_name="estimated_max_fragment_ppm")[0])
+        skip = False 
+        search_settings['frag_tol_calibrated'] = fragment_std*search_settings['calibration_std_frag']
+        calib = search_settings['frag_tol_calibrated']
+        logging.info(f"Found calibrated frag_tol with value {calib:.2f}")
+    except KeyError as e:
+        logging.info(f'{e}')
+
+    return search_settings, skip
+
 #This function is a wrapper and ist tested by the quick_test
+def get_query_mass_range(query_data:dict, features:pd.DataFrame, prec_tol:float, ppm:bool, prec_tol_calibrated:float = None, open_search:bool = False, open_search_window:float = 500, **kwargs) -> (float, float):
+    """Get the range of database precursor masses that can match the queries, see `get_psms`.
+
+    Args:
+        query_data (dict): Data structure containing the query data.
+        features (pd.DataFrame): Pandas dataframe containing feature data.
+        prec_tol (float): Precursor tolerance for search.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        prec_tol_calibrated (float, optional): Precursor tolerance if calibration exists. Defaults to None.
+        open_search (bool): Flag to perform an open search with a wide precursor window. Defaults to False.
+        open_search_window (float): Precursor window in Dalton for the open search. Defaults to 500.
+
+    Returns:
+        (float, float): Lower and upper bound of the precursor masses.
+    """
+    if features is not None:
+        if prec_tol_calibrated:
+            query_masses = features['corrected_mass'].values
+        else:
+            query_masses = features['mass_matched'].values
+    else:
+        query_masses = query_data['prec_mass_list2']
+
+    if prec_tol_calibrated:
+        prec_tol = prec_tol_calibrated
+
+    if len(query_masses) == 0:
+        return 0.0, 0.0
+
+    mass_min, mass_max = np.min(query_masses), np.max(query_masses)
+
+    if open_search:
+        return mass_min - open_search_window, mass_max + open_search_window
+    elif ppm:
+        return mass_min - ppm_to_dalton(mass_min, prec_tol), mass_max + ppm_to_dalton(mass_max, prec_tol)
+    else:
+        return mass_min - prec_tol, mass_max + prec_tol
+
+
 def search_db(to_process:tuple, callback:Callable = None, parallel:bool=False, first_search:bool = True) -> Union[bool, str]:
     """Wrapper function to perform database search to be used by a parallel pool.
 
+    If the `reduced_database` setting is enabled, the second search is performed against a database reduced to the peptides of the first search, see `get_reduced_database`.
+    Otherwise, only the database entries in the precursor mass range of the file are read, see `alphapept.fasta.read_database_slice`.
+
     Args:
         to_process (tuple): Tuple containing an index to the file and the experiment settings.
         callback (Callable, optional): Callback function to indicate progress. Defaults to None.
@@ -928,41 +1708,51 @@ def search_db(to_process:tuple, callback:Callable = None, parallel:bool=False, f
         )
 
         if not first_search:
-            try:
-                calibration = float(ms_file_.read(group_name = 'features', dataset_name='corrected_mass', attr_name='estimated_max_precursor_ppm'))
-                if calibration == 0:
-                    logging.info('Calibration is 0, skipping second database search.')
-                    skip = True
-                else:
-                    settings['search']['prec_tol_calibrated'] = calibration*settings['search']['calibration_std_prec']
-                    calib = settings['search']['prec_tol_calibrated']
-                    logging.info(f"Found calibrated prec_tol with value {calib:.2f}")
-            except KeyError as e:
-                logging.info(f'{e}')
+            settings['search'], skip = get_calibrated_search_settings(ms_file_, settings['search'])
 
-            try:
-                fragment_std = float(ms_file_.read(dataset_name="estimated_max_fragment_ppm")[0])
-                skip = False 
-                settings['search']['frag_tol_calibrated'] = fragment_std*settings['search']['calibration_std_frag']
-                calib = settings['search']['frag_tol_calibrated']
-                logging.info(f"Found calibrated frag_tol with value {calib:.2f}")
-            except KeyError as e:
-                logging.info(f'{e}')                
-     
         if not skip:
             db_data_path = settings['experiment']['database_path']
 
     #         TODO calibrated_fragments should be included in settings
             query_data = ms_file_.read_DDA_query_data(
                 calibrated_fragments=True,
+                lazy=True,
                 database_file_name=settings['experiment']['database_path']
             )
 
             features = ms_file_.read(dataset_name="features")
 
-            psms, num_specs_compared = get_psms(query_data, db_data_path, features, **settings["search"])
+            db_data = db_data_path
+            reduced_idx = None
+
+            if not first_search and settings['search']['reduced_database']:
+                try:
+                    first_search_db_idx = ms_file_.read(dataset_name='first_search')['db_idx'].values
+                    if settings['search']['reduced_database_neighbours']:
+                        pept_dict = alphapept.fasta.read_pept_dict(db_data_path)
+                    else:
+                        pept_dict = None
+                    db_data, reduced_idx = get_reduced_database(db_data_path, first_search_db_idx, pept_dict, **settings['fasta'])
+                except KeyError as e:
+                    logging.info(f'No first search results found, searching the full database. {e}')
+
+            if reduced_idx is None:
+                mass_min, mass_max = get_query_mass_range(query_data, features, **settings['search'])
+                db_data, db_idx = alphapept.fasta.read_database_slice(db_data_path, mass_min, mass_max)
+                logging.info(f'Read {len(db_idx):,} database entries in the precursor mass range from {mass_min:.2f} to {mass_max:.2f}.')
+            else:
+                db_idx = reduced_idx
+
+            start = time.time()
+
+            psms, num_specs_compared = get_psms(query_data, db_data, features, **settings["search"])
             if len(psms) > 0:
-                psms, fragment_ions = get_score_columns(psms, query_data, db_data_path, features, **settings["search"])
+                psms, fragment_ions = get_score_columns(psms, query_data, db_data, features, **settings["search"])
+
+                # Report the indices of the full database
+                psms['db_idx'] = db_idx[psms['db_idx']]
+
+                search_time = time.time() - start
 
                 if first_search:
                     logging.info('Saving first_search results to {}'.format(ms_file))
@@ -973,6 +1763,14 @@ def search_db(to_process:tuple, callback:Callable = None, parallel:bool=False, f
 
                 store_hdf(pd.DataFrame(psms), ms_file_, save_field, replace=True)
                 store_hdf(pd.DataFrame.from_records(fragment_ions), ms_file_, 'fragment_ions', replace=True)
+                alphapept.io.MS_Data_File(ms_file, is_overwritable=True).write(search_time, dataset_name=save_field, attr_name='search_time')
+
+                if reduced_idx is not None:
+                    try:
+                        first_search_time = float(ms_file_.read(dataset_name='first_search', attr_name='search_time'))
+                        logging.info(f'Search against reduced database took {search_time:.2f} s instead of {first_search_time:.2f} s for the first search ({first_search_time - search_time:.2f} s saved).')
+                    except KeyError:
+                        logging.info(f'Search against reduced database took {search_time:.2f} s.')
             else:
                 logging.info('No psms found.')
 
@@ -982,8 +1780,402 @@ def search_db(to_process:tuple, callback:Callable = None, parallel:bool=False, f
         logging.error(f'Search of file {file_name} failed. Exception {e}.')
         return f"{e}" #Can't return exception object, cast as string
 
-# %% ../nbs/05_search.ipynb 44
-from .fasta import blocks, generate_peptides, add_to_pept_dict
+# %% ../nbs/05_search.ipynb 66
+from .fasta import get_decoy_sequence, get_target_sequences, PeptideMap
+
+def get_reduced_database(db_data: Union[dict, str], db_idx: np.ndarray, pept_dict: PeptideMap = None, pseudo_reverse: bool = False, AL_swap: bool = False, KR_swap: bool = False, **kwargs) -> (dict, np.ndarray):
+    """Creates an in-memory database that only contains the peptides that scored in a previous search.
+    Besides the scored peptides, all isoforms with the same naked sequence, the decoys of the scored targets and the targets of the scored decoys are included.
+    The fragments of a compact database are only calculated for the selected entries.
+
+    Args:
+        db_data (Union[dict, str]): Data structure containing the database data or path to database.
+        db_idx (np.ndarray): Database indices of the scored peptides.
+        pept_dict (PeptideMap, optional): Peptide map. If passed, all peptides of the proteins of the scored peptides are included. Defaults to None.
+        pseudo_reverse (bool, optional): Decoy setting of the database, see `get_decoy_sequence`. Defaults to False.
+        AL_swap (bool, optional): Decoy setting of the database, see `get_decoy_sequence`. Defaults to False.
+        KR_swap (bool, optional): Decoy setting of the database, see `get_decoy_sequence`. Defaults to False.
+
+    Returns:
+        dict: The reduced database with the same arrays as the database.
+        np.ndarray: Indices of the entries of the reduced database in the database.
+    """
+    if isinstance(db_data, str):
+        db_seqs = read_database(db_data, array_name = 'seqs').astype(str)
+    else:
+        db_seqs = np.asarray(db_data['seqs']).astype(str)
+
+    db_naked = pd.Series(db_seqs).str.replace('[^A-Z]', '', regex=True).values
+
+    scored = np.unique(db_idx)
+    scored_seqs = db_seqs[scored]
+
+    naked = set(db_naked[scored])
+    # Decoys are generated from the naked target sequence and end with the lowercase '_decoy' tag
+    for seq, naked_seq in zip(scored_seqs, db_naked[scored]):
+        if not seq[-1].islower():
+            naked.add(get_decoy_sequence(naked_seq, pseudo_reverse, AL_swap, KR_swap))
+        else:
+            naked.update(get_target_sequences(naked_seq, pseudo_reverse, AL_swap, KR_swap))
+
+    selected = np.isin(db_naked, list(naked))
+
+    if pept_dict is not None:
+        if isinstance(pept_dict, dict):
+            pept_dict = PeptideMap.from_dict(pept_dict)
+        scored_pept_idx = pept_dict.get_idx(scored_seqs)
+        proteins = pept_dict.get_protein_pairs(idx=scored_pept_idx[scored_pept_idx >= 0])[1]
+        # Peptides that share a protein with a scored peptide
+        peptides, pept_proteins = pept_dict.to_pairs()
+        neighbours = np.unique(peptides[np.isin(pept_proteins, proteins)])
+        selected |= np.isin(db_seqs, neighbours)
+
+    reduced_idx = np.flatnonzero(selected)
+
+    reduced_db = {'seqs': db_seqs[reduced_idx]}
+    compact = get_compact_database(db_data)
+    if compact is not None:
+        # Only the fragments of the selected entries are calculated
+        reduced_db['fragmasses'], reduced_db['fragtypes'], reduced_db['indices'] = expand_compact_database(compact, selected)
+    for array_name in ['precursors', 'indices', 'fragmasses', 'fragtypes', 'db_ints']:
+        if array_name in reduced_db:
+            continue
+        try:
+            if isinstance(db_data, str):
+                reduced_db[array_name] = read_database(db_data, array_name = array_name)
+            else:
+                reduced_db[array_name] = db_data[array_name]
+        except KeyError:
+            pass
+
+    # Fragments of the selected entries are gathered to a new contiguous block
+    db_indices = reduced_db['indices']
+    starts = db_indices[:-1][reduced_idx]
+    lens = db_indices[1:][reduced_idx] - starts
+    indices = np.zeros(len(reduced_idx) + 1, dtype=np.int64)
+    indices[1:] = np.cumsum(lens)
+    frag_idx = np.repeat(starts - indices[:-1], lens) + np.arange(indices[-1])
+
+    reduced_db['precursors'] = reduced_db['precursors'][reduced_idx]
+    reduced_db['indices'] = indices
+    for array_name in ['fragmasses', 'fragtypes', 'db_ints']:
+        if array_name in reduced_db:
+            reduced_db[array_name] = reduced_db[array_name][frag_idx]
+
+    logging.info(f'Reduced database to {len(reduced_idx):,} of {len(db_seqs):,} entries.')
+
+    return reduced_db, reduced_idx
+
+# %% ../nbs/05_search.ipynb 69
+from .fasta import COMPACT_DATABASE_ARRAYS
+
+QUERY_SPECTRUM_KEYS = ['charge2', 'scan_list_ms2', 'prec_id2', 'prec_mass_list2', 'mono_mzs2', 'rt_list_ms2']
+
+def concat_query_data(query_data_list:list, features_list:list) -> (dict, pd.DataFrame, np.ndarray):
+    """Concatenates the MS2 query data and features of several files to search them in one batch.
+
+    Args:
+        query_data_list (list): List of query data dictionaries, see `read_DDA_query_data`.
+        features_list (list): List of feature dataframes, in the same order as the query data.
+
+    Returns:
+        dict: Query data with the concatenated MS2 spectra.
+        pd.DataFrame: Concatenated features with an additional `file_id` column and query_idx pointing to the concatenated spectra.
+        np.ndarray: Offsets of the spectra of each file in the concatenated query data.
+    """
+    n_spectra = [len(_["indices_ms2"]) - 1 for _ in query_data_list]
+    spectrum_offsets = np.zeros(len(n_spectra) + 1, dtype=np.int64)
+    spectrum_offsets[1:] = np.cumsum(n_spectra)
+
+    indices_ms2 = [np.zeros(1, dtype=np.int64)]
+    offset = 0
+    for query_data in query_data_list:
+        indices_ms2.append(query_data["indices_ms2"][1:] + offset)
+        offset += query_data["indices_ms2"][-1]
+
+    batch_query_data = {}
+    batch_query_data["indices_ms2"] = np.concatenate(indices_ms2)
+    for key in ['mass_list_ms2', 'int_list_ms2'] + QUERY_SPECTRUM_KEYS:
+        if all(key in _ for _ in query_data_list):
+            batch_query_data[key] = np.concatenate([_[key] for _ in query_data_list])
+
+    batch_features = []
+    for file_id, features in enumerate(features_list):
+        features = features.copy()
+        features['file_id'] = file_id
+        features['query_idx'] += spectrum_offsets[file_id]
+        batch_features.append(features)
+    batch_features = pd.concat(batch_features, ignore_index=True)
+
+    return batch_query_data, batch_features, spectrum_offsets
+
+
+@alphapept.performance.performance_function
+def rescore_psms(psm_idx:int, psms_query_idx:np.ndarray, psms_db_idx:np.ndarray, query_masses:np.ndarray, query_indices:np.ndarray, query_selection:np.ndarray, query_frags:np.ndarray, query_ints:np.ndarray, db_masses:np.ndarray, db_indices:np.ndarray, db_frags:np.ndarray, frag_tols:np.ndarray, ppm:bool, open_search:bool, hits:np.ndarray):
+    """Recalculates the hits of a PSM at its own fragment tolerance.
+    The hits are the same as the ones of `compare_spectrum_parallel` or, for an open search, of `compare_spectrum_open_search`.
+
+    Args:
+        psm_idx (int): Index of the PSM.
+        psms_query_idx (np.ndarray): Array with the query index of each PSM.
+        psms_db_idx (np.ndarray): Array with the database index of each PSM.
+        query_masses (np.ndarray): Array with query masses.
+        query_indices (np.ndarray): Array with indices to the query data.
+        query_selection (np.ndarray): Array that maps each query to its spectrum in query_indices.
+        query_frags (np.ndarray): Array with frag types of the query data.
+        query_ints (np.ndarray): Array with fragment intensities from the query.
+        db_masses (np.ndarray): Array with database masses.
+        db_indices (np.ndarray): Array with indices to the database array.
+        db_frags (np.ndarray): Array with database fragments.
+        frag_tols (np.ndarray): Array with the fragment tolerance of each PSM.
+        ppm (bool): Flag to use ppm instead of Dalton.
+        open_search (bool): Flag to score the fragments with and without the precursor mass difference.
+        hits (np.ndarray): Reporting array that stores the hits of each PSM.
+    """
+    query_idx = psms_query_idx[psm_idx]
+    db_idx = psms_db_idx[psm_idx]
+
+    spectrum_idx = query_selection[query_idx]
+    query_frag = query_frags[query_indices[spectrum_idx]:query_indices[spectrum_idx + 1]]
+    query_int = query_ints[query_indices[spectrum_idx]:query_indices[spectrum_idx + 1]]
+    db_frag = db_frags[db_indices[db_idx]:db_indices[db_idx + 1]]
+
+    query_int_sum = 0
+    for qi in query_int:
+        query_int_sum += qi
+
+    if open_search:
+        hits[psm_idx] = score_candidate_shifted(query_frag, query_int, query_int_sum, db_frag, query_masses[query_idx] - db_masses[db_idx], frag_tols[psm_idx], ppm)
+    else:
+        hits[psm_idx] = score_candidate(query_frag, query_int, query_int_sum, db_frag, frag_tols[psm_idx], ppm)
+
+
+def get_batch_search_settings(search_settings_list:list) -> dict:
+    """Gets the settings to search a batch of files at once: the largest precursor and fragment tolerance of the files.
+    All files of a batch need to be either calibrated or not, as this selects the query masses, see `get_psms`.
+
+    Args:
+        search_settings_list (list): List with the search settings of each file, see `get_calibrated_search_settings`.
+
+    Returns:
+        dict: The search settings of the batch.
+    """
+    batch_settings = copy.deepcopy(search_settings_list[0])
+
+    if batch_settings.get('prec_tol_calibrated'):
+        batch_settings['prec_tol_calibrated'] = max(_['prec_tol_calibrated'] for _ in search_settings_list)
+    else:
+        batch_settings['prec_tol'] = max(_['prec_tol'] for _ in search_settings_list)
+
+    batch_settings['frag_tol_calibrated'] = max(_.get('frag_tol_calibrated') or _['frag_tol'] for _ in search_settings_list)
+
+    return batch_settings
+
+
+def score_batch_psms(psms:np.recarray, query_data:dict, db_data:dict, features:pd.DataFrame, spectrum_offsets:np.ndarray, search_settings_list:list) -> list:
+    """Filters and scores the PSMs of a batch search per file.
+    The batch is searched at the largest tolerances of its files, see `get_batch_search_settings`.
+    Each PSM is then kept only if its precursor matches within the tolerance of its file and its hits, recalculated at the fragment tolerance of its file, exceed `min_frag_hits`.
+    The PSMs of a file are the same as for a search of the file alone, unless a candidate was pushed out of the `top_n` by a candidate that only matches at the larger tolerance.
+    The score columns are extracted with the settings of each file and all indices are shifted to be relative to the file.
+
+    Args:
+        psms (np.recarray): Recordarray containing the PSMs of the batch, see `get_psms`.
+        query_data (dict): Query data of the batch, see `concat_query_data`.
+        db_data (dict): Data structure containing the database data.
+        features (pd.DataFrame): Concatenated features with `file_id` column, see `concat_query_data`.
+        spectrum_offsets (np.ndarray): Offsets of the spectra of each file, see `concat_query_data`.
+        search_settings_list (list): List with the search settings of each file.
+
+    Returns:
+        list: A list with a tuple of PSMs and fragment ions for each file.
+    """
+    n_files = len(spectrum_offsets) - 1
+    batch_file_ids = features['file_id'].values
+    feature_offsets = np.searchsorted(batch_file_ids, np.arange(n_files + 1))
+
+    ppm = search_settings_list[0]['ppm']
+    open_search = search_settings_list[0].get('open_search', False)
+    prec_tols = np.array([_.get('prec_tol_calibrated') or _['prec_tol'] for _ in search_settings_list], dtype=np.float64)
+    frag_tols = np.array([_.get('frag_tol_calibrated') or _['frag_tol'] for _ in search_settings_list], dtype=np.float64)
+    min_frag_hits = np.array([_['min_frag_hits'] for _ in search_settings_list], dtype=np.float64)
+
+    if search_settings_list[0].get('prec_tol_calibrated'):
+        query_masses = features['corrected_mass'].values
+    else:
+        query_masses = features['mass_matched'].values
+
+    compact = get_compact_database(db_data)
+    if compact is not None:
+        # Only the fragments of the PSMs are calculated, once for all files
+        selection = np.zeros(len(db_data['precursors']), dtype=np.bool_)
+        selection[psms['db_idx']] = True
+        db_data = {key: db_data[key] for key in db_data if key not in COMPACT_DATABASE_ARRAYS}
+        db_data['fragmasses'], db_data['fragtypes'], db_data['indices'] = expand_compact_database(compact, selection)
+
+    file_ids = batch_file_ids[psms['query_idx']]
+    keep = np.ones(len(psms), dtype=np.bool_)
+
+    if not open_search:
+        psms_query_masses = query_masses[psms['query_idx']]
+        prec_offset = np.abs(psms_query_masses - db_data['precursors'][psms['db_idx']])
+        if ppm:
+            keep &= prec_offset <= ppm_to_dalton(psms_query_masses, prec_tols[file_ids])
+        else:
+            keep &= prec_offset <= prec_tols[file_ids]
+
+    if np.any(frag_tols != frag_tols.max()):
+        hits = np.zeros(len(psms), dtype=np.float64)
+        rescore_psms(range(len(psms)), np.ascontiguousarray(psms['query_idx']), np.ascontiguousarray(psms['db_idx']), query_masses, query_data['indices_ms2'], features['query_idx'].values.astype(np.int64), query_data['mass_list_ms2'], query_data['int_list_ms2'], db_data['precursors'], db_data['indices'], db_data['fragmasses'], frag_tols[file_ids], ppm, open_search, hits)
+        psms['hits'] = hits
+        keep &= hits > min_frag_hits[file_ids]
+
+    logging.info(f'Kept {keep.sum():,} of {len(psms):,} psms at the tolerances of the files.')
+
+    results = []
+    for file_id, search_settings in enumerate(search_settings_list):
+        psms_ = psms[keep & (file_ids == file_id)]
+        if len(psms_) == 0:
+            results.append((psms_, np.zeros(0, dtype=FRAG_DTYPE)))
+            continue
+
+        psms_, fragment_ions_ = get_score_columns(psms_, query_data, db_data, features, **search_settings)
+
+        psms_['query_idx'] -= feature_offsets[file_id]
+        psms_['raw_idx'] -= spectrum_offsets[file_id]
+
+        results.append((psms_, fragment_ions_))
+
+    return results
+
+
+def search_db_batch(settings:dict, first_search:bool = True, callback:Callable = None) -> dict:
+    """Searches the files of an experiment in batches against a database that is loaded once.
+    The files of a batch are concatenated with `concat_query_data` and searched with a single call of `get_psms` at the largest tolerances of the files.
+    The PSMs are then filtered and scored with the tolerances of each file, see `score_batch_psms`.
+    A compact database stays compact, its fragments are calculated by the search and for the PSMs only.
+
+    Args:
+        settings (dict): The experiment settings.
+        first_search (bool, optional): Flag to indicate this is the first search. Defaults to True.
+        callback (Callable, optional): Callback function to indicate progress. Defaults to None.
+
+    Returns:
+        dict: The settings, files where the search failed are added to `settings['failed']`.
+    """
+    files = settings['experiment']['file_paths']
+    db_data_path = settings['experiment']['database_path']
+    batch_size = settings['search']['batch_search_size']
+
+    if 'failed' not in settings:
+        settings['failed'] = {}
+    failed = []
+
+    if alphapept.fasta.is_compact_database(db_data_path):
+        array_names = ['precursors', 'seqs'] + COMPACT_DATABASE_ARRAYS
+    else:
+        array_names = ['precursors', 'seqs', 'fragmasses', 'fragtypes', 'indices', 'db_ints']
+
+    db_data = {}
+    for array_name in array_names:
+        try:
+            db_data[array_name] = read_database(db_data_path, array_name = array_name)
+        except KeyError:
+            pass
+    db_data['seqs'] = db_data['seqs'].astype(str)
+
+    # The fragment index of a flat database is memory-mapped once for all batches
+    fragment_index = alphapept.fasta.read_fragment_index(db_data_path)
+    if fragment_index is not None:
+        db_data.update(fragment_index)
+
+    # Calibrated and uncalibrated files use different query masses and are searched in separate batches
+    groups = {}
+    for file_id, file_name in enumerate(files):
+        base_file_name, ext = os.path.splitext(file_name)
+        ms_file_ = alphapept.io.MS_Data_File(base_file_name+".ms_data.hdf")
+
+        search_settings, skip = settings['search'], False
+        if not first_search:
+            search_settings, skip = get_calibrated_search_settings(ms_file_, settings['search'])
+
+        if skip:
+            continue
+
+        key = bool(search_settings.get('prec_tol_calibrated'))
+        groups.setdefault(key, []).append((file_id, search_settings))
+
+    batches = [group[i:i + batch_size] for group in groups.values() for i in range(0, len(group), batch_size)]
+
+    save_field = 'first_search' if first_search else 'second_search'
+
+    for batch_idx, batch in enumerate(batches):
+        file_ids = [_[0] for _ in batch]
+        search_settings_list = [_[1] for _ in batch]
+        search_settings = get_batch_search_settings(search_settings_list)
+
+        ms_files = [alphapept.io.MS_Data_File(os.path.splitext(files[_])[0]+".ms_data.hdf") for _ in file_ids]
+        logging.info(f'Searching batch {batch_idx+1} of {len(batches)} with {len(file_ids)} files.')
+
+        try:
+            query_data, features, spectrum_offsets = concat_query_data(
+                [_.read_DDA_query_data(calibrated_fragments=True, lazy=True, database_file_name=db_data_path) for _ in ms_files],
+                [_.read(dataset_name="features") for _ in ms_files]
+            )
+
+            db_data_ = db_data
+            reduced_idx = None
+
+            if not first_search and search_settings['reduced_database']:
+                try:
+                    first_search_db_idx = np.concatenate([_.read(dataset_name='first_search')['db_idx'].values for _ in ms_files])
+                    if search_settings['reduced_database_neighbours']:
+                        pept_dict = alphapept.fasta.read_pept_dict(db_data_path)
+                    else:
+                        pept_dict = None
+                    db_data_, reduced_idx = get_reduced_database(db_data, first_search_db_idx, pept_dict, **settings['fasta'])
+                except KeyError as e:
+                    logging.info(f'No first search results found, searching the full database. {e}')
+
+            start = time.time()
+
+            psms, num_specs_compared = get_psms(query_data, db_data_, features, **search_settings)
+            if len(psms) > 0:
+                results = score_batch_psms(psms, query_data, db_data_, features, spectrum_offsets, search_settings_list)
+
+                search_time = time.time() - start
+                logging.info(f'Search of batch {batch_idx+1} with {len(features):,} features took {search_time:.2f} s.')
+
+                for ms_file_, (psms_, fragment_ions_) in zip(ms_files, results):
+                    if len(psms_) == 0:
+                        logging.info(f'No psms found for {ms_file_.file_name}.')
+                        continue
+                    if reduced_idx is not None:
+                        psms_['db_idx'] = reduced_idx[psms_['db_idx']]
+                    logging.info(f'Saving {save_field} results to {ms_file_.file_name}')
+                    store_hdf(pd.DataFrame(psms_), ms_file_, save_field, replace=True)
+                    store_hdf(pd.DataFrame.from_records(fragment_ions_), ms_file_, 'fragment_ions', replace=True)
+                    alphapept.io.MS_Data_File(ms_file_.file_name, is_overwritable=True).write(search_time, dataset_name=save_field, attr_name='search_time')
+            else:
+                logging.info('No psms found.')
+
+        except Exception as e:
+            logging.error(f'Search of batch {batch_idx+1} failed. Exception {e}.')
+            failed.extend([files[_] for _ in file_ids])
+
+        if callback:
+            callback((batch_idx+1)/len(batches))
+
+    if 'search_db' not in settings['failed']:
+        settings['failed']['search_db'] = failed
+    else:
+        settings['failed']['search_db_2'] = failed
+
+    return settings
+
+
+# %% ../nbs/05_search.ipynb 72
+from .fasta import blocks, digest_sequences, get_digestion_cache, get_peptide_map
 from .io import list_to_numpy_f32
 from .fasta import block_idx, generate_fasta_list, generate_spectra, check_peptide
 from . import constants
@@ -1009,23 +2201,12 @@ def search_fasta_block(to_process:tuple) -> (list, int):
 
         settings_ = settings[0]
         spectra_block = settings_['fasta']['spectra_block']
-        to_add = List()
-
         psms_container = [list() for _ in ms_files]
 
-        f_index = 0
-
-        pept_dict = {}
-        for element in fasta_block:
-            sequence = element["sequence"]
-            mod_peptides = generate_peptides(sequence, **settings_['fasta'])
-
-            pept_dict, added_peptides = add_to_pept_dict(pept_dict, mod_peptides, fasta_index+f_index)
-
-            if len(added_peptides) > 0:
-                to_add.extend(added_peptides)
-
-            f_index += 1
+        cache = get_digestion_cache(settings_['fasta'])
+        all_mod_peptides = digest_sequences([element["sequence"] for element in fasta_block], cache=cache, **settings_['fasta'])
+        cache.log()
+        to_add, pept_dict = get_peptide_map(all_mod_peptides, fasta_index)
 
 
         if len(to_add) > 0:
@@ -1070,7 +2251,7 @@ def search_fasta_block(to_process:tuple) -> (list, int):
                 for file_idx, ms_file in enumerate(ms_files):
                     query_data = alphapept.io.MS_Data_File(
                         f"{ms_file}"
-                    ).read_DDA_query_data(swmr=True)
+                    ).read_DDA_query_data(swmr=True, lazy=True)
 
                     try:
                         features = alphapept.io.MS_Data_File(
@@ -1087,7 +2268,7 @@ def search_fasta_block(to_process:tuple) -> (list, int):
                         #This could be speed up..
                         psms, fragment_ions = get_score_columns(psms, query_data, db_data, features, **settings[file_idx]["search"])
 
-                        fasta_indices = [set(x for x in pept_dict[_]) for _ in psms['sequence']]
+                        fasta_indices = pept_dict.get_proteins(psms['sequence'])
 
                         psms_df = pd.DataFrame(psms)
                         psms_df['fasta_index'] = fasta_indices
@@ -1102,7 +2283,7 @@ def search_fasta_block(to_process:tuple) -> (list, int):
     
     return psms_container, len(to_add), success
 
-# %% ../nbs/05_search.ipynb 45
+# %% ../nbs/05_search.ipynb 73
 def filter_top_n(temp:pd.DataFrame, top_n:int = 10)-> pd.DataFrame:
     """Takes a dataframe and keeps only the top n entries (based on hits).
     Combines fasta indices for sequences.
@@ -1136,10 +2317,187 @@ def filter_top_n(temp:pd.DataFrame, top_n:int = 10)-> pd.DataFrame:
     return temp
 
 
-# %% ../nbs/05_search.ipynb 47
+# %% ../nbs/05_search.ipynb 75
+import itertools
+
+@njit
+def insert_top_n_psms(raw_idx:np.ndarray, pept_id:np.ndarray, hits:np.ndarray, feature_idx:np.ndarray, record_idx:np.ndarray, slot_hits:np.ndarray, slot_pept:np.ndarray, slot_feature:np.ndarray, slot_record:np.ndarray):
+    """Inserts PSMs into top-n slots per raw_idx that are sorted by hits.
+    PSMs with the same peptide, hits and feature as an existing entry are skipped.
+
+    Args:
+        raw_idx (np.ndarray): Array with the raw_idx of the PSMs.
+        pept_id (np.ndarray): Array with integer ids of the peptide sequences.
+        hits (np.ndarray): Array with the hits of the PSMs.
+        feature_idx (np.ndarray): Array with the feature_idx of the PSMs.
+        record_idx (np.ndarray): Array with indices to the stored records of the PSMs.
+        slot_hits (np.ndarray): (n_raw x top_n) array with the hits of the slots.
+        slot_pept (np.ndarray): (n_raw x top_n) array with the peptide ids of the slots.
+        slot_feature (np.ndarray): (n_raw x top_n) array with the feature_idx of the slots.
+        slot_record (np.ndarray): (n_raw x top_n) array with the record indices of the slots. Empty slots are -1.
+    """
+    top_n = slot_hits.shape[1]
+
+    for i in range(len(raw_idx)):
+        r = raw_idx[i]
+
+        duplicate = False
+        for k in range(top_n):
+            if slot_record[r, k] == -1:
+                break
+            if slot_pept[r, k] == pept_id[i] and slot_hits[r, k] == hits[i] and slot_feature[r, k] == feature_idx[i]:
+                duplicate = True
+                break
+
+        if duplicate:
+            continue
+
+        for k in range(top_n):
+            if slot_record[r, k] == -1 or slot_hits[r, k] < hits[i]:
+                for m in range(top_n - 1, k, -1):
+                    slot_hits[r, m] = slot_hits[r, m-1]
+                    slot_pept[r, m] = slot_pept[r, m-1]
+                    slot_feature[r, m] = slot_feature[r, m-1]
+                    slot_record[r, m] = slot_record[r, m-1]
+
+                slot_hits[r, k] = hits[i]
+                slot_pept[r, k] = pept_id[i]
+                slot_feature[r, k] = feature_idx[i]
+                slot_record[r, k] = record_idx[i]
+                break
+
+
+class TopNAccumulator():
+    """Keeps the top-n PSMs per raw_idx for results that arrive in blocks, e.g. from `search_fasta_block`.
+
+    The PSMs are stored in fixed-size (n_raw x top_n) slots that are updated in place.
+    Proteins are stored as arrays of (peptide id, protein id) pairs and merged per peptide sequence with np.unique.
+    Records, peptides and proteins that are no longer referenced by a slot are removed regularly,
+    so that memory is bounded by the number of slots and does not grow with the number of blocks.
+
+    Attributes:
+        top_n (int): Number of top-n entries to be kept per raw_idx.
+    """
+    def __init__(self, top_n:int = 10):
+        self.top_n = top_n
+
+        self.slot_hits = np.zeros((0, top_n), dtype=np.float64)
+        self.slot_pept = np.zeros((0, top_n), dtype=np.int64)
+        self.slot_feature = np.zeros((0, top_n), dtype=np.int64)
+        self.slot_record = np.zeros((0, top_n), dtype=np.int64)
+
+        self.records = []
+        self.n_records = 0
+
+        self.pept_ids = {}
+        self.n_pept = 0
+        self.protein_pept = []
+        self.protein_idx = []
+
+    def _resize(self, n_raw:int):
+        n_raw_old = len(self.slot_hits)
+        if n_raw > n_raw_old:
+            n_new = n_raw - n_raw_old
+            self.slot_hits = np.vstack([self.slot_hits, np.zeros((n_new, self.top_n), dtype=np.float64)])
+            self.slot_pept = np.vstack([self.slot_pept, np.zeros((n_new, self.top_n), dtype=np.int64)])
+            self.slot_feature = np.vstack([self.slot_feature, np.zeros((n_new, self.top_n), dtype=np.int64)])
+            self.slot_record = np.vstack([self.slot_record, np.zeros((n_new, self.top_n), dtype=np.int64)-1])
+
+    def _merge_proteins(self)->(np.ndarray, np.ndarray):
+        """Concatenates the protein arrays and removes duplicate pairs.
+
+        Returns:
+            np.ndarray: Peptide ids, sorted.
+            np.ndarray: Protein ids, sorted per peptide id.
+        """
+        protein_pept = np.concatenate(self.protein_pept)
+        protein_idx = np.concatenate(self.protein_idx)
+        n_proteins = protein_idx.max() + 1 if len(protein_idx) > 0 else 1
+        pairs = np.unique(protein_pept * n_proteins + protein_idx)
+
+        return pairs // n_proteins, pairs % n_proteins
+
+    def _compact(self):
+        """Removes records and peptides that are not referenced by a slot."""
+        occupied = self.slot_record != -1
+
+        records = np.concatenate(self.records)
+        self.records = [records[self.slot_record[occupied]]]
+        self.slot_record[occupied] = np.arange(occupied.sum())
+        self.n_records = len(self.records[0])
+
+        pept_ids, new_ids = np.unique(self.slot_pept[occupied], return_inverse=True)
+        sequences = {v: k for k, v in self.pept_ids.items()}
+        self.pept_ids = {sequences[_]: i for i, _ in enumerate(pept_ids)}
+        self.n_pept = len(pept_ids)
+        self.slot_pept[occupied] = new_ids
+
+        protein_pept, protein_idx = self._merge_proteins()
+        referenced = np.isin(protein_pept, pept_ids)
+        self.protein_pept = [np.searchsorted(pept_ids, protein_pept[referenced])]
+        self.protein_idx = [protein_idx[referenced]]
+
+    def add(self, psms:pd.DataFrame):
+        """Adds a block of PSMs.
+
+        Args:
+            psms (pd.DataFrame): Pandas DataFrame containing PSMs with the columns raw_idx, sequence, hits, feature_idx and fasta_index (protein ids of each PSM).
+        """
+        if len(psms) == 0:
+            return
+
+        pept_id = np.zeros(len(psms), dtype=np.int64)
+        for i, sequence in enumerate(psms['sequence'].values):
+            if sequence not in self.pept_ids:
+                self.pept_ids[sequence] = self.n_pept
+                self.n_pept += 1
+            pept_id[i] = self.pept_ids[sequence]
+
+        fasta_index = psms['fasta_index'].values
+        n_proteins = np.fromiter((len(_) for _ in fasta_index), dtype=np.int64, count=len(fasta_index))
+        self.protein_pept.append(np.repeat(pept_id, n_proteins))
+        self.protein_idx.append(np.fromiter(itertools.chain.from_iterable(fasta_index), dtype=np.int64, count=n_proteins.sum()))
+
+        raw_idx = psms['raw_idx'].values.astype(np.int64)
+        self._resize(raw_idx.max() + 1)
+
+        record_idx = np.arange(self.n_records, self.n_records + len(psms))
+        self.records.append(psms.drop(columns='fasta_index').to_records(index=False))
+        self.n_records += len(psms)
+
+        insert_top_n_psms(raw_idx, pept_id, psms['hits'].values.astype(np.float64), psms['feature_idx'].values.astype(np.int64), record_idx, self.slot_hits, self.slot_pept, self.slot_feature, self.slot_record)
+
+        if self.n_records > 2 * self.slot_record.size:
+            self._compact()
+
+    def to_df(self)-> pd.DataFrame:
+        """Returns the top-n PSMs sorted by hits, with the merged proteins as comma-separated fasta_index.
+
+        Returns:
+            pd.DataFrame: Pandas DataFrame containing the PSMs.
+        """
+        if self.n_records == 0:
+            return pd.DataFrame()
+
+        occupied = self.slot_record != -1
+        records = np.concatenate(self.records)[self.slot_record[occupied]]
+
+        # The proteins are joined once per peptide
+        protein_pept, protein_idx = self._merge_proteins()
+        indptr = np.searchsorted(protein_pept, np.arange(self.n_pept + 1))
+        protein_idx = protein_idx.astype(str)
+        fasta_index = np.array([','.join(protein_idx[start:end]) for start, end in zip(indptr[:-1], indptr[1:])], dtype=object)
+
+        df = pd.DataFrame(records)
+        df['fasta_index'] = fasta_index[self.slot_pept[occupied]]
+        df = df.iloc[np.argsort(-self.slot_hits[occupied], kind='stable')].reset_index(drop=True)
+
+        return df
+
+# %% ../nbs/05_search.ipynb 77
 import psutil
 import alphapept.constants as constants
-from .fasta import get_fragmass, parse
+from .fasta import get_database_tokens, encode_peptides, get_compact_spectrum
 
 def ion_extractor(df: pd.DataFrame, ms_file, frag_tol:float, ppm:bool)->(np.ndarray, np.ndarray):
     """Extracts the matched hits (fragment_ions) from a dataframe.
@@ -1155,13 +2513,17 @@ def ion_extractor(df: pd.DataFrame, ms_file, frag_tol:float, ppm:bool)->(np.ndar
         np.ndarray: Numpy recordarray storing the fragment_ions.
     """
 
-    query_data = ms_file.read_DDA_query_data()
+    query_data = ms_file.read_DDA_query_data(fields=["indices_ms2", "mass_list_ms2", "int_list_ms2"])
     query_indices = query_data["indices_ms2"]
     query_frags = query_data['mass_list_ms2']
     query_ints = query_data['int_list_ms2']
     
     psms = df.to_records()
-    
+
+    # The sequences are encoded at once with the tokens of compact databases
+    tokens, token_masses = get_database_tokens()
+    residues, residue_indptr = encode_peptides(psms['sequence'], tokens)
+
     ion_count = 0
     
     ions_ = List()
@@ -1174,9 +2536,7 @@ def ion_extractor(df: pd.DataFrame, ms_file, frag_tol:float, ppm:bool)->(np.ndar
         query_frag = query_frags[query_idx_start:query_idx_end]
         query_int = query_ints[query_idx_start:query_idx_end]
 
-        seq = psms[i]['sequence']
-
-        db_frag, frag_type = get_fragmass(parse(seq), constants.mass_dict)
+        db_frag, frag_type = get_compact_spectrum(residues[residue_indptr[i]:residue_indptr[i+1]], token_masses, constants.mass_dict['Proton'], constants.mass_dict['H2O'])
         db_int = np.ones_like(db_frag)
 
         fragment_ions = get_hits(query_frag, query_int, db_frag, db_int, frag_type, frag_tol, ppm, LOSSES)
@@ -1250,8 +2610,7 @@ def search_parallel(settings: dict, calibration:Union[list, None] = None, fragme
 
     n_seqs_ = 0
 
-    df_cache = {} 
-    ion_cache = {}
+    accumulators = [TopNAccumulator(settings['search']['top_n']) for _ in ms_file_path]
     
     failed = []
     to_process_ = []
@@ -1263,17 +2622,10 @@ def search_parallel(settings: dict, calibration:Union[list, None] = None, fragme
             n_seqs_ += n_seqs
 
             logging.info(f'Block {i+1} of {max_} complete - {((i+1)/max_*100):.2f} % - created peptides {n_seqs:,} - total peptides {n_seqs_:,} ')
-            for j in range(len(psm_container)): #Temporary hdf files for avoiding saving issues
-                output = [_ for _ in psm_container[j]]
-                if len(output) > 0:
-                    psms = pd.concat(output)
-                    if ms_file_path[j] in df_cache:
-                        temp = filter_top_n(pd.concat([df_cache[ms_file_path[j]], psms]), settings['search']['top_n'])
-                        selector = temp['temp_idx'].values
-                        df_cache[ms_file_path[j]] = temp
-                    else:
-                        df_cache[ms_file_path[j]] = psms
-                                                     
+            for j in range(len(psm_container)):
+                for psms in psm_container[j]:
+                    accumulators[j].add(psms)
+
             if callback:
                 callback((i+1)/max_)
                 
@@ -1294,26 +2646,16 @@ def search_parallel(settings: dict, calibration:Union[list, None] = None, fragme
                 n_seqs_ += n_seqs
 
                 logging.info(f'Block {i+1} of {max_} complete - {((i+1)/max_*100):.2f} % - created peptides {n_seqs:,} - total peptides {n_seqs_:,} ')
-                for j in range(len(psm_container)): #Temporary hdf files for avoiding saving issues
-                    output = [_ for _ in psm_container[j]]
-                    if len(output) > 0:
-                        psms = pd.concat(output)
-                        if ms_file_path[j] in df_cache:
-                            temp = filter_top_n(pd.concat([df_cache[ms_file_path[j]], psms]), settings['search']['top_n'])
-                            selector = temp['temp_idx'].values
-                            df_cache[ms_file_path[j]] = temp
-                        else:
-                            df_cache[ms_file_path[j]] = psms
+                for j in range(len(psm_container)):
+                    for psms in psm_container[j]:
+                        accumulators[j].add(psms)
 
 
     for idx, _ in enumerate(ms_file_path):
-        if _ in df_cache:
-            x = df_cache[_]
+        if accumulators[idx].n_records > 0:
+            x = accumulators[idx].to_df()
             ms_file = alphapept.io.MS_Data_File(_)
 
-            x['fasta_index'] = x['fasta_index'].apply(lambda x: ','.join(str(_) for _ in x))
-            
-            
             if 'frag_tol_calibrated' in custom_settings[idx]['search']:
                 frag_tol = custom_settings[idx]['search']['frag_tol_calibrated']
             else:
@@ -92,6 +92,7 @@ SETTINGS_TEMPLATE["workflow"] = workflow
 general = {}
 
 general['n_processes'] = {'type':'spinbox', 'min':1, 'max':60, 'default':60, 'description':"Maximum number of processes for multiprocessing. If larger than number of processors it will be capped."}
+general['storage_policy'] = {'type':'combobox', 'value':['balanced','none','lzf','gzip'], 'default':'balanced', 'description':"Compression of large arrays in HDF files. Balanced compresses result tables with lzf and keeps MS peaks and database fragments uncompressed for fast reading."}
 
 SETTINGS_TEMPLATE["general"] = general
 
@@ -178,6 +179,16 @@ fasta["spectra_block"] = {'type':'spinbox', 'min':1000, 'max':1000000, 'default'
 fasta["fasta_block"] = {'type':'spinbox', 'min':100, 'max':10000, 'default':1000, 'description':"Number of fasta entries to be processed in one block."}
 fasta["save_db"] = {'type':'checkbox', 'default':True, 'description':"Save DB or create on the fly."}
 fasta["fasta_size_max"] = {'type':'spinbox', 'min':1, 'max':1000000, 'default':100, 'description':"Maximum size of FASTA (MB) when switching on-the-fly."}
+fasta["database_cache"] = {'type':'checkbox', 'default':False, 'description':"Reuse databases that were created from the same FASTA files and settings before."}
+fasta["database_cache_size_max"] = {'type':'doublespinbox', 'min':0.0, 'max':10000.0, 'default':20.0, 'description':"Maximum size of the database cache (GB). Least recently used databases are removed first."}
+fasta["database_incremental"] = {'type':'checkbox', 'default':False, 'description':"Update an existing database incrementally if FASTA entries were appended or changed."}
+fasta["database_sharded"] = {'type':'checkbox', 'default':False, 'description':"Write the database in mass shards via temporary files to limit the memory usage for large FASTA files."}
+fasta["database_shard_size"] = {'type':'spinbox', 'min':10000, 'max':100000000, 'default':2000000, 'description':"Maximum number of spectra that are merged at once when the database is written in shards."}
+fasta["database_compact"] = {'type':'checkbox', 'default':False, 'description':"Store the encoded peptides instead of the fragments in the database. Fragments are calculated during the search."}
+fasta["digestion_cache_mb"] = {'type':'spinbox', 'min':0, 'max':100000, 'default':64, 'description':"Memory (MB) per process for caching the peptides of digested protein sequences to skip identical sequences, 0 to disable the cache."}
+fasta["isoform_cache_mb"] = {'type':'spinbox', 'min':0, 'max':100000, 'default':128, 'description':"Memory (MB) per process for caching the modified forms of peptides to skip repeated peptides, 0 to disable the cache."}
+fasta["database_auto"] = {'type':'checkbox', 'default':False, 'description':"Estimate the database size from a sample of proteins and choose the database mode, fasta_block and spectra_block automatically instead of using fasta_size_max."}
+fasta["database_auto_samples"] = {'type':'spinbox', 'min':10, 'max':1000000, 'default':1000, 'description':"Number of proteins that are digested to estimate the database size."}
 
 SETTINGS_TEMPLATE["fasta"] = fasta
 
@@ -229,6 +240,16 @@ search["parallel"] = {'type':'checkbox', 'default':True, 'description':"Use para
 search["peptide_fdr"] = {'type':'doublespinbox', 'min':0.0, 'max':1.0, 'default':0.01, 'description':"FDR level for peptides."}
 search["protein_fdr"] = {'type':'doublespinbox', 'min':0.0, 'max':1.0, 'default':0.01, 'description':"FDR level for proteins."}
 search['recalibration_min'] = {'type':'spinbox', 'min':100, 'max':10000, 'default':100, 'description':"Minimum number of datapoints to perform calibration."}
+search["search_engine"] = {'type':'combobox', 'value':['pointer','fragment_index'], 'default':'pointer', 'description':"Search engine. Fragment index is faster for wide precursor windows or large databases."}
+search["open_search"] = {'type':'checkbox', 'default':False, 'description':"Perform an open search with a wide precursor window to find unknown modifications."}
+search["open_search_window"] = {'type':'doublespinbox', 'min':1.0, 'max':2000.0, 'default':500.0, 'description':"Precursor window in Dalton for the open search."}
+search["open_search_candidates"] = {'type':'spinbox', 'min':1, 'max':1000, 'default':50, 'description':"Number of candidates with most shared fragments that are scored per spectrum in the open search."}
+search["mmap_database"] = {'type':'checkbox', 'default':False, 'description':"Export the database to a flat format that is memory-mapped and shared by all search processes."}
+search["reduced_database"] = {'type':'checkbox', 'default':False, 'description':"Run the second search only against the peptides that scored in the first search and their decoys or targets."}
+search["reduced_database_neighbours"] = {'type':'checkbox', 'default':False, 'description':"Add all peptides of the proteins of the scored peptides to the reduced database."}
+search["batch_search"] = {'type':'checkbox', 'default':False, 'description':"Search several files together against a database that is loaded once. Useful for many small files such as fractions."}
+search["batch_search_size"] = {'type':'spinbox', 'min':1, 'max':1000, 'default':10, 'description':"Maximum number of files that are searched together in batch search."}
+search["prune_candidates"] = {'type':'checkbox', 'default':False, 'description':"Skip candidates that can not enter the top n hits in the pointer-based search. Pays off for a small top n and wide precursor windows."}
 
 SETTINGS_TEMPLATE["search"] = search
 
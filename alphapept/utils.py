@@ -354,6 +354,73 @@ def check_settings(settings):
     return settings
 
 
+# Columns of the results tables that repeat the same str in many rows
+CATEGORICAL_COLUMNS = [
+    'sequence',
+    'sequence_naked',
+    'precursor',
+    'protein',
+    'protein_group',
+    'protein_idx',
+    'fasta_index',
+    'type',
+    'filename',
+    'shortname',
+    'sample_group',
+]
+
+
+def categorize_columns(df: pd.DataFrame, columns: list = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """Convert str columns of a results table to pandas categoricals.
+
+    Categoricals are stored as integer codes and categories, see `alphapept.io.encode_categories`.
+
+    Args:
+        df (pd.DataFrame): A results table, e.g. peptide_fdr or protein_fdr. It is changed in place.
+        columns (list): The columns to convert if they exist and contain str. Defaults to CATEGORICAL_COLUMNS.
+
+    Returns:
+        pd.DataFrame: The results table.
+    """
+    for column in columns:
+        if (column in df.columns) and (pd.api.types.infer_dtype(df[column], skipna=True) == "string"):
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def write_results_df(df: pd.DataFrame, results_path: str, key: str) -> None:
+    """Write a pd.DataFrame to the results file.
+
+    Tables with categorical columns are written in the table format of pandas,
+    which stores the codes and categories and restores the categoricals with `pd.read_hdf`.
+    No PyTables index is created, as results are always read as a whole, which halves the write time.
+    If a column can not be stored in the table format, e.g. an object column with mixed types,
+    the categoricals are converted to str and the table is written in the fixed format.
+
+    Args:
+        df (pd.DataFrame): The table to write.
+        results_path (str): The results file.
+        key (str): The name of the table in the results file.
+    """
+    if isinstance(df.index, pd.CategoricalIndex):
+        df = df.set_axis(df.index.astype(object), axis=0)
+    if isinstance(df.columns, pd.CategoricalIndex):
+        df = df.set_axis(df.columns.astype(object), axis=1)
+
+    categorical = [column for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+
+    if len(categorical) > 0:
+        try:
+            df.to_hdf(results_path, key=key, format='table', index=False)
+            return
+        except (TypeError, ValueError) as e:
+            logging.info(f'Could not write {key} with categorical columns, writing them as str. Exception {e}')
+            df = df.astype({column: object for column in categorical})
+
+    df.to_hdf(results_path, key=key)
+
+
 def assemble_df(settings, field = 'protein_fdr', callback=None):
     """
     Todo we could save this to disk
@@ -390,8 +457,9 @@ def assemble_df(settings, field = 'protein_fdr', callback=None):
             callback((idx+1)/len(paths))
 
     if len(all_dfs) > 0:
-        xx = pd.concat(all_dfs)
-        xx.to_hdf(settings['experiment']['results_path'], 'combined_'+field)
+        # Categories differ between files, so the columns are categorized after concatenating
+        xx = categorize_columns(pd.concat(all_dfs))
+        write_results_df(xx, settings['experiment']['results_path'], 'combined_'+field)
     else:
         xx = pd.DataFrame()
 